@@ -1,16 +1,18 @@
 # auth.py - Sistema de Autenticación JWT
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Annotated, Optional
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
 import os
 
+import consultas
+from cache import invalidar_usuario, usuarios_autenticados
 from db import get_db
 
 # ================================
@@ -21,6 +23,14 @@ SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "tu-super-secreto-cambiar-en-produ
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 días
 
+# Con CONFIAR_CLAIMS_JWT=true las rutas de solo lectura (UserLecturaDepends) arman el
+# usuario con los claims firmados del token, sin consultar la base: un cambio de nombre
+# o de rol, o una cuenta eliminada, se notan recién con un token nuevo en esas rutas.
+CONFIAR_CLAIMS_JWT = os.getenv("CONFIAR_CLAIMS_JWT", "false").lower() in ("1", "true", "si", "yes")
+
+# Roles de orientadores: tablero de estadísticas y calificación de cargas masivas
+ROLES_ORIENTADORES = ("profesor", "institucion")
+
 # Contexto para hashear contraseñas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -40,6 +50,8 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     user_id: Optional[int] = None
     email: Optional[str] = None
+    nombre: Optional[str] = None
+    rol: Optional[str] = None
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -75,6 +87,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     """Crea un token JWT"""
     to_encode = data.copy()
     
+    # El claim "sub" tiene que ser texto: python-jose rechaza al decodificar un sub numérico
+    if "sub" in to_encode:
+        to_encode["sub"] = str(to_encode["sub"])
+    
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -98,7 +114,8 @@ def decode_access_token(token: str) -> TokenData:
                 detail="Token inválido"
             )
         
-        return TokenData(user_id=user_id, email=email)
+        return TokenData(user_id=user_id, email=email,
+                         nombre=payload.get("nombre"), rol=payload.get("rol"))
     
     except JWTError:
         raise HTTPException(
@@ -111,15 +128,10 @@ def decode_access_token(token: str) -> TokenData:
 # FUNCIONES DE AUTENTICACIÓN
 # ================================
 
-def get_user_by_email(db: Session, email: str) -> Optional[UserInDB]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[UserInDB]:
     """Obtiene usuario por email"""
     try:
-        query = text("""
-            SELECT id, nombre, gmail, rol, contraseña
-            FROM usuarios
-            WHERE gmail = :email
-        """)
-        result = db.execute(query, {"email": email}).fetchone()
+        result = (await db.execute(consultas.USUARIO_POR_EMAIL, {"email": email})).fetchone()
         
         if result:
             return UserInDB(
@@ -135,9 +147,43 @@ def get_user_by_email(db: Session, email: str) -> Optional[UserInDB]:
         print(f"❌ Error al obtener usuario: {e}")
         return None
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[UserInDB]:
+async def get_user_from_token(db: AsyncSession, token_data: TokenData,
+                              solo_lectura: bool = False) -> Optional[dict]:
+    """
+    Usuario de un token válido. Los tokens de la API se reenvían en cada llamada, así que
+    el usuario se guarda unos segundos en caché (TTL_CACHE_USUARIOS) por user_id.
+    Con solo_lectura y CONFIAR_CLAIMS_JWT se usa directamente lo que dice el token.
+    """
+    if solo_lectura and CONFIAR_CLAIMS_JWT and token_data.nombre is not None and token_data.rol is not None:
+        return {
+            "id": token_data.user_id,
+            "nombre": token_data.nombre,
+            "gmail": token_data.email,
+            "rol": token_data.rol
+        }
+    
+    usuario = usuarios_autenticados.obtener(token_data.user_id)
+    
+    # Un token emitido antes de un cambio de email ya no corresponde al usuario
+    if usuario is None or usuario["gmail"] != token_data.email:
+        user = await get_user_by_email(db, token_data.email)
+        if user is None:
+            return None
+        
+        usuario = {
+            "id": user.id,
+            "nombre": user.nombre,
+            "gmail": user.email,
+            "rol": user.rol
+        }
+        usuarios_autenticados.guardar(user.id, usuario)
+    
+    # Copia: las rutas pueden modificar el dict que reciben
+    return dict(usuario)
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[UserInDB]:
     """Autentica usuario con email y contraseña"""
-    user = get_user_by_email(db, email)
+    user = await get_user_by_email(db, email)
     
     if not user:
         return None
@@ -149,8 +195,8 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[UserIn
             return user
         return None
     
-    # Verificar contraseña hasheada
-    if not verify_password(password, user.hashed_password):
+    # Verificar contraseña hasheada (bcrypt usa CPU: fuera del event loop)
+    if not await run_in_threadpool(verify_password, password, user.hashed_password):
         return None
     
     return user
@@ -162,7 +208,7 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[UserIn
 
 async def get_current_user_jwt(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> dict:
     """
     Obtiene el usuario actual desde el token JWT.
@@ -171,7 +217,7 @@ async def get_current_user_jwt(
     token = credentials.credentials
     token_data = decode_access_token(token)
     
-    user = get_user_by_email(db, token_data.email)
+    user = await get_user_from_token(db, token_data)
     
     if user is None:
         raise HTTPException(
@@ -179,21 +225,10 @@ async def get_current_user_jwt(
             detail="Usuario no encontrado"
         )
     
-    return {
-        "id": user.id,
-        "nombre": user.nombre,
-        "gmail": user.email,
-        "rol": user.rol
-    }
+    return user
 
-async def get_current_user_optional_jwt(
-    request: Request,
-    db: Session = Depends(get_db)
-) -> Optional[dict]:
-    """
-    Obtiene el usuario actual si existe token, sino retorna None.
-    Compatible con páginas públicas.
-    """
+async def _get_user_bearer(request: Request, db: AsyncSession, solo_lectura: bool = False) -> Optional[dict]:
+    """Usuario del header Authorization: Bearer, o None si no hay token válido"""
     auth_header = request.headers.get("Authorization")
     
     if not auth_header or not auth_header.startswith("Bearer "):
@@ -202,19 +237,19 @@ async def get_current_user_optional_jwt(
     try:
         token = auth_header.split(" ")[1]
         token_data = decode_access_token(token)
-        user = get_user_by_email(db, token_data.email)
-        
-        if user:
-            return {
-                "id": user.id,
-                "nombre": user.nombre,
-                "gmail": user.email,
-                "rol": user.rol
-            }
+        return await get_user_from_token(db, token_data, solo_lectura)
     except:
         return None
-    
-    return None
+
+async def get_current_user_optional_jwt(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+) -> Optional[dict]:
+    """
+    Obtiene el usuario actual si existe token, sino retorna None.
+    Compatible con páginas públicas.
+    """
+    return await _get_user_bearer(request, db)
 
 
 # ================================
@@ -238,58 +273,51 @@ def get_current_user_session(request: Request) -> Optional[dict]:
         "rol": request.session.get("user_rol")
     }
 
-def get_current_user_hybrid(
+async def get_current_user_hybrid(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Optional[dict]:
     """
     Sistema híbrido: intenta JWT primero, luego sesión.
     Permite transición gradual al nuevo sistema.
     """
-    # Intentar JWT
-    auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        try:
-            token = auth_header.split(" ")[1]
-            token_data = decode_access_token(token)
-            user = get_user_by_email(db, token_data.email)
-            
-            if user:
-                return {
-                    "id": user.id,
-                    "nombre": user.nombre,
-                    "gmail": user.email,
-                    "rol": user.rol
-                }
-        except:
-            pass
-    
-    # Fallback a sesión
-    return get_current_user_session(request)
+    # Intentar JWT, y si no, la sesión
+    return await _get_user_bearer(request, db) or get_current_user_session(request)
+
+async def get_current_user_lectura(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+) -> Optional[dict]:
+    """
+    Igual que get_current_user_hybrid, para rutas que solo muestran datos: con
+    CONFIAR_CLAIMS_JWT el usuario sale de los claims del token, sin consultar la base.
+    No usar en rutas que modifican datos ni que autorizan por rol.
+    """
+    return await _get_user_bearer(request, db, solo_lectura=True) or get_current_user_session(request)
+
+# Usuario opcional de las páginas públicas. Usa la sesión del request (get_db), que solo
+# se conecta si llega un token Bearer que no está en caché: las visitas anónimas o por
+# cookie no usan el pool.
+UserHybridDepends = Annotated[Optional[dict], Depends(get_current_user_hybrid)]
+UserLecturaDepends = Annotated[Optional[dict], Depends(get_current_user_lectura)]
 
 
 # ================================
 # FUNCIONES DE UTILIDAD ADICIONALES
 # ================================
 
-def create_user(db: Session, user_data: UserRegister) -> UserInDB:
+async def create_user(db: AsyncSession, user_data: UserRegister) -> UserInDB:
     """Crea un nuevo usuario con contraseña hasheada"""
-    hashed_pwd = get_password_hash(user_data.password)
-    
-    query = text("""
-        INSERT INTO usuarios (nombre, gmail, rol, contraseña)
-        VALUES (:nombre, :email, :rol, :password)
-        RETURNING id, nombre, gmail, rol, contraseña
-    """)
+    hashed_pwd = await run_in_threadpool(get_password_hash, user_data.password)
     
-    result = db.execute(query, {
+    result = (await db.execute(consultas.CREAR_USUARIO, {
         "nombre": user_data.nombre,
         "email": user_data.email,
         "rol": user_data.rol,
         "password": hashed_pwd
-    }).fetchone()
+    })).fetchone()
     
-    db.commit()
+    await db.commit()
     
     return UserInDB(
         id=result[0],
@@ -299,17 +327,13 @@ def create_user(db: Session, user_data: UserRegister) -> UserInDB:
         hashed_password=result[4]
     )
 
-def update_user_password(db: Session, user_id: int, new_password: str) -> bool:
+async def update_user_password(db: AsyncSession, user_id: int, new_password: str) -> bool:
     """Actualiza la contraseña de un usuario"""
-    hashed_pwd = get_password_hash(new_password)
+    hashed_pwd = await run_in_threadpool(get_password_hash, new_password)
     
-    query = text("""
-        UPDATE usuarios
-        SET contraseña = :password
-        WHERE id = :user_id
-    """)
+    await db.execute(consultas.ACTUALIZAR_CONTRASENA, {"password": hashed_pwd, "user_id": user_id})
+    await db.commit()
     
-    db.execute(query, {"password": hashed_pwd, "user_id": user_id})
-    db.commit()
+    invalidar_usuario(user_id)
     
     return True
\ No newline at end of file
@@ -0,0 +1,166 @@
+# benchmark_conexiones.py - Compara los modos de conexión de db.py
+
+"""
+Script para medir el arranque en frío y la latencia de cada MODO_CONEXION
+(clasico, pooler, persistente) contra una base de datos local.
+
+Uso:
+    python benchmark_conexiones.py --url postgresql://postgres@localhost:5432/polaris
+        [--url-pooler postgresql://postgres@localhost:6432/polaris]
+        [--requests 300] [--concurrencia 10] [--ruta /api/programas]
+        [--modos clasico,pooler,persistente]
+
+El script:
+1. Lanza un proceso nuevo por modo, como una lambda en frío: mide la importación de la app,
+   el arranque (lifespan) y el primer request
+2. Con la app caliente envía --requests requests a --ruta con --concurrencia simultáneos
+   (sin servidor HTTP: httpx contra la app ASGI) y mide p50, p95 y p99
+3. Imprime una tabla comparativa
+
+El modo pooler usa --url-pooler: un PgBouncer local en modo transacción hace de pooler
+de Supabase (sin --url-pooler se usa --url directo, que solo mide el costo de conectar).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+MODOS = ["clasico", "pooler", "persistente"]
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+# ================================
+# PROCESO DE MEDICIÓN (UNO POR MODO)
+# ================================
+
+async def _medir(args) -> dict:
+    inicio = time.perf_counter()
+    
+    # La importación es parte del arranque en frío de la lambda
+    import httpx
+    import main
+    importado = time.perf_counter()
+    
+    resultado = {"modo": os.environ["MODO_CONEXION"], "importacion_ms": (importado - inicio) * 1000}
+    
+    async with main.app.router.lifespan_context(main.app):
+        arrancado = time.perf_counter()
+        resultado["arranque_ms"] = (arrancado - importado) * 1000
+        
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+            respuesta = await cliente.get(args.ruta)
+            resultado["primer_request_ms"] = (time.perf_counter() - arrancado) * 1000
+            resultado["arranque_en_frio_ms"] = (time.perf_counter() - inicio) * 1000
+            
+            if respuesta.status_code != 200:
+                raise RuntimeError(f"{args.ruta} respondió {respuesta.status_code}")
+            
+            latencias = []
+            errores = 0
+            pendientes = iter(range(args.requests))
+            
+            async def trabajador():
+                nonlocal errores
+                for _ in pendientes:
+                    t0 = time.perf_counter()
+                    respuesta = await cliente.get(args.ruta)
+                    latencias.append((time.perf_counter() - t0) * 1000)
+                    if respuesta.status_code != 200:
+                        errores += 1
+            
+            t0 = time.perf_counter()
+            await asyncio.gather(*[trabajador() for _ in range(args.concurrencia)])
+            duracion = time.perf_counter() - t0
+    
+    resultado.update({
+        "p50_ms": _percentil(latencias, 50),
+        "p95_ms": _percentil(latencias, 95),
+        "p99_ms": _percentil(latencias, 99),
+        "requests_por_segundo": len(latencias) / duracion,
+        "errores": errores
+    })
+    return resultado
+
+
+# ================================
+# COMPARACIÓN
+# ================================
+
+def _ejecutar_modo(modo: str, args) -> dict:
+    """Mide un modo en un proceso nuevo (arranque en frío real)"""
+    entorno = dict(os.environ)
+    entorno["MODO_CONEXION"] = modo
+    entorno["URL_DATABASE"] = args.url_pooler if modo == "pooler" and args.url_pooler else args.url
+    
+    comando = [
+        sys.executable, __file__, "--medir",
+        "--ruta", args.ruta,
+        "--requests", str(args.requests),
+        "--concurrencia", str(args.concurrencia)
+    ]
+    proceso = subprocess.run(comando, env=entorno, capture_output=True, text=True)
+    
+    # La app imprime su propio log: el resultado es la última línea
+    lineas = proceso.stdout.strip().splitlines()
+    if proceso.returncode != 0 or not lineas:
+        print(proceso.stdout[-2000:])
+        print(proceso.stderr[-2000:])
+        raise RuntimeError(f"Falló la medición del modo {modo}")
+    return json.loads(lineas[-1])
+
+def comparar(args):
+    resultados = []
+    for modo in args.modos.split(","):
+        print(f"⏱️  Midiendo modo {modo}...")
+        resultados.append(_ejecutar_modo(modo, args))
+    
+    columnas = [
+        ("modo", "Modo", "{}"),
+        ("arranque_en_frio_ms", "Frío (ms)", "{:.0f}"),
+        ("primer_request_ms", "1er req (ms)", "{:.1f}"),
+        ("p50_ms", "p50 (ms)", "{:.1f}"),
+        ("p95_ms", "p95 (ms)", "{:.1f}"),
+        ("p99_ms", "p99 (ms)", "{:.1f}"),
+        ("requests_por_segundo", "req/s", "{:.0f}"),
+        ("errores", "Errores", "{}")
+    ]
+    
+    print("\n" + "="*90)
+    print(f"📊 {args.requests} requests a {args.ruta}, {args.concurrencia} simultáneos")
+    print("="*90)
+    print("".join(f"{titulo:>13}" for _, titulo, _ in columnas))
+    for resultado in resultados:
+        print("".join(f"{formato.format(resultado[clave]):>13}" for clave, _, formato in columnas))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara los modos de conexión de db.py")
+    parser.add_argument("--url", default=os.getenv("URL_DATABASE"), help="Base de datos directa")
+    parser.add_argument("--url-pooler", help="Misma base detrás de PgBouncer (modo pooler)")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrencia", type=int, default=10)
+    parser.add_argument("--ruta", default="/api/programas", help="Ruta que consulta la base de datos")
+    parser.add_argument("--modos", default=",".join(MODOS))
+    parser.add_argument("--medir", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.medir:
+        print(json.dumps(asyncio.run(_medir(args))))
+        sys.exit(0)
+    
+    if not args.url:
+        parser.error("Falta --url (o URL_DATABASE)")
+    
+    print("="*50)
+    print("🔌 BENCHMARK DE MODOS DE CONEXIÓN")
+    print("="*50 + "\n")
+    
+    comparar(args)
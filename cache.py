@@ -0,0 +1,102 @@
+# cache.py - Cachés en memoria del proceso
+
+"""
+Cachés LRU acotadas en memoria.
+
+Cada proceso (o instancia serverless) tiene su propia copia: lo que se guarde aquí
+debe poder recalcularse desde la base de datos y no se comparte entre instancias.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+TAMANO_CACHE_DETALLE = int(os.getenv("TAMANO_CACHE_DETALLE", "256"))
+TAMANO_CACHE_USUARIOS = int(os.getenv("TAMANO_CACHE_USUARIOS", "1024"))
+TTL_CACHE_USUARIOS = float(os.getenv("TTL_CACHE_USUARIOS", "60"))  # Segundos
+
+class CacheLRU:
+    """Diccionario acotado que descarta la entrada usada hace más tiempo"""
+    
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obtener(self, clave: Hashable) -> Optional[Any]:
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is not None:
+                self._datos.move_to_end(clave)
+            return valor
+    
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+    
+    def invalidar(self, clave: Hashable) -> None:
+        with self._lock:
+            self._datos.pop(clave, None)
+    
+    def invalidar_si(self, condicion: Callable[[Hashable], bool]) -> None:
+        """Elimina todas las entradas cuya clave cumpla la condición"""
+        with self._lock:
+            for clave in [c for c in self._datos if condicion(c)]:
+                del self._datos[clave]
+    
+    def __len__(self) -> int:
+        return len(self._datos)
+
+class CacheTTL(CacheLRU):
+    """CacheLRU cuyas entradas vencen ttl segundos después de guardarse"""
+    
+    def __init__(self, max_entradas: int, ttl: float):
+        super().__init__(max_entradas)
+        self.ttl = ttl
+    
+    def obtener(self, clave: Hashable) -> Optional[Any]:
+        entrada = super().obtener(clave)
+        if entrada is None:
+            return None
+        
+        vence, valor = entrada
+        if time.monotonic() >= vence:
+            with self._lock:
+                # Solo si nadie la reemplazó mientras tanto
+                if self._datos.get(clave) is entrada:
+                    del self._datos[clave]
+            return None
+        return valor
+    
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        if self.ttl <= 0:
+            return
+        super().guardar(clave, (time.monotonic() + self.ttl, valor))
+
+
+# HTML ya renderizado de /test/{test_id}/detalle, por (user_id, test_id)
+detalle_tests = CacheLRU(TAMANO_CACHE_DETALLE)
+
+def invalidar_detalle_tests(user_id: int, test_ids=None) -> None:
+    """Descarta el detalle cacheado de algunos tests del usuario, o de todos"""
+    if test_ids is None:
+        detalle_tests.invalidar_si(lambda clave: clave[0] == user_id)
+    else:
+        for test_id in test_ids:
+            detalle_tests.invalidar((user_id, test_id))
+
+
+# Usuario ({id, nombre, gmail, rol}) de los tokens JWT, por user_id. Las invalidaciones
+# son locales: en otra instancia un cambio se nota cuando vence la entrada (TTL)
+usuarios_autenticados = CacheTTL(TAMANO_CACHE_USUARIOS, TTL_CACHE_USUARIOS)
+
+def invalidar_usuario(user_id: int) -> None:
+    """Descarta el usuario cacheado (cambio de datos o de contraseña, cuenta eliminada)"""
+    usuarios_autenticados.invalidar(user_id)
@@ -0,0 +1,497 @@
+# consultas.py - Sentencias SQL de los routers y de auth.py
+
+"""
+Todas las consultas de los routers y de auth.py, construidas una sola vez al importar.
+
+Cada sentencia declara el tipo de sus parámetros y de sus columnas de resultado:
+con asyncpg los parámetros se envían con su tipo ($1::INTEGER), así el plan no depende
+de cómo Postgres adivine el tipo de un parámetro sin tipo.
+
+Las consultas que antes se armaban concatenando texto (filtros opcionales, orden del foro)
+son aquí una sentencia fija por variante.
+
+REGISTRO reúne todas las sentencias por nombre; verificar_consultas.py las prepara y
+planifica contra una base de datos para detectar errores antes de desplegar.
+Las sentencias de persistencia.py siguen en ese módulo, junto a la lógica que las usa
+(persistencia.REGISTRO; verificar_planes.py revisa los dos registros).
+"""
+
+from datetime import date, datetime
+
+from sqlalchemy import bindparam, column, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.selectable import TextualSelect
+from sqlalchemy.types import BigInteger, Boolean, Date, DateTime, Float, Integer, Numeric, SmallInteger, String, Text
+
+def _sql(sql: str, parametros: dict = None, columnas: list = None):
+    """
+    text() con los tipos de los parámetros ({nombre: tipo}) y de las columnas
+    del resultado ([(nombre, tipo)], en el orden del SELECT)
+    """
+    sentencia = text(sql)
+    if parametros:
+        sentencia = sentencia.bindparams(
+            *[bindparam(nombre, type_=tipo) for nombre, tipo in parametros.items()]
+        )
+    if columnas:
+        sentencia = sentencia.columns(*[column(nombre, tipo) for nombre, tipo in columnas])
+    return sentencia
+
+_COLUMNAS_USUARIO = [("id", Integer), ("nombre", Text), ("gmail", Text), ("rol", Text)]
+
+
+# ================================
+# USUARIOS Y AUTENTICACIÓN
+# ================================
+
+USUARIO_POR_EMAIL = _sql("""
+    SELECT id, nombre, gmail, rol, contraseña
+    FROM usuarios
+    WHERE gmail = :email
+""", {"email": Text}, _COLUMNAS_USUARIO + [("contraseña", Text)])
+
+CREAR_USUARIO = _sql("""
+    INSERT INTO usuarios (nombre, gmail, rol, contraseña)
+    VALUES (:nombre, :email, :rol, :password)
+    RETURNING id, nombre, gmail, rol, contraseña
+""", {"nombre": Text, "email": Text, "rol": Text, "password": Text},
+    _COLUMNAS_USUARIO + [("contraseña", Text)])
+
+REGISTRAR_USUARIO = _sql("""
+    INSERT INTO usuarios (nombre, gmail, rol, contraseña)
+    VALUES (:nombre, :email, :rol, :password)
+""", {"nombre": Text, "email": Text, "rol": Text, "password": Text})
+
+ACTUALIZAR_CONTRASENA = _sql("""
+    UPDATE usuarios
+    SET contraseña = :password
+    WHERE id = :user_id
+""", {"password": Text, "user_id": Integer})
+
+EMAIL_REGISTRADO = _sql("""
+    SELECT id FROM usuarios WHERE gmail = :email
+""", {"email": Text}, [("id", Integer)])
+
+EMAIL_DE_OTRO_USUARIO = _sql("""
+    SELECT id FROM usuarios WHERE gmail = :email AND id != :user_id
+""", {"email": Text, "user_id": Integer}, [("id", Integer)])
+
+# Login por formulario del sistema antiguo (contraseña sin hash)
+LOGIN_SESION = _sql("""
+    SELECT id, nombre, gmail, rol FROM usuarios WHERE gmail = :gmail AND contraseña = :pwd
+""", {"gmail": Text, "pwd": Text}, _COLUMNAS_USUARIO)
+
+ACTUALIZAR_USUARIO = _sql("""
+    UPDATE usuarios
+    SET nombre = :nombre, gmail = :email, rol = :rol
+    WHERE id = :user_id
+""", {"nombre": Text, "email": Text, "rol": Text, "user_id": Integer})
+
+ACTUALIZAR_USUARIO_Y_CONTRASENA = _sql("""
+    UPDATE usuarios
+    SET nombre = :nombre, gmail = :email, rol = :rol, contraseña = :nueva_pwd
+    WHERE id = :user_id
+""", {"nombre": Text, "email": Text, "rol": Text, "nueva_pwd": Text, "user_id": Integer})
+
+ELIMINAR_USUARIO = _sql("""
+    DELETE FROM usuarios WHERE id = :user_id
+""", {"user_id": Integer})
+
+
+# ================================
+# HISTORIAL Y DETALLE DE TESTS
+# ================================
+
+_COLUMNAS_PAGINA_TESTS = [
+    ("id", Integer), ("tipo_test", String), ("fecha_realizacion", DateTime),
+    ("puntuacion_total", Integer), ("porcentaje_afinidad", Numeric), ("area_principal", Text)
+]
+
+# Primera página del historial y páginas siguientes (keyset por fecha_realizacion, id)
+PAGINA_TESTS = _sql("""
+    SELECT
+        t.id,
+        t.tipo_test,
+        t.fecha_realizacion,
+        t.puntuacion_total,
+        r.porcentaje_afinidad,
+        r.area_principal
+    FROM tests_realizados t
+    LEFT JOIN resultados_test r ON t.id = r.test_id
+    WHERE t.usuario_id = :user_id
+    ORDER BY t.fecha_realizacion DESC, t.id DESC
+    LIMIT :limit
+""", {"user_id": Integer, "limit": Integer}, _COLUMNAS_PAGINA_TESTS)
+
+PAGINA_TESTS_DESDE_CURSOR = _sql("""
+    SELECT
+        t.id,
+        t.tipo_test,
+        t.fecha_realizacion,
+        t.puntuacion_total,
+        r.porcentaje_afinidad,
+        r.area_principal
+    FROM tests_realizados t
+    LEFT JOIN resultados_test r ON t.id = r.test_id
+    WHERE t.usuario_id = :user_id
+    AND (t.fecha_realizacion, t.id) < (:cursor_fecha, :cursor_id)
+    ORDER BY t.fecha_realizacion DESC, t.id DESC
+    LIMIT :limit
+""", {"user_id": Integer, "cursor_fecha": DateTime, "cursor_id": Integer, "limit": Integer},
+    _COLUMNAS_PAGINA_TESTS)
+
+TEST_DEL_USUARIO = _sql("""
+    SELECT 1 FROM tests_realizados
+    WHERE id = :test_id AND usuario_id = :user_id
+""", {"test_id": Integer, "user_id": Integer}, [("existe", Integer)])
+
+DETALLE_TEST = _sql("""
+    SELECT
+        t.tipo_test,
+        t.fecha_realizacion,
+        t.puntuacion_total,
+        r.area_principal,
+        r.porcentaje_afinidad,
+        r.carreras_recomendadas,
+        r.fortalezas,
+        r.areas_desarrollo,
+        r.descripcion_perfil,
+        r.datos_adicionales,
+        r.campo_laboral
+    FROM tests_realizados t
+    LEFT JOIN resultados_test r ON t.id = r.test_id
+    WHERE t.id = :test_id AND t.usuario_id = :user_id
+""", {"test_id": Integer, "user_id": Integer}, [
+    ("tipo_test", String), ("fecha_realizacion", DateTime), ("puntuacion_total", Integer),
+    ("area_principal", Text), ("porcentaje_afinidad", Numeric),
+    ("carreras_recomendadas", JSONB), ("fortalezas", ARRAY(Text)),
+    ("areas_desarrollo", ARRAY(Text)), ("descripcion_perfil", Text),
+    ("datos_adicionales", JSONB), ("campo_laboral", ARRAY(Text))
+])
+
+# Historial completo para /api/usuario/tests/export. Las respuestas en filas
+# (tests sin respuestas_compactas) se agregan en arreglos ordenados por pregunta.
+EXPORTACION_TESTS = _sql("""
+    SELECT
+        t.id,
+        t.tipo_test,
+        t.fecha_realizacion,
+        t.puntuacion_total,
+        r.area_principal,
+        r.porcentaje_afinidad,
+        r.carreras_recomendadas,
+        r.fortalezas,
+        r.areas_desarrollo,
+        r.descripcion_perfil,
+        r.datos_adicionales,
+        t.respuestas_compactas,
+        f.preguntas,
+        f.respuestas,
+        r.campo_laboral
+    FROM tests_realizados t
+    LEFT JOIN resultados_test r ON t.id = r.test_id
+    LEFT JOIN LATERAL (
+        SELECT array_agg(pregunta_id ORDER BY pregunta_id) AS preguntas,
+               array_agg(respuesta ORDER BY pregunta_id) AS respuestas
+        FROM respuestas_test
+        WHERE test_id = t.id AND t.respuestas_compactas IS NULL
+    ) f ON true
+    WHERE t.usuario_id = :user_id
+    ORDER BY t.fecha_realizacion DESC, t.id DESC
+""", {"user_id": Integer}, [
+    ("id", Integer), ("tipo_test", String), ("fecha_realizacion", DateTime),
+    ("puntuacion_total", Integer), ("area_principal", Text), ("porcentaje_afinidad", Numeric),
+    ("carreras_recomendadas", JSONB), ("fortalezas", ARRAY(Text)),
+    ("areas_desarrollo", ARRAY(Text)), ("descripcion_perfil", Text),
+    ("datos_adicionales", JSONB), ("respuestas_compactas", ARRAY(SmallInteger)),
+    ("preguntas", ARRAY(Integer)), ("respuestas", ARRAY(String)), ("campo_laboral", ARRAY(Text))
+])
+
+
+# ================================
+# FORO
+# ================================
+
+_ORDEN_COMENTARIOS = {
+    "newest": "fecha_creacion DESC",
+    "oldest": "fecha_creacion ASC",
+    "popular": "likes DESC, fecha_creacion DESC"
+}
+
+_COLUMNAS_COMENTARIO = [
+    ("id", Integer), ("nombre", Text), ("tema", Text), ("contenido", Text),
+    ("fecha_creacion", DateTime), ("fecha_actualizacion", DateTime), ("likes", Integer)
+]
+
+def _listar_comentarios(orden: str, con_tema: bool):
+    return _sql(f"""
+        SELECT id, nombre, tema, contenido, fecha_creacion, fecha_actualizacion, likes
+        FROM comentarios_foro
+        WHERE activo = true
+        {"AND tema = :tema" if con_tema else ""}
+        ORDER BY {_ORDEN_COMENTARIOS[orden]}
+        LIMIT :limit OFFSET :offset
+    """, {"limit": Integer, "offset": Integer, **({"tema": Text} if con_tema else {})},
+        _COLUMNAS_COMENTARIO)
+
+# Una sentencia fija por (orden, filtra por tema)
+LISTAR_COMENTARIOS = {
+    (orden, con_tema): _listar_comentarios(orden, con_tema)
+    for orden in _ORDEN_COMENTARIOS
+    for con_tema in (False, True)
+}
+
+CONTAR_COMENTARIOS = _sql("""
+    SELECT COUNT(*) FROM comentarios_foro WHERE activo = true
+""", columnas=[("total", BigInteger)])
+
+CONTAR_COMENTARIOS_TEMA = _sql("""
+    SELECT COUNT(*) FROM comentarios_foro WHERE activo = true AND tema = :tema
+""", {"tema": Text}, [("total", BigInteger)])
+
+CREAR_COMENTARIO = _sql("""
+    INSERT INTO comentarios_foro (nombre, tema, contenido, fecha_creacion, fecha_actualizacion, likes, activo)
+    VALUES (:nombre, :tema, :contenido, NOW(), NOW(), 0, true)
+    RETURNING id, nombre, tema, contenido, fecha_creacion, fecha_actualizacion, likes
+""", {"nombre": Text, "tema": Text, "contenido": Text}, _COLUMNAS_COMENTARIO)
+
+COMENTARIO_ACTIVO = _sql("""
+    SELECT id, likes FROM comentarios_foro WHERE id = :id AND activo = true
+""", {"id": Integer}, [("id", Integer), ("likes", Integer)])
+
+ACTUALIZAR_COMENTARIO = _sql("""
+    UPDATE comentarios_foro
+    SET contenido = :contenido,
+        tema = :tema,
+        fecha_actualizacion = NOW()
+    WHERE id = :id
+    RETURNING id, nombre, tema, contenido, fecha_creacion, fecha_actualizacion, likes
+""", {"id": Integer, "contenido": Text, "tema": Text}, _COLUMNAS_COMENTARIO)
+
+ELIMINAR_COMENTARIO = _sql("""
+    DELETE FROM comentarios_foro WHERE id = :id
+""", {"id": Integer})
+
+DAR_LIKE = _sql("""
+    UPDATE comentarios_foro
+    SET likes = likes + 1
+    WHERE id = :id
+    RETURNING likes
+""", {"id": Integer}, [("likes", Integer)])
+
+TEMAS_POPULARES = _sql("""
+    SELECT tema, nombre_display, contador
+    FROM temas_populares
+    WHERE contador > 0
+    ORDER BY contador DESC, ultima_actualizacion DESC
+    LIMIT :limit
+""", {"limit": Integer}, [("tema", Text), ("nombre_display", Text), ("contador", Integer)])
+
+
+# ================================
+# PROGRAMAS ACADÉMICOS
+# ================================
+
+LISTAR_PROGRAMAS = _sql("""
+    SELECT DISTINCT
+        p.id,
+        p.nombre,
+        p.universidad_id,
+        u.nombre as universidad_nombre,
+        u.sigla as universidad_sigla,
+        u.website as universidad_website,
+        u.tipo_universidad,
+        u.ciudad,
+        u.departamento,
+        a.nombre as area_nombre,
+        a.color_hex as area_color,
+        a.icono as area_icono,
+        p.duracion_semestres,
+        p.creditos,
+        ARRAY_AGG(DISTINCT m.nombre) as modalidades
+    FROM programas_academicos p
+    INNER JOIN universidades u ON p.universidad_id = u.id
+    LEFT JOIN areas_conocimiento a ON p.area_id = a.id
+    LEFT JOIN programa_modalidades pm ON p.id = pm.programa_id
+    LEFT JOIN modalidades m ON pm.modalidad_id = m.id
+    WHERE p.activo = true AND u.activo = true
+    GROUP BY p.id, p.nombre, p.universidad_id, u.nombre, u.sigla, u.website,
+             u.tipo_universidad, u.ciudad, u.departamento, a.nombre,
+             a.color_hex, a.icono, p.duracion_semestres, p.creditos
+    ORDER BY p.nombre
+""", columnas=[
+    ("id", Integer), ("nombre", Text), ("universidad_id", Integer),
+    ("universidad_nombre", Text), ("universidad_sigla", Text), ("universidad_website", Text),
+    ("tipo_universidad", Text), ("ciudad", Text), ("departamento", Text),
+    ("area_nombre", Text), ("area_color", Text), ("area_icono", Text),
+    ("duracion_semestres", Integer), ("creditos", Integer), ("modalidades", ARRAY(Text))
+])
+
+DETALLE_PROGRAMA = _sql("""
+    SELECT
+        p.id, p.nombre, p.codigo_snies, p.universidad_id,
+        u.nombre, u.sigla, u.website, u.direccion, u.telefono, u.email,
+        u.tipo_universidad, u.ciudad, u.departamento,
+        a.nombre, a.color_hex, a.icono,
+        p.duracion_semestres, p.creditos, p.titulo_otorgado,
+        p.descripcion, p.perfil_profesional, p.campo_laboral, p.costo_semestre
+    FROM programas_academicos p
+    INNER JOIN universidades u ON p.universidad_id = u.id
+    LEFT JOIN areas_conocimiento a ON p.area_id = a.id
+    WHERE p.id = :programa_id AND p.activo = true
+""", {"programa_id": Integer}, [
+    ("id", Integer), ("nombre", Text), ("codigo_snies", Text), ("universidad_id", Integer),
+    ("universidad_nombre", Text), ("universidad_sigla", Text), ("universidad_website", Text),
+    ("universidad_direccion", Text), ("universidad_telefono", Text), ("universidad_email", Text),
+    ("tipo_universidad", Text), ("ciudad", Text), ("departamento", Text),
+    ("area_nombre", Text), ("area_color", Text), ("area_icono", Text),
+    ("duracion_semestres", Integer), ("creditos", Integer), ("titulo_otorgado", Text),
+    ("descripcion", Text), ("perfil_profesional", Text), ("campo_laboral", Text),
+    ("costo_semestre", Numeric)
+])
+
+MODALIDADES_PROGRAMA = _sql("""
+    SELECT m.nombre
+    FROM programa_modalidades pm
+    INNER JOIN modalidades m ON pm.modalidad_id = m.id
+    WHERE pm.programa_id = :programa_id
+""", {"programa_id": Integer}, [("nombre", Text)])
+
+CAMPUS_PROGRAMA = _sql("""
+    SELECT DISTINCT c.id, c.nombre, c.direccion, c.ciudad, c.telefono, c.es_principal
+    FROM programa_campus pc
+    INNER JOIN campus c ON pc.campus_id = c.id
+    WHERE pc.programa_id = :programa_id AND c.activo = true
+""", {"programa_id": Integer}, [
+    ("id", Integer), ("nombre", Text), ("direccion", Text),
+    ("ciudad", Text), ("telefono", Text), ("es_principal", Boolean)
+])
+
+LISTAR_UNIVERSIDADES = _sql("""
+    SELECT id, nombre, sigla, tipo_universidad
+    FROM universidades
+    WHERE activo = true
+    ORDER BY nombre
+""", columnas=[("id", Integer), ("nombre", Text), ("sigla", Text), ("tipo_universidad", Text)])
+
+LISTAR_AREAS = _sql("""
+    SELECT id, nombre, descripcion, color_hex, icono
+    FROM areas_conocimiento
+    WHERE activo = true
+    ORDER BY nombre
+""", columnas=[
+    ("id", Integer), ("nombre", Text), ("descripcion", Text), ("color_hex", Text), ("icono", Text)
+])
+
+LISTAR_MODALIDADES = _sql("""
+    SELECT id, nombre, descripcion
+    FROM modalidades
+    WHERE activo = true
+    ORDER BY nombre
+""", columnas=[("id", Integer), ("nombre", Text), ("descripcion", Text)])
+
+# Cada filtro se ignora cuando su parámetro es NULL
+FILTRAR_CARRERAS = _sql("""
+    SELECT nombre FROM profesiones
+    WHERE (:area_val IS NULL OR area = :area_val)
+    AND (:modalidad_val IS NULL OR modalidad = :modalidad_val)
+    AND (:duracion_val IS NULL OR duracion LIKE :duracion_val)
+    AND (:esp_val IS NULL OR especializacion = :esp_val)
+""", {"area_val": Text, "modalidad_val": Text, "duracion_val": Text, "esp_val": Text},
+    [("nombre", Text)])
+
+
+# ================================
+# ESTADÍSTICAS DE POBLACIÓN
+# ================================
+
+_PARAMETROS_ESTADISTICAS = {"desde": Date, "hasta": Date, "tipo_test": Text}
+
+# Las particiones de cada contador se suman aquí
+ESTADISTICAS_DIMENSIONES = _sql("""
+    SELECT dimension, CAST(SUM(n) AS bigint), SUM(suma), SUM(suma_cuadrados)
+    FROM estadisticas_dimensiones
+    WHERE dia BETWEEN :desde AND :hasta
+    AND (:tipo_test IS NULL OR tipo_test = :tipo_test)
+    GROUP BY dimension
+    HAVING SUM(n) > 0
+""", _PARAMETROS_ESTADISTICAS, [
+    ("dimension", Text), ("n", BigInteger), ("suma", Float), ("suma_cuadrados", Float)
+])
+
+ESTADISTICAS_PERFILES = _sql("""
+    SELECT area_principal, perfil_identificado, CAST(SUM(n) AS bigint) AS total
+    FROM estadisticas_perfiles
+    WHERE dia BETWEEN :desde AND :hasta
+    AND (:tipo_test IS NULL OR tipo_test = :tipo_test)
+    GROUP BY area_principal, perfil_identificado
+    HAVING SUM(n) > 0
+""", _PARAMETROS_ESTADISTICAS, [
+    ("area_principal", Text), ("perfil_identificado", Text), ("total", BigInteger)
+])
+
+ESTADISTICAS_POR_DIA = _sql("""
+    SELECT dia, CAST(SUM(n) AS bigint)
+    FROM estadisticas_perfiles
+    WHERE dia BETWEEN :desde AND :hasta
+    AND (:tipo_test IS NULL OR tipo_test = :tipo_test)
+    GROUP BY dia
+    HAVING SUM(n) > 0
+    ORDER BY dia
+""", _PARAMETROS_ESTADISTICAS, [("dia", Date), ("tests", BigInteger)])
+
+
+# ================================
+# VALORES DE EJEMPLO
+# ================================
+
+# Valor de ejemplo por tipo de Python del parámetro
+_VALORES_EJEMPLO = {
+    int: 1,
+    str: "ejemplo",
+    date: date.today(),
+    datetime: datetime.now(),
+    bool: True
+}
+
+def parametros_ejemplo(compilada) -> dict:
+    """
+    Un valor de ejemplo para cada parámetro de una sentencia compilada, según su tipo.
+    Lo usan verificar_consultas.py y verificar_planes.py para ejecutar EXPLAIN.
+    """
+    parametros = {}
+    for nombre, parametro in compilada.binds.items():
+        try:
+            tipo = parametro.type.python_type
+        except NotImplementedError:
+            tipo = str
+        parametros[nombre] = _VALORES_EJEMPLO.get(tipo, "ejemplo")
+    return parametros
+
+
+# ================================
+# REGISTRO
+# ================================
+
+# Familias de sentencias (diccionarios de variantes) y el nombre de cada variante en el
+# registro. Una familia nueva se agrega aquí: los demás diccionarios no se registran
+_FAMILIAS = {
+    "LISTAR_COMENTARIOS": (
+        LISTAR_COMENTARIOS,
+        lambda orden, con_tema: f"[{orden}{',tema' if con_tema else ''}]"
+    )
+}
+
+def _registro() -> dict:
+    registro = {}
+    for nombre, valor in globals().items():
+        if not nombre.startswith("_") and isinstance(valor, (TextClause, TextualSelect)):
+            registro[nombre] = valor
+    
+    for nombre, (familia, variante) in _FAMILIAS.items():
+        for clave, sentencia in familia.items():
+            registro[nombre + variante(*clave)] = sentencia
+    return registro
+
+REGISTRO = _registro()
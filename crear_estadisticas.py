@@ -0,0 +1,147 @@
+# crear_estadisticas.py - Tablas de estadísticas de población
+
+"""
+Script para crear las tablas de estadísticas que lee el tablero de orientadores
+(/api/estadisticas/poblacion) y recalcularlas desde los tests guardados.
+
+Uso:
+    python crear_estadisticas.py
+
+El script:
+1. Crea estadisticas_dimensiones y estadisticas_perfiles si no existen (migraciones.py, versión 3)
+2. Recalcula todos los contadores en una sola transacción: compara, en una misma foto,
+   los tests guardados con los contadores y después suma la diferencia. Las tablas de
+   estadísticas solo se bloquean para sumarla (los guardados esperan un momento); los
+   tests que se guarden o eliminen mientras tanto ya actualizaron sus contadores, así
+   que no se duplican ni se pierden.
+
+Ejecutarlo antes de desplegar (guardar_test necesita las tablas) y una vez más
+después, para contar los tests guardados entre medio. Se puede repetir cuando se quiera.
+"""
+
+from db import SessionLocal, text
+from migraciones import migrar
+from persistencia import PARTICIONES_ESTADISTICAS
+
+def recalcular_estadisticas():
+    """Vuelve a calcular todos los contadores a partir de los tests guardados"""
+    db = SessionLocal()
+    
+    try:
+        # Recorre todo resultados_test una vez: sin el límite de 30s de las sesiones de la app
+        db.execute(text("SET LOCAL statement_timeout = 0"))
+        
+        # Diferencia entre lo que dicen los tests y los contadores actuales, en un solo
+        # statement (la misma foto de ambos). Sin bloquear: los guardados siguen sumando
+        db.execute(text("""
+            CREATE TEMP TABLE correccion_dimensiones ON COMMIT DROP AS
+            SELECT dia, tipo_test, dimension, particion,
+                   SUM(n) AS n, SUM(suma) AS suma, SUM(suma_cuadrados) AS suma_cuadrados
+            FROM (
+                SELECT CAST(t.fecha_realizacion AS date) AS dia, t.tipo_test, d.key AS dimension,
+                       t.id % :particiones AS particion,
+                       COUNT(*) AS n,
+                       SUM(CAST(d.value AS float8)) AS suma,
+                       SUM(CAST(d.value AS float8) ^ 2) AS suma_cuadrados
+                FROM tests_realizados t
+                INNER JOIN resultados_test r ON r.test_id = t.id,
+                     jsonb_each_text(r.datos_adicionales->'puntajes_dimensiones') AS d
+                GROUP BY 1, 2, 3, 4
+                UNION ALL
+                SELECT dia, tipo_test, dimension, particion, -n, -suma, -suma_cuadrados
+                FROM estadisticas_dimensiones
+            ) x
+            GROUP BY 1, 2, 3, 4
+            HAVING SUM(n) <> 0 OR abs(SUM(suma)) > 1e-6 OR abs(SUM(suma_cuadrados)) > 1e-6
+        """), {"particiones": PARTICIONES_ESTADISTICAS})
+        
+        db.execute(text("""
+            CREATE TEMP TABLE correccion_perfiles ON COMMIT DROP AS
+            SELECT dia, tipo_test, area_principal, perfil_identificado, particion, SUM(n) AS n
+            FROM (
+                SELECT CAST(t.fecha_realizacion AS date) AS dia, t.tipo_test,
+                       COALESCE(r.area_principal, '') AS area_principal,
+                       COALESCE(r.datos_adicionales->>'perfil_identificado', '') AS perfil_identificado,
+                       t.id % :particiones AS particion,
+                       COUNT(*) AS n
+                FROM tests_realizados t
+                INNER JOIN resultados_test r ON r.test_id = t.id
+                GROUP BY 1, 2, 3, 4, 5
+                UNION ALL
+                SELECT dia, tipo_test, area_principal, perfil_identificado, particion, -n
+                FROM estadisticas_perfiles
+            ) x
+            GROUP BY 1, 2, 3, 4, 5
+            HAVING SUM(n) <> 0
+        """), {"particiones": PARTICIONES_ESTADISTICAS})
+        
+        # Los tests guardados o eliminados desde la foto ya sumaron o restaron su parte
+        # (en la misma transacción que el test), así que basta con sumar la corrección.
+        # El lock solo dura esto, y evita deadlocks con los guardados
+        db.execute(text("""
+            LOCK TABLE estadisticas_dimensiones, estadisticas_perfiles IN EXCLUSIVE MODE
+        """))
+        
+        dimensiones = db.execute(text("""
+            INSERT INTO estadisticas_dimensiones AS e
+            (dia, tipo_test, dimension, particion, n, suma, suma_cuadrados)
+            SELECT dia, tipo_test, dimension, particion, n, suma, suma_cuadrados
+            FROM correccion_dimensiones
+            ON CONFLICT (dia, tipo_test, dimension, particion) DO UPDATE SET
+                n = e.n + EXCLUDED.n,
+                suma = e.suma + EXCLUDED.suma,
+                suma_cuadrados = e.suma_cuadrados + EXCLUDED.suma_cuadrados
+        """)).rowcount
+        db.execute(text("""
+            DELETE FROM estadisticas_dimensiones e
+            USING correccion_dimensiones c
+            WHERE e.dia = c.dia AND e.tipo_test = c.tipo_test
+            AND e.dimension = c.dimension AND e.particion = c.particion
+            AND e.n = 0
+        """))
+        
+        perfiles = db.execute(text("""
+            INSERT INTO estadisticas_perfiles AS e
+            (dia, tipo_test, area_principal, perfil_identificado, particion, n)
+            SELECT dia, tipo_test, area_principal, perfil_identificado, particion, n
+            FROM correccion_perfiles
+            ON CONFLICT (dia, tipo_test, area_principal, perfil_identificado, particion)
+            DO UPDATE SET n = e.n + EXCLUDED.n
+        """)).rowcount
+        db.execute(text("""
+            DELETE FROM estadisticas_perfiles e
+            USING correccion_perfiles c
+            WHERE e.dia = c.dia AND e.tipo_test = c.tipo_test
+            AND e.area_principal = c.area_principal
+            AND e.perfil_identificado = c.perfil_identificado
+            AND e.particion = c.particion
+            AND e.n = 0
+        """))
+        
+        db.commit()
+        print(f"✅ Contadores recalculados: {dimensiones} de dimensiones y {perfiles} de perfiles corregidos")
+        return True
+    
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error al recalcular estadísticas: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("="*50)
+    print("📊 ESTADÍSTICAS DE POBLACIÓN")
+    print("="*50)
+    
+    print("\n🔧 Paso 1: Preparando tablas...")
+    if not migrar(hasta=3):
+        exit(1)
+    
+    print("\n🔄 Paso 2: Recalculando contadores...")
+    if not recalcular_estadisticas():
+        exit(1)
+    
+    print("\n✅ Proceso completado!")
@@ -0,0 +1,86 @@
+# crear_resumen_usuarios.py - Tabla usuario_resumen y carga inicial
+
+"""
+Script para crear la tabla usuario_resumen y llenarla con los tests existentes.
+
+Uso:
+    python crear_resumen_usuarios.py [--tamano-lote 200]
+
+El script:
+1. Crea la tabla usuario_resumen si no existe (migraciones.py, versiones 2 y 8)
+2. Recalcula el resumen de cada usuario con tests, en lotes por id de usuario
+
+Se puede volver a ejecutar sin problema: cada resumen se recalcula desde cero.
+Después de crear la tabla, guardar_test y eliminar_tests la mantienen al día de forma
+incremental; los endpoints solo la leen (un usuario sin fila aparece sin tests).
+"""
+
+import argparse
+
+from db import SessionLocal, text
+from migraciones import migrar
+from persistencia import actualizar_resumen_usuario
+
+def cargar_resumenes(tamano_lote: int):
+    """Recalcula el resumen de todos los usuarios con tests"""
+    db = SessionLocal()
+    
+    ultimo_id = 0
+    total = 0
+    
+    query_usuarios = text("""
+        SELECT DISTINCT usuario_id
+        FROM tests_realizados
+        WHERE usuario_id > :ultimo_id
+        ORDER BY usuario_id
+        LIMIT :tamano_lote
+    """)
+    
+    try:
+        print("\n🔄 Calculando resúmenes...\n")
+        
+        while True:
+            usuarios = db.execute(query_usuarios, {
+                "ultimo_id": ultimo_id,
+                "tamano_lote": tamano_lote
+            }).scalars().all()
+            
+            if not usuarios:
+                break
+            
+            for usuario_id in usuarios:
+                actualizar_resumen_usuario(db, usuario_id)
+            db.commit()
+            
+            ultimo_id = usuarios[-1]
+            total += len(usuarios)
+            print(f"✅ Lote hasta usuario {ultimo_id}: {len(usuarios)} resúmenes")
+    
+    except Exception as e:
+        db.rollback()
+        print(f"\n❌ Error al calcular resúmenes (los lotes anteriores quedaron guardados): {e}")
+        import traceback
+        traceback.print_exc()
+    
+    finally:
+        db.close()
+    
+    print(f"\n📊 Resúmenes calculados: {total}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crea y llena la tabla usuario_resumen")
+    parser.add_argument("--tamano-lote", type=int, default=200, help="Usuarios por transacción")
+    args = parser.parse_args()
+    
+    print("="*50)
+    print("📋 RESUMEN POR USUARIO")
+    print("="*50)
+    
+    print("\n🔧 Paso 1: Preparando tabla...")
+    if not migrar(hasta=8):
+        exit(1)
+    
+    print("\n🔄 Paso 2: Cargando resúmenes...")
+    cargar_resumenes(args.tamano_lote)
+    
+    print("\n✅ Proceso completado!")
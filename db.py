@@ -1,12 +1,20 @@
 # db.py - Configuración OPTIMIZADA para Supabase
 
 from typing import Annotated
-from fastapi import Depends
-from sqlalchemy import create_engine, text, event
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+import asyncio
 import os
+import time
+import uuid
 from dotenv import load_dotenv
 
+from metricas_sql import instrumentar, medir_espera_pool
+
 # 🔹 Cargar variables de entorno
 load_dotenv()
 URL_DATABASE = os.getenv("URL_DATABASE")
@@ -16,30 +24,73 @@ if not URL_DATABASE:
 
 print(f"🔗 Conectando a: {URL_DATABASE[:30]}...")  # Solo primeros 30 caracteres por seguridad
 
+# ================================
+# MODO DE CONEXIÓN
+# ================================
+# MODO_CONEXION elige cómo se reutilizan las conexiones en cada instancia:
+#   clasico:     pool de 3 (+2) conexiones con pre-ping y reciclado cada 5 minutos
+#   pooler:      sin pool propio (NullPool): cada sesión abre y cierra su conexión contra un
+#                pooler externo (Supabase en el puerto 6543, PgBouncer). Para Vercel: una
+#                lambda congelada no retiene conexiones del servidor.
+#   persistente: pool chico que se abre al arrancar la instancia y se mantiene mientras la
+#                lambda siga caliente, así el primer request no paga la conexión
+MODO_CONEXION = os.getenv("MODO_CONEXION", "clasico").lower()
+
+_OPCIONES_POOL = {
+    "clasico": {
+        "pool_size": 3,
+        "max_overflow": 2,
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+        "pool_timeout": 20,
+        "pool_use_lifo": True
+    },
+    "pooler": {
+        "poolclass": NullPool
+    },
+    "persistente": {
+        "pool_size": 1,
+        "max_overflow": 2,
+        # Una lambda congelada puede volver con la conexión cortada: el pre-ping la descarta
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "pool_timeout": 10,
+        "pool_use_lifo": True
+    }
+}
+
+if MODO_CONEXION not in _OPCIONES_POOL:
+    raise ValueError(f"❌ MODO_CONEXION debe ser uno de: {', '.join(_OPCIONES_POOL)}")
+
+print(f"🔌 Modo de conexión: {MODO_CONEXION}")
+
+def _opciones_pool(clase_por_defecto) -> dict:
+    """Opciones del modo actual, con el pool medido por metricas_sql (espera de conexiones)"""
+    opciones = dict(_OPCIONES_POOL[MODO_CONEXION])
+    opciones["poolclass"] = medir_espera_pool(opciones.get("poolclass", clase_por_defecto))
+    return opciones
+
+# Límites de la sesión en el servidor. Van en el paquete de arranque de la conexión
+# (options / server_settings), no en SETs aparte después de conectar.
+STATEMENT_TIMEOUT_MS = 30000
+IDLE_IN_TRANSACTION_TIMEOUT_MS = 60000
+
 # 🔹 CONFIGURACIÓN CRÍTICA PARA SUPABASE
 engine = create_engine(
     URL_DATABASE,
-    echo=True,  # 🔥 CAMBIADO A TRUE PARA VER QUERIES SQL
+    echo=os.getenv("SQL_ECHO") == "1",  # Solo para depurar: las métricas están en metricas_sql
     future=True,
-    pool_size=3,
-    max_overflow=2,
-    pool_pre_ping=True,
-    pool_recycle=300,
     connect_args={
         "connect_timeout": 10,
-        "options": "-c statement_timeout=30000"
+        "options": (
+            f"-c statement_timeout={STATEMENT_TIMEOUT_MS} "
+            f"-c idle_in_transaction_session_timeout={IDLE_IN_TRANSACTION_TIMEOUT_MS}"
+        )
     },
-    pool_timeout=20,
-    pool_use_lifo=True
+    **_opciones_pool(QueuePool)
 )
 
-# 🔹 Configurar parámetros al conectar
-@event.listens_for(engine, "connect")
-def receive_connect(dbapi_conn, connection_record):
-    cursor = dbapi_conn.cursor()
-    cursor.execute("SET SESSION statement_timeout = '30s'")
-    cursor.execute("SET SESSION idle_in_transaction_session_timeout = '60s'")
-    cursor.close()
+instrumentar(engine)
 
 # 🔹 Configuración de la sesión
 SessionLocal = sessionmaker(
@@ -50,15 +101,174 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
-# 🔹 Dependencia OPTIMIZADA
-def get_db():
-    db = SessionLocal()
-    try:
+# ================================
+# MOTOR ASÍNCRONO (asyncpg) PARA LOS ROUTERS
+# ================================
+# El motor síncrono de arriba queda para los scripts y el guardado diferido.
+
+def _url_async(url: str):
+    """Convierte la URL de psycopg2 al driver asyncpg"""
+    url = make_url(url).set(drivername="postgresql+asyncpg")
+    # asyncpg usa ssl=require en lugar de sslmode=require
+    if "sslmode" in url.query:
+        url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+    return url
+
+URL_DATABASE_ASYNC = _url_async(URL_DATABASE)
+
+# Prepared statements del servidor que asyncpg cachea por conexión (consultas.py):
+#   auto: activados, salvo detrás de un pooler en modo transacción (el de Supabase en el
+#         puerto 6543, o cualquiera con MODO_CONEXION=pooler)
+#   si:   activados también detrás del pooler (PgBouncer >= 1.21 con max_prepared_statements)
+#   no:   desactivados
+SENTENCIAS_PREPARADAS = os.getenv("SENTENCIAS_PREPARADAS", "auto").lower()
+
+def _connect_args_asyncpg(url) -> dict:
+    """Opciones de conexión de asyncpg para el servidor de la URL"""
+    connect_args = {
+        "timeout": 10,
+        "server_settings": {
+            "statement_timeout": str(STATEMENT_TIMEOUT_MS),
+            "idle_in_transaction_session_timeout": str(IDLE_IN_TRANSACTION_TIMEOUT_MS)
+        }
+    }
+    
+    detras_de_pooler = url.port == 6543 or MODO_CONEXION == "pooler"
+    
+    if SENTENCIAS_PREPARADAS == "no" or (SENTENCIAS_PREPARADAS == "auto" and detras_de_pooler):
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+    
+    # Detrás del pooler cada conexión del servidor la comparten varios clientes:
+    # nombres únicos evitan que dos clientes preparen el mismo nombre
+    if detras_de_pooler:
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    
+    return connect_args
+
+async_engine = create_async_engine(
+    URL_DATABASE_ASYNC,
+    connect_args=_connect_args_asyncpg(URL_DATABASE_ASYNC),
+    echo=os.getenv("SQL_ECHO") == "1",
+    **_opciones_pool(AsyncAdaptedQueuePool)
+)
+
+instrumentar(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# 🔹 Dependencia asíncrona: las consultas no bloquean el event loop.
+# Una sesión por request, perezosa: toma una conexión del pool recién en la primera
+# consulta (un visitante anónimo nunca la toma) y la devuelve al terminar el request.
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+SessionDepends = Annotated[AsyncSession, Depends(get_db)]
+
+# ================================
+# RÉPLICA DE LECTURA (OPCIONAL)
+# ================================
+# Con URL_DATABASE_LECTURA, los endpoints de solo lectura (catálogo, foro, historial)
+# consultan la réplica y dejan el primario para las escrituras. Se vuelve al primario si
+# la réplica no responde o está atrasada más de MAX_RETRASO_REPLICA_S segundos, y durante
+# unos segundos después de que el mismo navegador escribe algo (COOKIE_LEER_PRIMARIO).
+URL_DATABASE_LECTURA = os.getenv("URL_DATABASE_LECTURA")
+MAX_RETRASO_REPLICA_S = float(os.getenv("MAX_RETRASO_REPLICA_S", "10"))
+INTERVALO_CHEQUEO_REPLICA_S = float(os.getenv("INTERVALO_CHEQUEO_REPLICA_S", "5"))
+VENTANA_LEER_PRIMARIO_S = int(os.getenv("VENTANA_LEER_PRIMARIO_S", "30"))
+COOKIE_LEER_PRIMARIO = "leer_primario"
+
+async_engine_lectura = None
+AsyncSessionLecturaLocal = None
+
+if URL_DATABASE_LECTURA:
+    _url_lectura = _url_async(URL_DATABASE_LECTURA)
+    async_engine_lectura = create_async_engine(
+        _url_lectura,
+        connect_args=_connect_args_asyncpg(_url_lectura),
+        echo=os.getenv("SQL_ECHO") == "1",
+        **_opciones_pool(AsyncAdaptedQueuePool)
+    )
+    instrumentar(async_engine_lectura.sync_engine)
+    
+    AsyncSessionLecturaLocal = async_sessionmaker(
+        async_engine_lectura,
+        autoflush=False,
+        expire_on_commit=False
+    )
+    print(f"📖 Réplica de lectura: {URL_DATABASE_LECTURA[:30]}...")
+
+# Segundos de atraso de la réplica: 0 si ya aplicó todo lo que recibió
+_QUERY_RETRASO_REPLICA = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_estado_replica = {"disponible": False, "verificado": 0.0}
+_lock_replica = asyncio.Lock()
+
+async def _retraso_replica() -> float:
+    async with async_engine_lectura.connect() as conn:
+        return float((await conn.execute(_QUERY_RETRASO_REPLICA)).scalar())
+
+async def replica_disponible() -> bool:
+    """Si la réplica responde y está al día; se verifica cada INTERVALO_CHEQUEO_REPLICA_S"""
+    if async_engine_lectura is None:
+        return False
+    
+    # Mientras otro request la verifica se usa el último estado conocido, sin esperar
+    vigente = time.monotonic() - _estado_replica["verificado"] < INTERVALO_CHEQUEO_REPLICA_S
+    if vigente or _lock_replica.locked():
+        return _estado_replica["disponible"]
+    
+    async with _lock_replica:
+        try:
+            # Una réplica caída no debe frenar el request más de 2 segundos
+            retraso = await asyncio.wait_for(_retraso_replica(), timeout=2)
+            disponible = retraso <= MAX_RETRASO_REPLICA_S
+            if not disponible:
+                print(f"⚠️ Réplica atrasada {retraso:.1f}s: se lee del primario")
+        except Exception as e:
+            disponible = False
+            print(f"⚠️ Réplica no disponible, se lee del primario: {e!r}")
+        
+        _estado_replica.update({"disponible": disponible, "verificado": time.monotonic()})
+        return disponible
+
+async def get_db_lectura(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Sesión para endpoints de solo lectura: la réplica si se puede, si no la misma sesión
+    del primario que usa el resto del request (sin réplica configurada, siempre esa).
+    """
+    if request.cookies.get(COOKIE_LEER_PRIMARIO) or not await replica_disponible():
         yield db
-    finally:
-        db.close()
+        return
+    
+    async with AsyncSessionLecturaLocal() as db_lectura:
+        yield db_lectura
+
+ReadSessionDepends = Annotated[AsyncSession, Depends(get_db_lectura)]
 
-SessionDepends = Annotated[Session, Depends(get_db)]
+async def precalentar_pool():
+    """En modo persistente abre las conexiones del pool al arrancar la instancia"""
+    if MODO_CONEXION != "persistente":
+        return
+    
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        print("🔥 Pool precalentado")
+    except Exception as e:
+        # Sin conexión al arrancar la app igual funciona: se conectará en el primer request
+        print(f"⚠️ No se pudo precalentar el pool: {e}")
 
 # 🔹 Función para verificar conexión
 def test_connection():
@@ -0,0 +1,218 @@
+# exportar_investigacion.py - Exportación anonimizada de resultados para investigación
+
+"""
+Script para exportar todos los tests con sus resultados, sin datos personales,
+en archivos comprimidos (CSV o NDJSON en .gz) de tamaño acotado.
+
+Uso:
+    python exportar_investigacion.py --salida export_2025 [--formato csv|ndjson]
+        [--desde 2025-01-01] [--hasta 2026-01-01]
+        [--filas-por-archivo 50000] [--tamano-lote 1000]
+
+El script:
+1. Recorre tests_realizados por id, un archivo por tramo de ids, leyendo cada tramo
+   con un cursor del servidor en lotes de --tamano-lote filas
+2. Aplana puntajes_dimensiones en columnas fijas (dim_<dimension>). Los tests sin fila
+   en resultados_test también se exportan, con esas columnas vacías
+3. Reemplaza el usuario por un seudónimo (hash con una sal propia de la exportación),
+   así se pueden relacionar los tests de un mismo estudiante sin identificarlo
+4. Guarda en <salida>/estado.json el último id exportado después de cada archivo
+
+Si se interrumpe, volver a ejecutarlo con la misma --salida continúa desde el último
+archivo completo, con la misma sal y los mismos filtros.
+estado.json guarda la sal de los seudónimos: entregar solo los archivos .gz.
+Se corre fuera de Vercel: no tiene el límite de memoria ni de tiempo de la lambda.
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import secrets
+from datetime import date, datetime
+
+from db import SessionLocal, text
+from tests_config import DIMENSIONES_GENERAL
+
+COLUMNAS = [
+    "test_id", "participante", "tipo_test", "fecha", "puntuacion_total",
+    "area_principal", "perfil_identificado", "porcentaje_afinidad",
+    "score_ajuste", "porcentaje_global"
+] + [f"dim_{dimension}" for dimension in DIMENSIONES_GENERAL]
+
+def seudonimo(sal: str, usuario_id: int) -> str:
+    """Identificador estable del estudiante dentro de una exportación"""
+    return hashlib.sha256(f"{sal}:{usuario_id}".encode()).hexdigest()[:16]
+
+def _registro(fila, sal: str) -> dict:
+    """Convierte una fila de la consulta en el registro anonimizado (sin resultado: columnas vacías)"""
+    datos_adicionales = fila[7] or {}
+    dimensiones = datos_adicionales.get("puntajes_dimensiones") or {}
+    
+    registro = {
+        "test_id": fila[0],
+        "participante": seudonimo(sal, fila[1]),
+        "tipo_test": fila[2],
+        # Solo el día: la hora exacta ayuda a identificar a la persona
+        "fecha": fila[3].date().isoformat() if fila[3] else None,
+        "puntuacion_total": fila[4],
+        "area_principal": fila[5],
+        "perfil_identificado": datos_adicionales.get("perfil_identificado"),
+        "porcentaje_afinidad": float(fila[6]) if fila[6] is not None else None,
+        "score_ajuste": datos_adicionales.get("score_ajuste"),
+        "porcentaje_global": datos_adicionales.get("porcentaje_global")
+    }
+    for dimension in DIMENSIONES_GENERAL:
+        registro[f"dim_{dimension}"] = dimensiones.get(dimension)
+    
+    return registro
+
+def _guardar_estado(salida: str, estado: dict):
+    """Escribe estado.json de forma atómica"""
+    ruta = os.path.join(salida, "estado.json")
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2)
+    os.replace(ruta + ".tmp", ruta)
+
+def _cargar_estado(salida: str, args) -> dict:
+    """Retoma una exportación existente o inicia una nueva"""
+    ruta = os.path.join(salida, "estado.json")
+    
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            estado = json.load(f)
+        print(f"🔁 Retomando exportación desde el test {estado['ultimo_id']} "
+              f"({len(estado['archivos'])} archivos ya completos)")
+        return estado
+    
+    os.makedirs(salida, exist_ok=True)
+    return {
+        "creado": datetime.now().isoformat(),
+        "formato": args.formato,
+        "desde": args.desde.isoformat() if args.desde else None,
+        "hasta": args.hasta.isoformat() if args.hasta else None,
+        "filas_por_archivo": args.filas_por_archivo,
+        "sal": secrets.token_hex(16),
+        "columnas": COLUMNAS,
+        "ultimo_id": 0,
+        "completo": False,
+        "archivos": []
+    }
+
+def exportar_archivo(estado: dict, salida: str, tamano_lote: int) -> int:
+    """
+    Exporta el siguiente tramo de tests (a partir de ultimo_id) en un archivo.
+    Retorna la cantidad de filas; 0 cuando no quedan tests.
+    """
+    query = text("""
+        SELECT
+            t.id,
+            t.usuario_id,
+            t.tipo_test,
+            t.fecha_realizacion,
+            t.puntuacion_total,
+            r.area_principal,
+            r.porcentaje_afinidad,
+            r.datos_adicionales
+        FROM tests_realizados t
+        LEFT JOIN resultados_test r ON t.id = r.test_id
+        WHERE t.id > :ultimo_id
+        AND (CAST(:desde AS date) IS NULL OR t.fecha_realizacion >= CAST(:desde AS date))
+        AND (CAST(:hasta AS date) IS NULL OR t.fecha_realizacion < CAST(:hasta AS date))
+        ORDER BY t.id
+        LIMIT :filas_por_archivo
+    """).execution_options(yield_per=tamano_lote)
+    
+    numero = len(estado["archivos"]) + 1
+    nombre = f"resultados_{numero:05d}.{estado['formato']}.gz"
+    ruta = os.path.join(salida, nombre)
+    
+    db = SessionLocal()
+    filas = 0
+    ultimo_id = estado["ultimo_id"]
+    
+    try:
+        resultado = db.execute(query, {
+            "ultimo_id": estado["ultimo_id"],
+            "desde": estado["desde"],
+            "hasta": estado["hasta"],
+            "filas_por_archivo": estado["filas_por_archivo"]
+        })
+        
+        # Se escribe en un temporal: un archivo a medias nunca queda con el nombre final
+        with gzip.open(ruta + ".tmp", "wt", encoding="utf-8", newline="") as archivo:
+            if estado["formato"] == "csv":
+                writer = csv.DictWriter(archivo, fieldnames=COLUMNAS)
+                writer.writeheader()
+                escribir = writer.writerow
+            else:
+                escribir = lambda registro: archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            
+            for fila in resultado:
+                escribir(_registro(fila, estado["sal"]))
+                ultimo_id = fila[0]
+                filas += 1
+    
+    finally:
+        db.close()
+    
+    if filas == 0:
+        os.remove(ruta + ".tmp")
+        return 0
+    
+    os.replace(ruta + ".tmp", ruta)
+    
+    estado["ultimo_id"] = ultimo_id
+    estado["archivos"].append({"nombre": nombre, "filas": filas, "hasta_id": ultimo_id})
+    _guardar_estado(salida, estado)
+    
+    print(f"✅ {nombre}: {filas} tests (hasta id {ultimo_id})")
+    return filas
+
+def exportar(args):
+    """Exporta archivo por archivo hasta que no queden tests"""
+    estado = _cargar_estado(args.salida, args)
+    _guardar_estado(args.salida, estado)
+    
+    total = 0
+    try:
+        while exportar_archivo(estado, args.salida, args.tamano_lote):
+            total += estado["archivos"][-1]["filas"]
+        
+        estado["completo"] = True
+        _guardar_estado(args.salida, estado)
+    
+    except Exception as e:
+        print(f"\n❌ Error en la exportación (los archivos completos quedaron guardados): {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    
+    print("\n" + "="*50)
+    print("📊 REPORTE DE EXPORTACIÓN")
+    print("="*50)
+    print(f"✅ Tests exportados en esta ejecución: {total}")
+    print(f"📁 Archivos: {len(estado['archivos'])} en {args.salida}")
+    print("⚠️  Entregar solo los archivos .gz: estado.json contiene la sal de los seudónimos")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta resultados anonimizados para investigación")
+    parser.add_argument("--salida", required=True, help="Carpeta de la exportación (se retoma si ya existe)")
+    parser.add_argument("--formato", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Fecha inicial (incluida)")
+    parser.add_argument("--hasta", type=date.fromisoformat, help="Fecha final (excluida)")
+    parser.add_argument("--filas-por-archivo", type=int, default=50000, help="Tests por archivo")
+    parser.add_argument("--tamano-lote", type=int, default=1000, help="Filas por lectura del cursor")
+    args = parser.parse_args()
+    
+    print("="*50)
+    print("🔬 EXPORTACIÓN PARA INVESTIGACIÓN")
+    print("="*50 + "\n")
+    
+    if not exportar(args):
+        exit(1)
+    
+    print("\n✅ Proceso completado!")
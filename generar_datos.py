@@ -0,0 +1,761 @@
+# generar_datos.py - Dataset sintético reproducible a escala de producción
+
+"""
+Script para llenar una base local (o de staging) con datos sintéticos realistas de todas
+las tablas que usa la app: usuarios, tests con sus respuestas y resultados, foro y catálogo
+de programas. Con las bases de desarrollo vacías los benchmarks y los planes no dicen nada.
+
+Uso:
+    python generar_datos.py [--tests 1000000] [--programas 2000] [--semilla 42]
+        [--procesos 4] [--hasta 2026-01-31]
+
+El script:
+1. Solo corre contra una base local (salvo --permitir-remoto) y aplica las migraciones
+   pendientes (migraciones.py)
+2. Reserva los rangos de ids avanzando las secuencias, así cada bloque conoce los ids de
+   sus filas sin consultar la base, y los anota en la tabla datos_sinteticos
+3. Carga el catálogo (universidades, áreas, modalidades, campus, programas y sus tablas
+   intermedias) y los usuarios (--tests / 5, con rol estudiante, profesor o institucion)
+4. Genera los tests en bloques de TAMANO_BLOQUE y los carga con COPY desde --procesos
+   procesos en paralelo. Cada estudiante tiene un perfil latente (uno de
+   PERFILES_DETALLADOS, o ninguno) que orienta sus respuestas: en el test general según la
+   matriz de pesos de tests_config, en los específicos según su afinidad por los
+   indicadores clave de los perfiles del área; los resultados se calculan con calcular_resultados_test, igual que en
+   procesar_test. Pocos usuarios concentran muchos tests, en los últimos dos años.
+5. Genera los comentarios del foro (--tests / 4) de la misma forma y recalcula
+   temas_populares
+6. Recalcula usuario_resumen de los usuarios sintéticos y las estadísticas de población
+   (crear_estadisticas.py), actualiza las estadísticas del planificador (ANALYZE) y marca
+   la carga como completada
+
+Es determinista: con la misma --semilla, --tests, --programas y --hasta genera exactamente
+los mismos datos, con cualquier número de --procesos (cada bloque tiene su propia semilla).
+Se carga una sola vez por base: si hay una carga completada no hace nada, y si una carga
+anterior falló a medias primero borra sus filas (por los rangos de ids anotados).
+Las respuestas se guardan según ALMACENAMIENTO_RESPUESTAS, como en guardar_test.
+Todos los usuarios sintéticos entran con la contraseña CONTRASENA_SINTETICA.
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.engine import make_url
+
+from auth import get_password_hash
+from crear_estadisticas import recalcular_estadisticas
+from db import URL_DATABASE, engine, text
+from migraciones import migrar
+from persistencia import ALMACENAMIENTO_RESPUESTAS, empaquetar_respuestas
+from tests_config import (
+    DIMENSIONES_GENERAL, MATRIZ_PESOS_GENERAL, PERFILES_DETALLADOS, PUNTUACION_VALORES,
+    TESTS_CONFIG, calcular_resultados_test
+)
+
+# Tests por bloque: es la unidad de generación, de semilla y de transacción.
+# Cambiarlo cambia los datos generados.
+TAMANO_BLOQUE = 5000
+
+# Prefijo de los emails sintéticos: sintetico.1@ejemplo.com, sintetico.2@ejemplo.com, ...
+PREFIJO_EMAIL = "sintetico."
+CONTRASENA_SINTETICA = "sintetico123"
+
+DIAS_HISTORIAL = 730
+
+# Proporción de tests de cada tipo (el general es el de la página principal)
+PROPORCION_TIPOS = {"general": 0.6, "tecnologia": 0.1, "ciencias": 0.1, "ingenieria": 0.1, "economia": 0.1}
+
+# Estudiantes sin un perfil definido: sus respuestas rondan lo neutral
+PROPORCION_EXPLORATORIOS = 0.15
+
+# Temas del formulario del foro (static/js/foro.js) con su peso y nombre visible
+TEMAS_FORO = {
+    "orientacion": (0.30, "Orientación Vocacional"),
+    "carreras": (0.25, "Carreras"),
+    "universidades": (0.20, "Universidades"),
+    "becas": (0.12, "Becas y Ayudas"),
+    "experiencias": (0.08, "Experiencias"),
+    "otros": (0.05, "Otros")
+}
+
+
+# ================================
+# VALORES DE LOS DATOS
+# ================================
+
+_NOMBRES = [
+    "Ana", "Andrés", "Camila", "Carlos", "Daniela", "David", "Juliana", "Felipe", "Laura",
+    "Juan", "María", "Mateo", "Natalia", "Santiago", "Sofía", "Sebastián", "Valentina",
+    "Alejandro", "Paula", "Nicolás", "Isabella", "Samuel", "Manuela", "Tomás"
+]
+_APELLIDOS = [
+    "Gómez", "Rodríguez", "López", "Martínez", "García", "Hernández", "Pérez", "Sánchez",
+    "Ramírez", "Torres", "Díaz", "Restrepo", "Vargas", "Castro", "Ospina", "Moreno",
+    "Jaramillo", "Cardona", "Rojas", "Muñoz"
+]
+
+_CIUDADES = [
+    ("Medellín", "Antioquia", "604"), ("Bogotá", "Cundinamarca", "601"),
+    ("Cali", "Valle del Cauca", "602"), ("Barranquilla", "Atlántico", "605"),
+    ("Bucaramanga", "Santander", "607"), ("Manizales", "Caldas", "606"),
+    ("Pereira", "Risaralda", "606"), ("Cartagena", "Bolívar", "605")
+]
+
+# Área de conocimiento (nombre, color, icono) de los programas de cada perfil
+_AREAS_PERFIL = {
+    "desarrollador_software": ("Tecnología e Informática", "#2563eb", "laptop"),
+    "innovador_tecnologico": ("Tecnología e Informática", "#2563eb", "laptop"),
+    "analista_datos": ("Matemáticas y Estadística", "#7c3aed", "chart"),
+    "cientifico_investigador": ("Ciencias Naturales", "#059669", "flask"),
+    "ingeniero_constructor": ("Ingeniería", "#d97706", "tools"),
+    "ingeniero_ambiental": ("Ingeniería", "#d97706", "tools"),
+    "estratega_negocios": ("Economía y Administración", "#dc2626", "briefcase"),
+    "gestor_proyectos": ("Economía y Administración", "#dc2626", "briefcase"),
+    "comunicador_creativo": ("Artes y Comunicación", "#db2777", "palette")
+}
+
+_MODALIDADES = [("Presencial", 0.8), ("Virtual", 0.25), ("Distancia", 0.15)]
+
+_FRASES_FORO = {
+    "orientacion": [
+        "No sé si elegir una carrera por gusto o por salida laboral.",
+        "El test me salió con un perfil que no esperaba, ¿a alguien más le pasó?",
+        "¿Vale la pena hablar con un orientador antes de inscribirse?"
+    ],
+    "carreras": [
+        "¿Qué tan pesada es la matemática en los primeros semestres?",
+        "Estoy entre dos carreras y quisiera conocer experiencias de egresados.",
+        "¿Alguien sabe cómo es el campo laboral de esta carrera en la región?"
+    ],
+    "universidades": [
+        "¿Qué tal es la acreditación de esta universidad?",
+        "Busco opiniones sobre los laboratorios y los profesores.",
+        "¿Cuándo abren las inscripciones del próximo semestre?"
+    ],
+    "becas": [
+        "Comparto la convocatoria de becas que salió esta semana.",
+        "¿Alguien aplicó al crédito educativo? ¿Cuánto se demoraron?",
+        "¿Las becas cubren también la manutención?"
+    ],
+    "experiencias": [
+        "Terminé el primer semestre y les cuento cómo me fue.",
+        "Cambié de carrera a mitad de camino y no me arrepiento.",
+        "Hice prácticas en una empresa del sector y aprendí mucho."
+    ],
+    "otros": [
+        "¿Qué libros recomiendan para prepararse para el examen de admisión?",
+        "Gracias a todos por las respuestas, me sirvieron mucho.",
+        "¿Hay grupos de estudio para las pruebas de Estado?"
+    ]
+}
+
+_LETRAS = {puntos: letra for letra, puntos in PUNTUACION_VALORES.items()}
+_PERFILES = [perfil_id for perfil_id in PERFILES_DETALLADOS if perfil_id in _AREAS_PERFIL]
+_INDICE_DIMENSION = {dimension: i for i, dimension in enumerate(DIMENSIONES_GENERAL)}
+
+# Perfiles del área de cada test específico. Sus preguntas no tienen fila en la matriz del
+# test general (los ids 1-30 son otras preguntas): se responden según la afinidad por los
+# indicadores clave de estos perfiles
+_PERFILES_TIPO = {
+    "tecnologia": ("desarrollador_software", "innovador_tecnologico", "analista_datos"),
+    "ciencias": ("cientifico_investigador",),
+    "ingenieria": ("ingeniero_constructor", "ingeniero_ambiental"),
+    "economia": ("estratega_negocios", "gestor_proyectos")
+}
+_DIMENSIONES_TIPO = {
+    tipo_test: tuple(sorted({
+        _INDICE_DIMENSION[dimension]
+        for perfil_id in perfiles
+        for dimension in PERFILES_DETALLADOS[perfil_id]["indicadores_clave"]
+    }))
+    for tipo_test, perfiles in _PERFILES_TIPO.items()
+}
+
+def _email(n: int) -> str:
+    return f"{PREFIJO_EMAIL}{n}@ejemplo.com"
+
+def _nombre(n: int, semilla: int) -> str:
+    rnd = random.Random(f"{semilla}-nombre-{n}")
+    return f"{rnd.choice(_NOMBRES)} {rnd.choice(_APELLIDOS)}"
+
+def _arreglo(valores) -> str:
+    """Literal de un arreglo de Postgres para COPY"""
+    elementos = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in valores)
+    return "{" + ",".join(f'"{e}"' for e in elementos) + "}"
+
+def _fecha(rnd: random.Random, hasta: datetime) -> datetime:
+    return hasta - timedelta(seconds=int(rnd.random() * DIAS_HISTORIAL * 86400))
+
+
+# ================================
+# RESPUESTAS DE LOS TESTS
+# ================================
+
+def _afinidades(semilla: int, n: int) -> list:
+    """
+    Afinidad (1-5) del estudiante n por cada dimensión: alta en los indicadores de su
+    perfil latente y alrededor de su propio nivel base en las demás
+    """
+    rnd = random.Random(f"{semilla}-perfil-{n}")
+    base = rnd.uniform(2.2, 3.4)
+    afinidades = [min(5.0, max(1.0, rnd.gauss(base, 0.5))) for _ in DIMENSIONES_GENERAL]
+    
+    if rnd.random() >= PROPORCION_EXPLORATORIOS:
+        perfil = PERFILES_DETALLADOS[rnd.choice(_PERFILES)]
+        for dimension in perfil.get("indicadores_secundarios", {}):
+            indice = _INDICE_DIMENSION[dimension]
+            afinidades[indice] = max(afinidades[indice], rnd.uniform(3.4, 4.6))
+        for dimension in perfil["indicadores_clave"]:
+            afinidades[_INDICE_DIMENSION[dimension]] = rnd.uniform(4.0, 5.0)
+    
+    return afinidades
+
+def _esperado(afinidades: list, fila) -> float:
+    """
+    Una pregunta atrae si atrae alguna de sus dimensiones: el valor esperado es el punto
+    medio entre la afinidad máxima y la ponderada (con solo la ponderada casi todos los
+    tests quedan en el perfil exploratorio)
+    """
+    ponderada = sum(afinidades[indice] * peso for indice, peso in fila) / sum(peso for _, peso in fila)
+    return (max(afinidades[indice] for indice, _ in fila) + ponderada) / 2
+
+def _responder(rnd: random.Random, tipo_test: str, afinidades: list) -> dict:
+    """
+    Hoja de respuestas. En el test general cada pregunta se responde según la afinidad por
+    sus dimensiones en MATRIZ_PESOS_GENERAL; en los específicos, todas según la afinidad
+    por los indicadores clave de los perfiles del área (_PERFILES_TIPO).
+    """
+    if tipo_test == "general":
+        filas = MATRIZ_PESOS_GENERAL
+        esperado_tipo = sum(afinidades) / len(afinidades)
+    else:
+        filas = {}
+        esperado_tipo = _esperado(afinidades, [(indice, 1.0) for indice in _DIMENSIONES_TIPO[tipo_test]])
+    
+    respuestas = {}
+    for pregunta in TESTS_CONFIG[tipo_test]["preguntas"]:
+        fila = filas.get(pregunta["id"])
+        esperado = _esperado(afinidades, fila) if fila else esperado_tipo
+        puntos = min(5, max(1, round(rnd.gauss(esperado, 0.7))))
+        respuestas[f"pregunta_{pregunta['id']}"] = _LETRAS[puntos]
+    return respuestas
+
+
+# ================================
+# BLOQUES (UNO POR PROCESO A LA VEZ)
+# ================================
+
+def _iniciar_proceso():
+    # Las conexiones heredadas del proceso principal no se pueden compartir
+    engine.dispose(close=False)
+
+def _copiar(cursor, tabla: str, columnas: list, filas: list):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(filas)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def _cargar(copias: list):
+    """Ejecuta los COPY de un bloque en una sola transacción"""
+    conexion = engine.raw_connection()
+    try:
+        cursor = conexion.cursor()
+        for tabla, columnas, filas in copias:
+            _copiar(cursor, tabla, columnas, filas)
+        conexion.commit()
+    finally:
+        conexion.close()
+
+def _bloque_tests(bloque: int, p: dict) -> int:
+    """Genera y carga los tests [bloque * TAMANO_BLOQUE, ...) con sus respuestas y resultados"""
+    rnd = random.Random(f"{p['semilla']}-tests-{bloque}")
+    hasta = datetime.combine(p["hasta"], datetime.min.time())
+    compacto = p["almacenamiento"] == "compacto"
+    tipos = list(PROPORCION_TIPOS)
+    pesos = list(PROPORCION_TIPOS.values())
+    
+    tests = []
+    resultados = []
+    respuestas_filas = []
+    afinidades = {}
+    
+    primero = bloque * TAMANO_BLOQUE
+    for i in range(primero, min(primero + TAMANO_BLOQUE, p["tests"])):
+        test_id = p["primer_test"] + i
+        n = 1 + min(int(rnd.random() ** 1.5 * p["usuarios"]), p["usuarios"] - 1)
+        if n not in afinidades:
+            afinidades[n] = _afinidades(p["semilla"], n)
+        
+        tipo_test = rnd.choices(tipos, pesos)[0]
+        respuestas = _responder(rnd, tipo_test, afinidades[n])
+        resultado = calcular_resultados_test(tipo_test, respuestas)
+        
+        tests.append([
+            test_id, p["primer_usuario"] + n - 1, tipo_test, resultado["puntuacion_total"], True,
+            _fecha(rnd, hasta), uuid.UUID(int=rnd.getrandbits(128), version=4),
+            _arreglo(empaquetar_respuestas(tipo_test, respuestas)) if compacto else None
+        ])
+        
+        # Mismos valores que guardar_test
+        datos_adicionales = {
+            "perfil_identificado": resultado.get("perfil_identificado", ""),
+            "score_ajuste": float(resultado.get("score_ajuste", 0)),
+            "porcentaje_global": float(resultado.get("porcentaje_global", 0)),
+            "puntajes_dimensiones": resultado.get("puntajes_dimensiones", {})
+        }
+        resultados.append([
+            test_id, resultado["area_principal"], float(resultado["score_ajuste"]),
+            json.dumps(resultado["carreras_recomendadas"]),
+            _arreglo(resultado["fortalezas"]), _arreglo(resultado["areas_desarrollo"]),
+            resultado["mensaje"], json.dumps(datos_adicionales),
+            _arreglo(resultado.get("campo_laboral", []))
+        ])
+        
+        if not compacto:
+            for pregunta, respuesta in respuestas.items():
+                respuestas_filas.append([
+                    test_id, int(pregunta.split("_")[1]), respuesta, PUNTUACION_VALORES[respuesta]
+                ])
+    
+    copias = [
+        ("tests_realizados", ["id", "usuario_id", "tipo_test", "puntuacion_total", "completado",
+                              "fecha_realizacion", "token_envio", "respuestas_compactas"], tests),
+        ("resultados_test", ["test_id", "area_principal", "porcentaje_afinidad", "carreras_recomendadas",
+                             "fortalezas", "areas_desarrollo", "descripcion_perfil",
+                             "datos_adicionales", "campo_laboral"], resultados)
+    ]
+    if not compacto:
+        copias.append(("respuestas_test", ["test_id", "pregunta_id", "respuesta", "puntos"], respuestas_filas))
+    
+    _cargar(copias)
+    return len(tests)
+
+def _bloque_comentarios(bloque: int, p: dict) -> int:
+    """Genera y carga los comentarios [bloque * TAMANO_BLOQUE, ...) del foro"""
+    rnd = random.Random(f"{p['semilla']}-comentarios-{bloque}")
+    hasta = datetime.combine(p["hasta"], datetime.min.time())
+    temas = list(TEMAS_FORO)
+    pesos = [peso for peso, _ in TEMAS_FORO.values()]
+    
+    comentarios = []
+    primero = bloque * TAMANO_BLOQUE
+    for i in range(primero, min(primero + TAMANO_BLOQUE, p["comentarios"])):
+        tema = rnd.choices(temas, pesos)[0]
+        fecha = _fecha(rnd, hasta)
+        comentarios.append([
+            p["primer_comentario"] + i, _nombre(1 + int(rnd.random() ** 1.5 * p["usuarios"]), p["semilla"]), tema,
+            " ".join(rnd.sample(_FRASES_FORO[tema], rnd.randint(1, 3))), fecha, fecha,
+            int(rnd.random() ** 4 * 200),
+            # Uno de cada diez comentarios está inactivo (eliminado por moderación)
+            rnd.random() >= 0.1
+        ])
+    
+    _cargar([("comentarios_foro", ["id", "nombre", "tema", "contenido", "fecha_creacion",
+                                   "fecha_actualizacion", "likes", "activo"], comentarios)])
+    return len(comentarios)
+
+def _ejecutar_bloque(tarea) -> tuple:
+    tipo, bloque, parametros = tarea
+    funcion = _bloque_tests if tipo == "tests" else _bloque_comentarios
+    return tipo, funcion(bloque, parametros)
+
+
+# ================================
+# CATÁLOGO Y USUARIOS
+# ================================
+
+def _reservar_ids(connection, tabla: str, cantidad: int) -> int:
+    """Avanza la secuencia de la tabla en `cantidad` ids; retorna el primero reservado"""
+    return connection.execute(text(f"""
+        SELECT setval(pg_get_serial_sequence('{tabla}', 'id'),
+                      GREATEST(nextval(pg_get_serial_sequence('{tabla}', 'id')),
+                               COALESCE((SELECT MAX(id) FROM {tabla}), 0) + 1) + :cantidad - 1)
+               - :cantidad + 1
+    """), {"cantidad": cantidad}).scalar()
+
+def _catalogo(semilla: int, programas: int, ids: dict) -> list:
+    """Filas del catálogo con los ids ya reservados"""
+    rnd = random.Random(f"{semilla}-catalogo")
+    
+    total_universidades = max(programas // 25, 1)
+    universidades = []
+    for i in range(total_universidades):
+        ciudad, departamento, indicativo = rnd.choice(_CIUDADES)
+        sigla = f"U{i + 1}"
+        universidades.append([
+            ids["universidades"] + i, f"Universidad {rnd.choice(_APELLIDOS)} de {ciudad}", sigla,
+            f"https://www.{sigla.lower()}.edu.co", "Pública" if rnd.random() < 0.35 else "Privada",
+            ciudad, departamento, f"Calle {rnd.randint(1, 120)} # {rnd.randint(1, 99)}-{rnd.randint(1, 99)}",
+            f"{indicativo} {rnd.randint(2000000, 7999999)}", f"info@{sigla.lower()}.edu.co", True
+        ])
+    
+    nombres_areas = list(dict.fromkeys(_AREAS_PERFIL.values()))
+    areas = [
+        [ids["areas_conocimiento"] + i, nombre, f"Programas de {nombre.lower()}", color, icono, True]
+        for i, (nombre, color, icono) in enumerate(nombres_areas)
+    ]
+    id_area = {valores: ids["areas_conocimiento"] + i for i, valores in enumerate(nombres_areas)}
+    
+    modalidades = [
+        [ids["modalidades"] + i, nombre, f"Modalidad {nombre.lower()}", True]
+        for i, (nombre, _) in enumerate(_MODALIDADES)
+    ]
+    
+    total_campus = max(programas // 10, 1)
+    campus = []
+    for i in range(total_campus):
+        ciudad, _, indicativo = rnd.choice(_CIUDADES)
+        campus.append([
+            ids["campus"] + i, f"Campus {rnd.choice(_APELLIDOS)}",
+            f"Carrera {rnd.randint(1, 90)} # {rnd.randint(1, 99)}-{rnd.randint(1, 99)}",
+            ciudad, f"{indicativo} {rnd.randint(2000000, 7999999)}", i % 4 == 0, True
+        ])
+    
+    # Los programas llevan los nombres de las carreras de cada perfil
+    carreras = [
+        (carrera["nombre"], perfil_id)
+        for perfil_id in _PERFILES
+        for carrera in PERFILES_DETALLADOS[perfil_id]["carreras"]
+    ]
+    filas_programas = []
+    filas_modalidades = []
+    filas_campus = []
+    for i in range(programas):
+        programa_id = ids["programas_academicos"] + i
+        nombre, perfil_id = rnd.choice(carreras)
+        perfil = PERFILES_DETALLADOS[perfil_id]
+        filas_programas.append([
+            programa_id, nombre, f"SNIES{100000 + i}", ids["universidades"] + rnd.randrange(total_universidades),
+            id_area[_AREAS_PERFIL[perfil_id]], rnd.choice([8, 9, 10, 10, 10]), rnd.randint(140, 180),
+            f"Profesional en {nombre}", f"Programa de {nombre} orientado a {perfil['nombre'].lower()}.",
+            perfil["descripcion"], ", ".join(perfil.get("campo_laboral", [])),
+            rnd.randrange(2500000, 15000000, 50000),
+            # Uno de cada veinte programas ya no tiene inscripciones abiertas
+            rnd.random() >= 0.05
+        ])
+        
+        elegidas = [ids["modalidades"] + j for j, (_, p) in enumerate(_MODALIDADES) if rnd.random() < p]
+        for modalidad_id in elegidas or [ids["modalidades"]]:
+            filas_modalidades.append([programa_id, modalidad_id])
+        for campus_id in rnd.sample(range(total_campus), rnd.randint(1, min(3, total_campus))):
+            filas_campus.append([programa_id, ids["campus"] + campus_id])
+    
+    return [
+        ("universidades", ["id", "nombre", "sigla", "website", "tipo_universidad", "ciudad",
+                           "departamento", "direccion", "telefono", "email", "activo"], universidades),
+        ("areas_conocimiento", ["id", "nombre", "descripcion", "color_hex", "icono", "activo"], areas),
+        ("modalidades", ["id", "nombre", "descripcion", "activo"], modalidades),
+        ("campus", ["id", "nombre", "direccion", "ciudad", "telefono", "es_principal", "activo"], campus),
+        ("programas_academicos", ["id", "nombre", "codigo_snies", "universidad_id", "area_id",
+                                  "duracion_semestres", "creditos", "titulo_otorgado", "descripcion",
+                                  "perfil_profesional", "campo_laboral", "costo_semestre", "activo"],
+         filas_programas),
+        ("programa_modalidades", ["programa_id", "modalidad_id"], filas_modalidades),
+        ("programa_campus", ["programa_id", "campus_id"], filas_campus)
+    ]
+
+def _usuarios(semilla: int, usuarios: int, primer_usuario: int) -> list:
+    rnd = random.Random(f"{semilla}-usuarios")
+    contrasena = get_password_hash(CONTRASENA_SINTETICA)
+    filas = []
+    for n in range(1, usuarios + 1):
+        azar = rnd.random()
+        rol = "institucion" if azar < 0.002 else "profesor" if azar < 0.012 else "estudiante"
+        filas.append([primer_usuario + n - 1, _nombre(n, semilla), _email(n), rol, contrasena])
+    return [("usuarios", ["id", "nombre", "gmail", "rol", "contraseña"], filas)]
+
+
+# ================================
+# TABLAS DERIVADAS
+# ================================
+
+# Mismo cálculo que persistencia._QUERY_ACTUALIZAR_RESUMEN, para todos los usuarios
+# de un rango de ids a la vez
+_QUERY_RESUMENES = text("""
+    WITH tests AS (
+        SELECT t.usuario_id, t.tipo_test, t.fecha_realizacion, r.area_principal, r.datos_adicionales
+        FROM tests_realizados t
+        LEFT JOIN resultados_test r ON t.id = r.test_id
+        WHERE t.usuario_id BETWEEN :desde AND :hasta AND t.completado = true
+    ),
+    totales AS (
+        SELECT usuario_id, COUNT(*) AS total_tests FROM tests GROUP BY usuario_id
+    ),
+    ultimo AS (
+        SELECT DISTINCT ON (usuario_id) usuario_id, tipo_test, fecha_realizacion
+        FROM tests
+        ORDER BY usuario_id, fecha_realizacion DESC
+    ),
+    areas AS (
+        SELECT usuario_id, area_principal, COUNT(*) AS n, MAX(fecha_realizacion) AS fecha
+        FROM tests
+        WHERE area_principal IS NOT NULL
+        GROUP BY usuario_id, area_principal
+    ),
+    area AS (
+        SELECT DISTINCT ON (usuario_id) usuario_id, area_principal
+        FROM areas
+        ORDER BY usuario_id, n DESC, fecha DESC
+    ),
+    conteo AS (
+        SELECT usuario_id, jsonb_object_agg(area_principal, n) AS areas
+        FROM areas
+        GROUP BY usuario_id
+    ),
+    general AS (
+        SELECT DISTINCT ON (usuario_id) usuario_id,
+               datos_adicionales->'puntajes_dimensiones' AS dimensiones, fecha_realizacion
+        FROM tests
+        WHERE tipo_test = 'general' AND datos_adicionales IS NOT NULL
+        ORDER BY usuario_id, fecha_realizacion DESC
+    )
+    INSERT INTO usuario_resumen
+    (usuario_id, total_tests, ultimo_tipo_test, ultima_fecha,
+     area_mas_fuerte, conteo_areas, dimensiones, fecha_dimensiones, actualizado)
+    SELECT t.usuario_id, t.total_tests, u.tipo_test, u.fecha_realizacion,
+           a.area_principal, COALESCE(c.areas, CAST('{}' AS jsonb)),
+           g.dimensiones, g.fecha_realizacion, CURRENT_TIMESTAMP
+    FROM totales t
+    INNER JOIN ultimo u ON u.usuario_id = t.usuario_id
+    LEFT JOIN area a ON a.usuario_id = t.usuario_id
+    LEFT JOIN conteo c ON c.usuario_id = t.usuario_id
+    LEFT JOIN general g ON g.usuario_id = t.usuario_id
+    ON CONFLICT (usuario_id) DO UPDATE SET
+        total_tests = EXCLUDED.total_tests,
+        ultimo_tipo_test = EXCLUDED.ultimo_tipo_test,
+        ultima_fecha = EXCLUDED.ultima_fecha,
+        area_mas_fuerte = EXCLUDED.area_mas_fuerte,
+        conteo_areas = EXCLUDED.conteo_areas,
+        dimensiones = EXCLUDED.dimensiones,
+        fecha_dimensiones = EXCLUDED.fecha_dimensiones,
+        actualizado = EXCLUDED.actualizado
+""")
+
+_QUERY_TEMAS_POPULARES = text("""
+    INSERT INTO temas_populares (tema, nombre_display, contador, ultima_actualizacion)
+    SELECT c.tema, COALESCE(n.nombre_display, initcap(c.tema)), COUNT(*), MAX(c.fecha_creacion)
+    FROM comentarios_foro c
+    LEFT JOIN unnest(CAST(:temas AS text[]), CAST(:nombres AS text[])) AS n(tema, nombre_display)
+        ON n.tema = c.tema
+    WHERE c.activo = true AND c.tema IS NOT NULL
+    GROUP BY c.tema, n.nombre_display
+    ON CONFLICT (tema) DO UPDATE SET
+        contador = EXCLUDED.contador,
+        ultima_actualizacion = EXCLUDED.ultima_actualizacion
+""")
+
+def _tablas_derivadas(primer_usuario: int, usuarios: int):
+    with engine.begin() as connection:
+        connection.execute(text("SET LOCAL statement_timeout = 0"))
+        resumenes = connection.execute(_QUERY_RESUMENES, {
+            "desde": primer_usuario,
+            "hasta": primer_usuario + usuarios - 1
+        }).rowcount
+        print(f"   ✅ usuario_resumen: {resumenes}")
+        
+        temas = connection.execute(_QUERY_TEMAS_POPULARES, {
+            "temas": list(TEMAS_FORO),
+            "nombres": [nombre for _, nombre in TEMAS_FORO.values()]
+        }).rowcount
+        print(f"   ✅ temas_populares: {temas}")
+
+
+# ================================
+# GENERACIÓN
+# ================================
+
+# Una fila por carga con los rangos de ids reservados ({tabla: [primero, cantidad]}).
+# `completado` se escribe como último paso: una carga sin completar se puede deshacer
+_QUERY_CREAR_MARCA = text("""
+    CREATE TABLE IF NOT EXISTS datos_sinteticos (
+        id serial PRIMARY KEY,
+        semilla integer NOT NULL,
+        tests integer NOT NULL,
+        rangos jsonb NOT NULL,
+        iniciado timestamp DEFAULT CURRENT_TIMESTAMP,
+        completado timestamp
+    )
+""")
+
+# Tablas en orden de borrado (las hijas antes que sus padres) y columna con el id reservado
+_BORRADO_INCOMPLETO = [
+    ("respuestas_test", "test_id", "tests_realizados"),
+    ("resultados_test", "test_id", "tests_realizados"),
+    ("tests_realizados", "id", "tests_realizados"),
+    ("usuarios", "id", "usuarios"),
+    ("comentarios_foro", "id", "comentarios_foro"),
+    ("programa_modalidades", "programa_id", "programas_academicos"),
+    ("programa_campus", "programa_id", "programas_academicos"),
+    ("programas_academicos", "id", "programas_academicos"),
+    ("campus", "id", "campus"),
+    ("modalidades", "id", "modalidades"),
+    ("areas_conocimiento", "id", "areas_conocimiento"),
+    ("universidades", "id", "universidades")
+]
+
+def ya_generado() -> bool:
+    """True si hay una carga completada (la marca se escribe después del ANALYZE final)"""
+    with engine.begin() as connection:
+        connection.execute(_QUERY_CREAR_MARCA)
+        return connection.execute(
+            text("SELECT 1 FROM datos_sinteticos WHERE completado IS NOT NULL")
+        ).first() is not None
+
+def _deshacer_incompletas() -> bool:
+    """
+    Borra las filas de las cargas que no llegaron a completarse, por los rangos de ids que
+    reservaron. Retorna False si hay usuarios sintéticos sin marca (cargados por una versión
+    anterior del script): no se sabe qué filas son suyas.
+    """
+    with engine.begin() as connection:
+        connection.execute(text("SET LOCAL statement_timeout = 0"))
+        incompletas = connection.execute(
+            text("SELECT id, rangos FROM datos_sinteticos WHERE completado IS NULL ORDER BY id")
+        ).all()
+        for marca_id, rangos in incompletas:
+            print(f"🧹 Deshaciendo la carga incompleta #{marca_id}...")
+            for tabla, columna, rango in _BORRADO_INCOMPLETO:
+                if rango not in rangos:
+                    continue
+                primero, cantidad = rangos[rango]
+                borradas = connection.execute(
+                    text(f"DELETE FROM {tabla} WHERE {columna} BETWEEN :desde AND :hasta"),
+                    {"desde": primero, "hasta": primero + cantidad - 1}
+                ).rowcount
+                if borradas:
+                    print(f"   🗑️  {tabla}: {borradas}")
+            connection.execute(text("DELETE FROM datos_sinteticos WHERE id = :id"), {"id": marca_id})
+        
+        if connection.execute(
+            text("SELECT 1 FROM usuarios WHERE gmail = :gmail"), {"gmail": _email(1)}
+        ).first() is not None:
+            print("❌ Hay usuarios sintéticos sin marca de carga (versión anterior del script): "
+                  "bórralos o usa una base nueva")
+            return False
+    return True
+
+def generar(tests: int, programas: int = 2000, semilla: int = 42, procesos: int = 4,
+            hasta: date = None) -> bool:
+    """Genera y carga el dataset sintético; retorna False si algo falla"""
+    if ya_generado():
+        print("⏭️  El dataset sintético ya estaba cargado")
+        return True
+    if not _deshacer_incompletas():
+        return False
+    
+    usuarios = max(tests // 5, 1)
+    comentarios = max(tests // 4, 1)
+    inicio = time.perf_counter()
+    
+    try:
+        print("🔢 Reservando ids...")
+        with engine.begin() as connection:
+            cantidades = {
+                "universidades": max(programas // 25, 1),
+                "areas_conocimiento": len(set(_AREAS_PERFIL.values())),
+                "modalidades": len(_MODALIDADES),
+                "campus": max(programas // 10, 1),
+                "programas_academicos": programas,
+                "usuarios": usuarios,
+                "tests_realizados": tests,
+                "comentarios_foro": comentarios
+            }
+            ids = {tabla: _reservar_ids(connection, tabla, cantidad) for tabla, cantidad in cantidades.items()}
+            marca_id = connection.execute(text("""
+                INSERT INTO datos_sinteticos (semilla, tests, rangos)
+                VALUES (:semilla, :tests, :rangos)
+                RETURNING id
+            """), {
+                "semilla": semilla,
+                "tests": tests,
+                "rangos": json.dumps({tabla: [ids[tabla], cantidad] for tabla, cantidad in cantidades.items()})
+            }).scalar()
+        
+        print(f"🏛️  Catálogo: {programas} programas")
+        _cargar(_catalogo(semilla, programas, ids))
+        
+        print(f"👥 Usuarios: {usuarios}")
+        _cargar(_usuarios(semilla, usuarios, ids["usuarios"]))
+        
+        parametros = {
+            "semilla": semilla,
+            "hasta": hasta or date.today(),
+            "tests": tests,
+            "comentarios": comentarios,
+            "usuarios": usuarios,
+            "primer_usuario": ids["usuarios"],
+            "primer_test": ids["tests_realizados"],
+            "primer_comentario": ids["comentarios_foro"],
+            "almacenamiento": ALMACENAMIENTO_RESPUESTAS
+        }
+        tareas = (
+            [("tests", b, parametros) for b in range(-(-tests // TAMANO_BLOQUE))] +
+            [("comentarios", b, parametros) for b in range(-(-comentarios // TAMANO_BLOQUE))]
+        )
+        
+        print(f"📝 {tests} tests y {comentarios} comentarios en {len(tareas)} bloques, {procesos} procesos")
+        cargados = {"tests": 0, "comentarios": 0}
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+            for tipo, filas in pool.map(_ejecutar_bloque, tareas):
+                cargados[tipo] += filas
+                if tipo == "tests" and cargados[tipo] % (TAMANO_BLOQUE * 20) == 0:
+                    print(f"   ... {cargados[tipo]} tests ({time.perf_counter() - inicio:.0f}s)")
+        print(f"   ✅ {cargados['tests']} tests, {cargados['comentarios']} comentarios")
+        
+        print("📋 Tablas derivadas...")
+        _tablas_derivadas(ids["usuarios"], usuarios)
+        if not recalcular_estadisticas():
+            return False
+        
+        print("📈 Actualizando estadísticas del planificador...")
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("SET statement_timeout = 0"))
+            connection.execute(text("ANALYZE"))
+            connection.execute(text("RESET statement_timeout"))
+        
+        with engine.begin() as connection:
+            connection.execute(
+                text("UPDATE datos_sinteticos SET completado = CURRENT_TIMESTAMP WHERE id = :id"),
+                {"id": marca_id}
+            )
+        
+        print(f"✅ Dataset sintético cargado en {time.perf_counter() - inicio:.0f}s")
+        return True
+    
+    except Exception as e:
+        print(f"❌ Error al generar el dataset sintético (la próxima ejecución deshace lo cargado): {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga un dataset sintético reproducible a escala")
+    parser.add_argument("--tests", type=int, default=100000, help="Tests a generar")
+    parser.add_argument("--programas", type=int, default=2000, help="Programas del catálogo")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--procesos", type=int, default=4, help="Procesos que generan y cargan bloques")
+    parser.add_argument("--hasta", type=date.fromisoformat, default=None,
+                        help="Fecha del test más reciente (por defecto hoy)")
+    parser.add_argument("--permitir-remoto", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    print("="*50)
+    print("🧪 DATASET SINTÉTICO")
+    print("="*50 + "\n")
+    
+    host = make_url(URL_DATABASE).host
+    if host not in ("localhost", "127.0.0.1", "::1", None) and not args.permitir_remoto:
+        print(f"❌ {host} no es una base local: el script carga cientos de miles de filas")
+        exit(1)
+    
+    if not migrar():
+        exit(1)
+    
+    if not generar(args.tests, args.programas, args.semilla, args.procesos, args.hasta):
+        exit(1)
@@ -2,32 +2,57 @@
 # main.py - APLICACIÓN MODULAR CON ROUTERS
 # ========================================
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
+from contextlib import asynccontextmanager
 from pathlib import Path
 import secrets
 import os
 
 # Importar configuración de base de datos
-from db import get_db
+from db import (
+    async_engine,
+    async_engine_lectura,
+    precalentar_pool,
+    COOKIE_LEER_PRIMARIO,
+    VENTANA_LEER_PRIMARIO_S
+)
 
 # Importar sistema de autenticación
-from auth import get_current_user_session, get_current_user_hybrid
+from auth import get_current_user_session, UserLecturaDepends
 
 # Importar todos los routers
-from routers import auth_router, tests_router, users_router, foro_router, programas_router
+from routers import auth_router, tests_router, users_router, foro_router, programas_router, estadisticas_router
+
+# Métricas de consultas SQL por request
+import metricas_sql
+
+# Guardado diferido de tests
+from persistencia import iniciar_guardado_diferido, detener_guardado_diferido
 
 # ================================
 # CONFIGURACIÓN DE LA APLICACIÓN
 # ================================
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque y apagado de tareas en segundo plano"""
+    await precalentar_pool()
+    await iniciar_guardado_diferido()
+    yield
+    await detener_guardado_diferido()
+    await async_engine.dispose()
+    if async_engine_lectura is not None:
+        await async_engine_lectura.dispose()
+
 app = FastAPI(
     title="Plataforma Vocacional",
     description="Sistema completo de orientación vocacional con tests, foro y recursos",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Detectar entorno
@@ -49,6 +74,39 @@ app.add_middleware(
     session_cookie="vocacional_session"
 )
 
+# ================================
+# MÉTRICAS SQL POR REQUEST
+# ================================
+
+# Middleware ASGI (no @app.middleware): cierra la medición cuando termina de enviarse
+# el cuerpo, así cuenta también las consultas de las respuestas en streaming
+app.add_middleware(metricas_sql.MedirConsultasSQL)
+
+# ================================
+# LECTURAS DESDE LA RÉPLICA
+# ================================
+
+@app.middleware("http")
+async def marcar_escrituras(request: Request, call_next):
+    """
+    Después de una escritura exitosa, el mismo navegador lee del primario por unos
+    segundos: así ve su propio test o comentario aunque la réplica vaya atrasada.
+    """
+    response = await call_next(request)
+    
+    if (async_engine_lectura is not None
+            and request.method not in ("GET", "HEAD", "OPTIONS")
+            and response.status_code < 400):
+        response.set_cookie(
+            COOKIE_LEER_PRIMARIO,
+            "1",
+            max_age=VENTANA_LEER_PRIMARIO_S,
+            httponly=True,
+            samesite="lax",
+            secure=IS_PRODUCTION
+        )
+    return response
+
 # ================================
 # CONFIGURACIÓN DE TEMPLATES Y ESTÁTICOS
 # ================================
@@ -110,92 +168,84 @@ app.include_router(
     tags=["Programas Académicos"]
 )
 
+# Router de estadísticas de población (tablero de orientadores)
+app.include_router(
+    estadisticas_router.router,
+    tags=["Estadísticas"]
+)
+
 # ================================
 # RUTAS PRINCIPALES (PÁGINAS PÚBLICAS)
 # ================================
 
 @app.get("/", response_class=HTMLResponse, name="index")
-async def index(request: Request):
+async def index(request: Request, user: UserLecturaDepends):
     """Página de inicio"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("index.html", {"request": request, "user": user})
 
 @app.get("/blog", response_class=HTMLResponse, name="blog")
-async def blog(request: Request):
+async def blog(request: Request, user: UserLecturaDepends):
     """Blog de orientación vocacional"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("blog.html", {"request": request, "user": user})
 
 @app.get("/carrerasdem", response_class=HTMLResponse, name="carrerasdem")
-async def carrerasdem(request: Request):
+async def carrerasdem(request: Request, user: UserLecturaDepends):
     """Catálogo de carreras más demandadas"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("carrerasdem.html", {"request": request, "user": user})
 
 @app.get("/comoelegir", response_class=HTMLResponse, name="comoelegir")
-async def como_elegir(request: Request):
+async def como_elegir(request: Request, user: UserLecturaDepends):
     """Guía: Cómo elegir carrera"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("comoelegir.html", {"request": request, "user": user})
 
 @app.get("/errorescom", response_class=HTMLResponse, name="errorescom")
-async def errores_comunes(request: Request):
+async def errores_comunes(request: Request, user: UserLecturaDepends):
     """Errores comunes al elegir carrera"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("errores.html", {"request": request, "user": user})
 
 @app.get("/fechasimp", response_class=HTMLResponse, name="fechasimp")
-async def fechas_importantes(request: Request):
+async def fechas_importantes(request: Request, user: UserLecturaDepends):
     """Calendario de fechas importantes"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("fechasimp.html", {"request": request, "user": user})
 
 @app.get("/guiav", response_class=HTMLResponse, name="guiav")
-async def guia_vocacional(request: Request):
+async def guia_vocacional(request: Request, user: UserLecturaDepends):
     """Guía vocacional completa"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("guiav.html", {"request": request, "user": user})
 
 @app.get("/mitosyr", response_class=HTMLResponse, name="mitosyr")
-async def mitos_y_realidades(request: Request):
+async def mitos_y_realidades(request: Request, user: UserLecturaDepends):
     """Mitos y realidades sobre carreras"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("mitosyr.html", {"request": request, "user": user})
 
 @app.get("/programas", response_class=HTMLResponse, name="programas-universidades")
-async def programas(request: Request):
+async def programas(request: Request, user: UserLecturaDepends):
     """Programas universitarios"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("programas-universidades.html", {"request": request, "user": user})
 
 @app.get("/recuryevent", response_class=HTMLResponse, name="recuryevent")
-async def recursos_eventos(request: Request):
+async def recursos_eventos(request: Request, user: UserLecturaDepends):
     """Recursos y eventos"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("recuryevent.html", {"request": request, "user": user})
 
 @app.get("/articulos", response_class=HTMLResponse, name="articulos")
-async def articulos(request: Request):
+async def articulos(request: Request, user: UserLecturaDepends):
     """Artículos sobre orientación vocacional"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("articulos.html", {"request": request, "user": user})
 
 @app.get("/webinars", response_class=HTMLResponse, name="webinars")
-async def webinars(request: Request):
+async def webinars(request: Request, user: UserLecturaDepends):
     """Webinars y charlas"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("webinars.html", {"request": request, "user": user})
 
 @app.get("/becas", response_class=HTMLResponse, name="becas")
-async def becas(request: Request):
+async def becas(request: Request, user: UserLecturaDepends):
     """Información sobre becas"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("becas.html", {"request": request, "user": user})
 
 @app.get("/calculadora", response_class=HTMLResponse, name="calculadora")
-async def calculadora(request: Request):
+async def calculadora(request: Request, user: UserLecturaDepends):
     """Calculadora de costos universitarios"""
-    user = get_current_user_hybrid(request, next(get_db()))
     return templates.TemplateResponse("calculadora.html", {"request": request, "user": user})
 
 # ================================
@@ -239,6 +289,21 @@ async def health_check():
         "version": "2.0.0"
     }
 
+# Token para el endpoint interno de métricas; sin token el endpoint no existe
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN")
+
+@app.get("/api/interno/metricas-sql", include_in_schema=False)
+async def metricas_sql_endpoint(request: Request, reiniciar: bool = False):
+    """Agregados de consultas SQL por ruta de esta instancia"""
+    token = request.headers.get("X-Metricas-Token", "")
+    if not METRICAS_TOKEN or not secrets.compare_digest(token, METRICAS_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    reporte = metricas_sql.reporte()
+    if reiniciar:
+        metricas_sql.reiniciar()
+    return reporte
+
 # ================================
 # PUNTO DE ENTRADA
 # ================================
@@ -0,0 +1,279 @@
+# metricas_sql.py - Instrumentación de las consultas SQL por request
+
+"""
+Mide las consultas que ejecuta cada request sin loguear cada statement (reemplaza echo=True).
+
+- Por request (en una context var): cantidad de consultas, tiempo total en la base de datos,
+  la consulta más lenta y el tiempo esperando una conexión del pool.
+- Consultas más lentas que UMBRAL_CONSULTA_LENTA_MS y requests con más de
+  ALERTA_CONSULTAS_POR_REQUEST consultas (patrones N+1) se escriben como una línea JSON.
+- Agregados por ruta en memoria del proceso, expuestos en /api/interno/metricas-sql.
+
+Las consultas fuera de un request (scripts, guardado diferido) solo suman a los totales.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+UMBRAL_CONSULTA_LENTA_MS = float(os.getenv("UMBRAL_CONSULTA_LENTA_MS", "500"))
+ALERTA_CONSULTAS_POR_REQUEST = int(os.getenv("ALERTA_CONSULTAS_POR_REQUEST", "20"))
+
+# Largo máximo del SQL que se guarda en logs y métricas
+_LARGO_SQL = 300
+
+_request_actual: ContextVar[Optional[dict]] = ContextVar("metricas_sql_request", default=None)
+
+_lock = threading.Lock()
+_por_ruta = {}
+_consultas_lentas = deque(maxlen=50)
+_totales = {
+    "consultas": 0, "tiempo_db_ms": 0.0, "consultas_lentas": 0,
+    "espera_pool_ms": 0.0, "desde": time.time()
+}
+
+def _resumir_sql(statement: str) -> str:
+    return " ".join(statement.split())[:_LARGO_SQL]
+
+def _log(evento: str, **datos):
+    """Log estructurado: una línea JSON por evento"""
+    print(json.dumps({"evento": evento, **datos}, ensure_ascii=False, default=str))
+
+
+# ================================
+# HOOKS DEL MOTOR
+# ================================
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("metricas_inicio")
+    if not inicios:
+        return
+    duracion_ms = (time.perf_counter() - inicios.pop()) * 1000
+
+    metricas = _request_actual.get()
+    if metricas is not None:
+        metricas["consultas"] += 1
+        metricas["tiempo_db_ms"] += duracion_ms
+        if duracion_ms > metricas["mas_lenta_ms"]:
+            metricas["mas_lenta_ms"] = duracion_ms
+            metricas["mas_lenta_sql"] = statement
+
+    lenta = duracion_ms >= UMBRAL_CONSULTA_LENTA_MS
+    with _lock:
+        _totales["consultas"] += 1
+        _totales["tiempo_db_ms"] += duracion_ms
+        if lenta:
+            _totales["consultas_lentas"] += 1
+
+    if lenta:
+        registro = {
+            "ruta": metricas["ruta"] if metricas else None,
+            "duracion_ms": round(duracion_ms, 1),
+            "sql": _resumir_sql(statement)
+        }
+        with _lock:
+            _consultas_lentas.append({"fecha": time.time(), **registro})
+        _log("consulta_lenta", **registro)
+
+def _error_al_ejecutar(contexto_error):
+    # La consulta falló: after_cursor_execute no se llama, se descarta su inicio
+    conn = contexto_error.connection
+    if conn is not None and conn.info.get("metricas_inicio"):
+        conn.info["metricas_inicio"].pop()
+
+def instrumentar(engine) -> None:
+    """Registra los hooks en un motor síncrono (o en async_engine.sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _antes_de_ejecutar)
+    event.listen(engine, "after_cursor_execute", _despues_de_ejecutar)
+    event.listen(engine, "handle_error", _error_al_ejecutar)
+
+
+# ================================
+# ESPERA DE CONEXIONES DEL POOL
+# ================================
+
+def _sumar_espera_pool(duracion_ms: float):
+    metricas = _request_actual.get()
+    if metricas is not None:
+        metricas["espera_pool_ms"] += duracion_ms
+    with _lock:
+        _totales["espera_pool_ms"] += duracion_ms
+
+def medir_espera_pool(clase_pool):
+    """
+    Subclase de clase_pool que mide cuánto tarda cada checkout: la espera por una conexión
+    libre cuando el pool está lleno, o la conexión nueva que se abre (siempre con NullPool).
+    Los pools no tienen un evento antes del checkout, así que se mide en _do_get.
+    """
+    class PoolMedido(clase_pool):
+        def _do_get(self):
+            inicio = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                _sumar_espera_pool((time.perf_counter() - inicio) * 1000)
+
+    PoolMedido.__name__ = f"{clase_pool.__name__}Medido"
+    return PoolMedido
+
+
+# ================================
+# MEDICIÓN POR REQUEST
+# ================================
+
+def iniciar_request(ruta: str):
+    """Empieza a contar las consultas del request actual; retorna el token de la context var"""
+    return _request_actual.set({
+        "ruta": ruta,
+        "consultas": 0,
+        "tiempo_db_ms": 0.0,
+        "mas_lenta_ms": 0.0,
+        "mas_lenta_sql": None,
+        "espera_pool_ms": 0.0
+    })
+
+def terminar_request(metricas: dict, ruta: str) -> dict:
+    """Cierra la medición del request, la suma a los agregados de su ruta y la retorna"""
+    metricas["ruta"] = ruta
+
+    with _lock:
+        agregado = _por_ruta.setdefault(ruta, {
+            "requests": 0,
+            "consultas": 0,
+            "tiempo_db_ms": 0.0,
+            "max_consultas": 0,
+            "max_tiempo_db_ms": 0.0,
+            "mas_lenta_ms": 0.0,
+            "mas_lenta_sql": None,
+            "espera_pool_ms": 0.0,
+            "max_espera_pool_ms": 0.0
+        })
+        agregado["requests"] += 1
+        agregado["consultas"] += metricas["consultas"]
+        agregado["tiempo_db_ms"] += metricas["tiempo_db_ms"]
+        agregado["max_consultas"] = max(agregado["max_consultas"], metricas["consultas"])
+        agregado["max_tiempo_db_ms"] = max(agregado["max_tiempo_db_ms"], metricas["tiempo_db_ms"])
+        agregado["espera_pool_ms"] += metricas["espera_pool_ms"]
+        agregado["max_espera_pool_ms"] = max(agregado["max_espera_pool_ms"], metricas["espera_pool_ms"])
+        if metricas["mas_lenta_ms"] > agregado["mas_lenta_ms"]:
+            agregado["mas_lenta_ms"] = metricas["mas_lenta_ms"]
+            agregado["mas_lenta_sql"] = _resumir_sql(metricas["mas_lenta_sql"])
+
+    if metricas["consultas"] > ALERTA_CONSULTAS_POR_REQUEST:
+        _log(
+            "muchas_consultas",
+            ruta=ruta,
+            consultas=metricas["consultas"],
+            tiempo_db_ms=round(metricas["tiempo_db_ms"], 1)
+        )
+
+    return metricas
+
+# ================================
+# MIDDLEWARE
+# ================================
+
+def _server_timing(metricas: dict) -> str:
+    return (
+        f'db;dur={metricas["tiempo_db_ms"]:.1f};desc="{metricas["consultas"]} consultas", '
+        f'pool;dur={metricas["espera_pool_ms"]:.1f}'
+    )
+
+class MedirConsultasSQL:
+    """
+    Middleware ASGI que cuenta las consultas y el tiempo en la base de datos de cada request.
+
+    La medición se cierra con el último http.response.body (o al terminar la app, si falla),
+    no cuando la ruta retorna: las respuestas en streaming también cuentan las consultas que
+    hacen mientras generan el cuerpo. El header Server-Timing sale con los headers, así que
+    solo incluye lo medido hasta ese momento.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = iniciar_request(scope["path"])
+        metricas = _request_actual.get()
+        terminado = False
+
+        def terminar():
+            nonlocal terminado
+            if terminado:
+                return
+            terminado = True
+            # La plantilla de la ruta agrupa /test/1/detalle, /test/2/detalle, ...
+            ruta = scope.get("route")
+            terminar_request(metricas, f"{scope['method']} {ruta.path if ruta else 'sin ruta'}")
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                MutableHeaders(scope=mensaje).append("Server-Timing", _server_timing(metricas))
+            elif mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                terminar()
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            terminar()
+            _request_actual.reset(token)
+
+
+# ================================
+# REPORTE
+# ================================
+
+def reporte() -> dict:
+    """Agregados del proceso desde que arrancó (o desde el último reinicio)"""
+    with _lock:
+        rutas = []
+        for ruta, agregado in _por_ruta.items():
+            rutas.append({
+                "ruta": ruta,
+                "requests": agregado["requests"],
+                "consultas_promedio": round(agregado["consultas"] / agregado["requests"], 2),
+                "tiempo_db_promedio_ms": round(agregado["tiempo_db_ms"] / agregado["requests"], 2),
+                "max_consultas": agregado["max_consultas"],
+                "max_tiempo_db_ms": round(agregado["max_tiempo_db_ms"], 2),
+                "mas_lenta_ms": round(agregado["mas_lenta_ms"], 2),
+                "mas_lenta_sql": agregado["mas_lenta_sql"],
+                "espera_pool_promedio_ms": round(agregado["espera_pool_ms"] / agregado["requests"], 2),
+                "max_espera_pool_ms": round(agregado["max_espera_pool_ms"], 2)
+            })
+        rutas.sort(key=lambda r: r["consultas_promedio"] * r["requests"], reverse=True)
+
+        return {
+            "desde": _totales["desde"],
+            "consultas": _totales["consultas"],
+            "tiempo_db_ms": round(_totales["tiempo_db_ms"], 2),
+            "consultas_lentas": _totales["consultas_lentas"],
+            "espera_pool_ms": round(_totales["espera_pool_ms"], 2),
+            "umbral_consulta_lenta_ms": UMBRAL_CONSULTA_LENTA_MS,
+            "rutas": rutas,
+            "ultimas_consultas_lentas": list(_consultas_lentas)
+        }
+
+def reiniciar() -> None:
+    """Vacía los agregados"""
+    with _lock:
+        _por_ruta.clear()
+        _consultas_lentas.clear()
+        _totales.update({
+            "consultas": 0, "tiempo_db_ms": 0.0, "consultas_lentas": 0,
+            "espera_pool_ms": 0.0, "desde": time.time()
+        })
@@ -0,0 +1,522 @@
+# migraciones.py - Migraciones versionadas del esquema
+
+"""
+Script (y módulo) para llevar el esquema de la base de datos de URL_DATABASE a la
+última versión: columnas, tablas e índices que usan los routers y persistencia.
+
+Uso:
+    python migraciones.py               # aplica las migraciones pendientes
+    python migraciones.py --verificar   # solo comprueba los índices con EXPLAIN
+    python migraciones.py --estado      # lista las migraciones y si están aplicadas
+
+El script:
+1. Registra las versiones aplicadas en la tabla schema_migraciones
+2. Aplica en orden las que falten. Los índices se crean con CREATE INDEX CONCURRENTLY
+   (no bloquea las escrituras) y sin el límite de 30s de las sesiones de la app. Las
+   columnas nuevas se rellenan por rangos de claves, una transacción corta por rango
+3. Después de cada migración verifica con EXPLAIN que las consultas que dependen de
+   cada índice lo pueden usar; si no, la versión no se registra y el script termina con
+   código 1
+
+Es idempotente: todas las sentencias usan IF NOT EXISTS, así que también se puede correr
+sobre una base que ya tiene parte del esquema (creado a mano o con los scripts de antes).
+Un índice que quedó inválido por un CREATE INDEX CONCURRENTLY interrumpido se borra y se
+vuelve a crear. Un advisory lock evita que dos ejecuciones simultáneas se pisen.
+
+Para agregar una migración: sumar un elemento al final de MIGRACIONES con la versión
+siguiente. No modificar las que ya se aplicaron en producción.
+"""
+
+import argparse
+import json
+
+from db import engine, text
+
+# Clave del advisory lock (cualquier entero fijo, solo la usa este script)
+CLAVE_LOCK_MIGRACIONES = 7243001
+
+# Tiempo máximo esperando un lock de tabla en ALTER/CREATE TABLE: si hay una consulta
+# larga en curso es mejor fallar y reintentar que encolar detrás a todos los requests
+LOCK_TIMEOUT_DDL = "5s"
+
+# Claves por transacción al rellenar una columna nueva: cada rango bloquea sus filas
+# solo mientras se recalcula
+TAMANO_RANGO_RELLENO = 5000
+
+# Cada migración:
+#   version, nombre
+#   precondicion:   (consulta, mensaje) opcional; si la consulta devuelve filas, se aborta
+#   sentencias:     DDL transaccional (columnas, tablas), con lock_timeout
+#   relleno:        {"rango": MIN y MAX de la clave, "sentencias": [...]} opcional; se
+#                   ejecuta después de las sentencias, en una transacción por rango de
+#                   TAMANO_RANGO_RELLENO claves (:desde, :hasta)
+#   indices:        {nombre: CREATE INDEX CONCURRENTLY IF NOT EXISTS ...}
+#   verificaciones: {nombre del índice: consulta que lo debe poder usar}
+MIGRACIONES = [
+    {
+        "version": 1,
+        "nombre": "Columnas token_envio y respuestas_compactas en tests_realizados",
+        "sentencias": [
+            # Token único de cada formulario de test, para descartar envíos repetidos
+            "ALTER TABLE tests_realizados ADD COLUMN IF NOT EXISTS token_envio uuid",
+            # Respuestas en un arreglo (ALMACENAMIENTO_RESPUESTAS=compacto)
+            "ALTER TABLE tests_realizados ADD COLUMN IF NOT EXISTS respuestas_compactas smallint[]"
+        ]
+    },
+    {
+        "version": 2,
+        "nombre": "Tabla usuario_resumen",
+        "sentencias": [
+            """
+            CREATE TABLE IF NOT EXISTS usuario_resumen (
+                usuario_id integer PRIMARY KEY REFERENCES usuarios(id) ON DELETE CASCADE,
+                total_tests integer NOT NULL DEFAULT 0,
+                ultimo_tipo_test text,
+                ultima_fecha timestamp,
+                area_mas_fuerte text,
+                dimensiones jsonb,
+                fecha_dimensiones timestamp,
+                actualizado timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        ]
+    },
+    {
+        "version": 3,
+        "nombre": "Tablas de estadísticas de población",
+        "sentencias": [
+            # Suma y suma de cuadrados permiten calcular promedio y desviación sin releer los tests
+            """
+            CREATE TABLE IF NOT EXISTS estadisticas_dimensiones (
+                dia date NOT NULL,
+                tipo_test text NOT NULL,
+                dimension text NOT NULL,
+                particion smallint NOT NULL,
+                n bigint NOT NULL DEFAULT 0,
+                suma double precision NOT NULL DEFAULT 0,
+                suma_cuadrados double precision NOT NULL DEFAULT 0,
+                PRIMARY KEY (dia, tipo_test, dimension, particion)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS estadisticas_perfiles (
+                dia date NOT NULL,
+                tipo_test text NOT NULL,
+                area_principal text NOT NULL,
+                perfil_identificado text NOT NULL,
+                particion smallint NOT NULL,
+                n bigint NOT NULL DEFAULT 0,
+                PRIMARY KEY (dia, tipo_test, area_principal, perfil_identificado, particion)
+            )
+            """
+        ]
+    },
+    {
+        "version": 4,
+        "nombre": "Índices del historial de tests",
+        "indices": {
+            # Historial paginado por (fecha_realizacion, id) en /mis-tests y /api/usuario/tests.
+            # También cubre (usuario_id, fecha_realizacion DESC): el último test del resumen
+            "idx_tests_realizados_usuario_fecha": """
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tests_realizados_usuario_fecha
+                ON tests_realizados (usuario_id, fecha_realizacion DESC, id DESC)
+            """,
+            # Último test general del usuario (dimensiones en actualizar_resumen_usuario)
+            "idx_tests_realizados_usuario_tipo_fecha": """
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tests_realizados_usuario_tipo_fecha
+                ON tests_realizados (usuario_id, tipo_test, fecha_realizacion)
+            """,
+            # Deduplicación de envíos en procesar_test (ON CONFLICT en guardar_test)
+            "idx_tests_realizados_token_envio": """
+                CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_tests_realizados_token_envio
+                ON tests_realizados (usuario_id, token_envio)
+                WHERE token_envio IS NOT NULL
+            """,
+            # Resultados y respuestas de un test: detalle, exportación, resumen y borrado
+            "idx_resultados_test_test_id": """
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_resultados_test_test_id
+                ON resultados_test (test_id)
+            """,
+            "idx_respuestas_test_test_id": """
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_respuestas_test_test_id
+                ON respuestas_test (test_id)
+            """
+        },
+        "verificaciones": {
+            "idx_tests_realizados_usuario_fecha": """
+                SELECT id FROM tests_realizados
+                WHERE usuario_id = 1
+                ORDER BY fecha_realizacion DESC, id DESC
+                LIMIT 10
+            """,
+            "idx_tests_realizados_usuario_tipo_fecha": """
+                SELECT id FROM tests_realizados
+                WHERE usuario_id = 1 AND tipo_test = 'general'
+                ORDER BY fecha_realizacion DESC
+                LIMIT 1
+            """,
+            "idx_tests_realizados_token_envio": """
+                SELECT id FROM tests_realizados
+                WHERE usuario_id = 1 AND token_envio = '00000000-0000-0000-0000-000000000000'
+            """,
+            "idx_resultados_test_test_id": "SELECT id FROM resultados_test WHERE test_id = 1",
+            "idx_respuestas_test_test_id": "SELECT id FROM respuestas_test WHERE test_id = 1"
+        }
+    },
+    {
+        "version": 5,
+        "nombre": "Email único en usuarios",
+        "precondicion": (
+            """
+            SELECT gmail, COUNT(*) FROM usuarios
+            GROUP BY gmail HAVING COUNT(*) > 1
+            LIMIT 10
+            """,
+            "Hay emails repetidos en usuarios: unificar esas cuentas antes de crear el índice único"
+        ),
+        "indices": {
+            # Login, registro y cambio de email buscan por gmail
+            "idx_usuarios_gmail": """
+                CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_usuarios_gmail
+                ON usuarios (gmail)
+            """
+        },
+        "verificaciones": {
+            "idx_usuarios_gmail": "SELECT id FROM usuarios WHERE gmail = 'ejemplo@correo.com'"
+        }
+    },
+    {
+        "version": 6,
+        "nombre": "Índices del listado del foro",
+        "indices": {
+            # Orden newest/oldest filtrando por tema
+            "idx_comentarios_foro_activo_tema_fecha": """
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comentarios_foro_activo_tema_fecha
+                ON comentarios_foro (activo, tema, fecha_creacion)
+            """,
+            # Orden popular (likes DESC, fecha_creacion DESC), recorrido hacia atrás
+            "idx_comentarios_foro_activo_likes_fecha": """
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comentarios_foro_activo_likes_fecha
+                ON comentarios_foro (activo, likes, fecha_creacion)
+            """,
+            # Orden newest/oldest sin tema (el listado por defecto): con el índice por tema
+            # habría que ordenar todos los comentarios activos en cada página
+            "idx_comentarios_foro_activo_fecha": """
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comentarios_foro_activo_fecha
+                ON comentarios_foro (activo, fecha_creacion)
+            """
+        },
+        "verificaciones": {
+            "idx_comentarios_foro_activo_tema_fecha": """
+                SELECT id FROM comentarios_foro
+                WHERE activo = true AND tema = 'general'
+                ORDER BY fecha_creacion DESC
+                LIMIT 20
+            """,
+            "idx_comentarios_foro_activo_likes_fecha": """
+                SELECT id FROM comentarios_foro
+                WHERE activo = true
+                ORDER BY likes DESC, fecha_creacion DESC
+                LIMIT 20
+            """,
+            "idx_comentarios_foro_activo_fecha": """
+                SELECT id FROM comentarios_foro
+                WHERE activo = true
+                ORDER BY fecha_creacion DESC
+                LIMIT 20
+            """
+        }
+    },
+    {
+        "version": 7,
+        "nombre": "Índices de las tablas intermedias de programas",
+        "indices": {
+            # Listado de programas (modalidades) y detalle de un programa
+            "idx_programa_modalidades_programa_id": """
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_programa_modalidades_programa_id
+                ON programa_modalidades (programa_id)
+            """,
+            "idx_programa_campus_programa_id": """
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_programa_campus_programa_id
+                ON programa_campus (programa_id)
+            """
+        },
+        "verificaciones": {
+            "idx_programa_modalidades_programa_id": """
+                SELECT modalidad_id FROM programa_modalidades WHERE programa_id = 1
+            """,
+            "idx_programa_campus_programa_id": """
+                SELECT campus_id FROM programa_campus WHERE programa_id = 1
+            """
+        }
+    },
+    {
+        "version": 8,
+        "nombre": "Conteo de áreas en usuario_resumen",
+        "sentencias": [
+            # Tests por área del usuario: guardar_test decide el área más frecuente sin releer
+            # sus tests. Con un default constante no reescribe la tabla
+            """
+            ALTER TABLE usuario_resumen
+            ADD COLUMN IF NOT EXISTS conteo_areas jsonb NOT NULL DEFAULT '{}'
+            """
+        ],
+        "relleno": {
+            "rango": "SELECT MIN(usuario_id), MAX(usuario_id) FROM usuario_resumen",
+            "sentencias": [
+                # Primero se bloquean las filas del rango: los guardados ya confirmados
+                # entran en el conteo y los que llegan después esperan y suman sobre él
+                """
+                SELECT usuario_id FROM usuario_resumen
+                WHERE usuario_id BETWEEN :desde AND :hasta
+                FOR UPDATE
+                """,
+                """
+                UPDATE usuario_resumen u
+                SET conteo_areas = a.conteo
+                FROM (
+                    SELECT usuario_id, jsonb_object_agg(area_principal, n) AS conteo
+                    FROM (
+                        SELECT t.usuario_id, r.area_principal, COUNT(*) AS n
+                        FROM tests_realizados t
+                        INNER JOIN resultados_test r ON t.id = r.test_id
+                        WHERE t.usuario_id BETWEEN :desde AND :hasta
+                          AND t.completado = true AND r.area_principal IS NOT NULL
+                        GROUP BY t.usuario_id, r.area_principal
+                    ) x
+                    GROUP BY usuario_id
+                ) a
+                WHERE u.usuario_id = a.usuario_id
+                """
+            ]
+        }
+    }
+]
+
+
+# ================================
+# REGISTRO DE VERSIONES
+# ================================
+
+def _preparar_conexion(connection):
+    """Sin límite de tiempo (los índices pueden tardar) y con el lock de migraciones"""
+    connection.execute(text("SET statement_timeout = 0"))
+    connection.execute(text("SELECT pg_advisory_lock(:clave)"), {"clave": CLAVE_LOCK_MIGRACIONES})
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migraciones (
+            version integer PRIMARY KEY,
+            nombre text NOT NULL,
+            aplicada timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+def _liberar_conexion(connection):
+    connection.execute(text("SELECT pg_advisory_unlock(:clave)"), {"clave": CLAVE_LOCK_MIGRACIONES})
+    connection.execute(text("RESET statement_timeout"))
+
+def _versiones_aplicadas(connection) -> set:
+    return set(connection.execute(text("SELECT version FROM schema_migraciones")).scalars().all())
+
+
+# ================================
+# APLICACIÓN
+# ================================
+
+def _borrar_indice_invalido(connection, nombre: str):
+    """Borra el índice si quedó inválido (CREATE INDEX CONCURRENTLY interrumpido)"""
+    invalido = connection.execute(text("""
+        SELECT 1
+        FROM pg_index i
+        INNER JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :nombre AND NOT i.indisvalid
+    """), {"nombre": nombre}).first()
+    
+    if invalido:
+        print(f"   ⚠️  {nombre} quedó inválido, se vuelve a crear")
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}"))
+
+def _rellenar(connection, relleno: dict):
+    """
+    Llena una columna nueva por rangos de la clave, con una transacción corta por rango:
+    en una sola, el UPDATE bloquearía la tabla entera hasta terminar
+    """
+    minimo, maximo = connection.execute(text(relleno["rango"])).first()
+    if minimo is None:
+        return
+    
+    rangos = 0
+    for desde in range(minimo, maximo + 1, TAMANO_RANGO_RELLENO):
+        with engine.begin() as transaccion:
+            transaccion.execute(text("SET LOCAL statement_timeout = 0"))
+            for sentencia in relleno["sentencias"]:
+                transaccion.execute(text(sentencia), {
+                    "desde": desde,
+                    "hasta": desde + TAMANO_RANGO_RELLENO - 1
+                })
+        rangos += 1
+    print(f"   ✅ Relleno en {rangos} rangos")
+
+def _aplicar(connection, migracion: dict):
+    precondicion = migracion.get("precondicion")
+    if precondicion:
+        consulta, mensaje = precondicion
+        filas = connection.execute(text(consulta)).fetchall()
+        if filas:
+            raise RuntimeError(f"{mensaje}: {[tuple(fila) for fila in filas]}")
+    
+    sentencias = migracion.get("sentencias", [])
+    if sentencias:
+        # Las columnas y tablas de una migración se crean todas o ninguna: en una
+        # transacción aparte, la conexión del script está en autocommit. Es una conexión
+        # del pool, con el límite de 30s de la app: se quita solo en esta transacción
+        with engine.begin() as transaccion:
+            transaccion.execute(text("SET LOCAL statement_timeout = 0"))
+            transaccion.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT_DDL}'"))
+            for sentencia in sentencias:
+                transaccion.execute(text(sentencia))
+    
+    relleno = migracion.get("relleno")
+    if relleno:
+        _rellenar(connection, relleno)
+    
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    for nombre, ddl in migracion.get("indices", {}).items():
+        _borrar_indice_invalido(connection, nombre)
+        connection.execute(text(ddl))
+        print(f"   ✅ {nombre}")
+
+
+# ================================
+# VERIFICACIÓN CON EXPLAIN
+# ================================
+
+def _indices_del_plan(nodo: dict) -> set:
+    """Nombres de los índices que usa un plan (EXPLAIN FORMAT JSON), en cualquier nivel"""
+    indices = {nodo["Index Name"]} if "Index Name" in nodo else set()
+    for hijo in nodo.get("Plans", []):
+        indices |= _indices_del_plan(hijo)
+    return indices
+
+def verificar_migracion(connection, migracion: dict) -> bool:
+    """
+    Comprueba que cada consulta de la migración puede usar su índice.
+    En una base chica el planificador prefiere recorrer la tabla entera aunque exista
+    el índice, así que se desactiva el seq scan: lo que se verifica es que el índice
+    sirve para la forma de la consulta, no el plan con los datos de producción.
+    También se desactiva el sort: en tablas vacías (sin estadísticas) el planificador
+    puede elegir otro índice con la misma primera columna y ordenar después.
+    """
+    correcto = True
+    
+    connection.execute(text("SET enable_seqscan = off"))
+    connection.execute(text("SET enable_sort = off"))
+    try:
+        for indice, consulta in migracion.get("verificaciones", {}).items():
+            plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {consulta}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            
+            usados = _indices_del_plan(plan[0]["Plan"])
+            if indice in usados:
+                print(f"   🔍 {indice}: usado por EXPLAIN")
+            else:
+                correcto = False
+                print(f"   ❌ {indice}: EXPLAIN no lo usa (usa {sorted(usados) or 'seq scan'})")
+    finally:
+        connection.execute(text("RESET enable_seqscan"))
+        connection.execute(text("RESET enable_sort"))
+    
+    return correcto
+
+def migrar(hasta: int = None) -> bool:
+    """
+    Aplica las migraciones pendientes (hasta la versión indicada, o todas).
+    Retorna True si el esquema quedó al día.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        _preparar_conexion(connection)
+        try:
+            aplicadas = _versiones_aplicadas(connection)
+            pendientes = [
+                m for m in MIGRACIONES
+                if m["version"] not in aplicadas and (hasta is None or m["version"] <= hasta)
+            ]
+            
+            if not pendientes:
+                print("✅ Esquema al día")
+                return True
+            
+            for migracion in pendientes:
+                print(f"🔧 {migracion['version']:03d} - {migracion['nombre']}")
+                try:
+                    _aplicar(connection, migracion)
+                except Exception as e:
+                    print(f"❌ Falló la migración {migracion['version']}: {e}")
+                    return False
+                
+                if not verificar_migracion(connection, migracion):
+                    print(f"❌ La migración {migracion['version']} no pasó la verificación")
+                    return False
+                
+                connection.execute(text("""
+                    INSERT INTO schema_migraciones (version, nombre)
+                    VALUES (:version, :nombre)
+                    ON CONFLICT (version) DO NOTHING
+                """), {"version": migracion["version"], "nombre": migracion["nombre"]})
+            
+            print(f"\n📊 Migraciones aplicadas: {len(pendientes)}")
+            return True
+        
+        finally:
+            _liberar_conexion(connection)
+
+def verificar() -> bool:
+    """Repite las verificaciones EXPLAIN de las migraciones ya aplicadas"""
+    correcto = True
+    
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        _preparar_conexion(connection)
+        try:
+            aplicadas = _versiones_aplicadas(connection)
+            for migracion in MIGRACIONES:
+                if migracion["version"] in aplicadas and migracion.get("verificaciones"):
+                    print(f"🔍 {migracion['version']:03d} - {migracion['nombre']}")
+                    correcto = verificar_migracion(connection, migracion) and correcto
+        finally:
+            _liberar_conexion(connection)
+    
+    return correcto
+
+def mostrar_estado():
+    with engine.connect() as connection:
+        existe = connection.execute(text("SELECT to_regclass('schema_migraciones')")).scalar()
+        aplicadas = {}
+        if existe:
+            aplicadas = dict(connection.execute(text(
+                "SELECT version, aplicada FROM schema_migraciones"
+            )).fetchall())
+    
+    for migracion in MIGRACIONES:
+        aplicada = aplicadas.get(migracion["version"])
+        estado = f"✅ {aplicada:%Y-%m-%d %H:%M}" if aplicada else "⏳ pendiente"
+        print(f"{migracion['version']:03d}  {estado:20}  {migracion['nombre']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplica las migraciones del esquema")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument("--verificar", action="store_true", help="Solo verifica los índices con EXPLAIN")
+    grupo.add_argument("--estado", action="store_true", help="Lista las migraciones aplicadas")
+    args = parser.parse_args()
+    
+    print("="*50)
+    print("🗂️  MIGRACIONES DEL ESQUEMA")
+    print("="*50 + "\n")
+    
+    if args.estado:
+        mostrar_estado()
+    elif args.verificar:
+        if not verificar():
+            exit(1)
+        print("\n✅ Todos los índices se usan")
+    elif not migrar():
+        exit(1)
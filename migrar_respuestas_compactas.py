@@ -0,0 +1,146 @@
+# migrar_respuestas_compactas.py - Convierte respuestas_test al formato compacto
+
+"""
+Script para pasar las respuestas guardadas fila por fila (respuestas_test)
+al arreglo compacto tests_realizados.respuestas_compactas.
+
+Uso:
+    python migrar_respuestas_compactas.py [--tamano-lote 500] [--borrar-filas]
+
+El script:
+1. Agrega la columna respuestas_compactas si no existe (migraciones.py, versión 1)
+2. Recorre los tests sin respuestas compactas en lotes (por id)
+3. Empaqueta sus respuestas y las guarda en el test
+4. Con --borrar-filas, elimina las filas de respuestas_test ya convertidas
+   en la misma transacción del lote
+
+Se puede interrumpir y volver a ejecutar: continúa con los tests que faltan.
+Después de migrar, activar ALMACENAMIENTO_RESPUESTAS=compacto para los tests nuevos.
+"""
+
+import argparse
+from collections import defaultdict
+
+from db import SessionLocal, text
+from migraciones import migrar
+from persistencia import empaquetar_respuestas
+from tests_config import TESTS_CONFIG
+
+def migrar_lote(db, ultimo_id: int, tamano_lote: int, borrar_filas: bool) -> tuple:
+    """
+    Convierte un lote de tests. Retorna (ultimo_id_procesado, convertidos, omitidos);
+    ultimo_id_procesado es None cuando no quedan tests.
+    """
+    query_lote = text("""
+        SELECT t.id, t.tipo_test, r.pregunta_id, r.respuesta
+        FROM (
+            SELECT id, tipo_test
+            FROM tests_realizados
+            WHERE id > :ultimo_id AND respuestas_compactas IS NULL
+            ORDER BY id
+            LIMIT :tamano_lote
+        ) t
+        LEFT JOIN respuestas_test r ON r.test_id = t.id
+        ORDER BY t.id
+    """)
+    
+    filas = db.execute(query_lote, {"ultimo_id": ultimo_id, "tamano_lote": tamano_lote}).fetchall()
+    
+    if not filas:
+        return None, 0, 0
+    
+    tipos = {}
+    respuestas = defaultdict(dict)
+    for test_id, tipo_test, pregunta_id, respuesta in filas:
+        tipos[test_id] = tipo_test
+        if pregunta_id is not None:
+            respuestas[test_id][f"pregunta_{pregunta_id}"] = respuesta
+    
+    # Tests de tipos desconocidos, sin respuestas o con respuestas que el arreglo
+    # no puede representar se dejan como están
+    compactas = {}
+    for test_id, tipo_test in tipos.items():
+        if tipo_test not in TESTS_CONFIG or not respuestas[test_id]:
+            continue
+        try:
+            compactas[test_id] = empaquetar_respuestas(tipo_test, respuestas[test_id])
+        except ValueError as e:
+            print(f"⚠️ Test {test_id} se deja por filas: {e}")
+    convertibles = list(compactas)
+    
+    if convertibles:
+        update_query = text("""
+            UPDATE tests_realizados
+            SET respuestas_compactas = CAST(:compactas AS smallint[])
+            WHERE id = :test_id
+        """)
+        db.execute(update_query, [
+            {"test_id": test_id, "compactas": compactas[test_id]}
+            for test_id in convertibles
+        ])
+        
+        if borrar_filas:
+            delete_query = text("DELETE FROM respuestas_test WHERE test_id = ANY(:test_ids)")
+            db.execute(delete_query, {"test_ids": convertibles})
+    
+    db.commit()
+    
+    return max(tipos), len(convertibles), len(tipos) - len(convertibles)
+
+def migrar_respuestas(tamano_lote: int, borrar_filas: bool):
+    """Recorre todos los tests pendientes en lotes"""
+    db = SessionLocal()
+    
+    ultimo_id = 0
+    total_convertidos = 0
+    total_omitidos = 0
+    
+    try:
+        print("\n🔄 Iniciando conversión de respuestas...\n")
+        
+        while True:
+            ultimo_id, convertidos, omitidos = migrar_lote(db, ultimo_id, tamano_lote, borrar_filas)
+            
+            if ultimo_id is None:
+                break
+            
+            total_convertidos += convertidos
+            total_omitidos += omitidos
+            print(f"✅ Lote hasta test {ultimo_id}: {convertidos} convertidos, {omitidos} omitidos")
+    
+    except Exception as e:
+        db.rollback()
+        print(f"\n❌ Error en la conversión (los lotes anteriores quedaron guardados): {e}")
+        import traceback
+        traceback.print_exc()
+    
+    finally:
+        db.close()
+    
+    # Reporte final
+    print("\n" + "="*50)
+    print("📊 REPORTE DE CONVERSIÓN")
+    print("="*50)
+    print(f"✅ Tests convertidos: {total_convertidos}")
+    print(f"⏭️  Omitidos (sin respuestas, tipo desconocido o respuestas inválidas): {total_omitidos}")
+    if borrar_filas:
+        print("🗑️  Filas de respuestas_test eliminadas para los tests convertidos")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convierte respuestas_test al formato compacto")
+    parser.add_argument("--tamano-lote", type=int, default=500, help="Tests por transacción")
+    parser.add_argument("--borrar-filas", action="store_true", help="Eliminar las filas ya convertidas")
+    args = parser.parse_args()
+    
+    print("="*50)
+    print("📦 MIGRACIÓN A RESPUESTAS COMPACTAS")
+    print("="*50)
+    
+    print("\n🔧 Paso 1: Preparando columna...")
+    if not migrar(hasta=1):
+        exit(1)
+    
+    print("\n🔄 Paso 2: Convirtiendo respuestas...")
+    migrar_respuestas(args.tamano_lote, args.borrar_filas)
+    
+    print("\n✅ Proceso completado!")
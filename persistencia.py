@@ -0,0 +1,868 @@
+# persistencia.py - Guardado de tests (directo y diferido)
+
+"""
+Guardado de tests completados.
+
+- guardar_test: guarda un test con sus respuestas y resultados en un solo round trip.
+- token_envio: cada formulario de test lleva un token único; un índice único parcial
+  sobre (usuario_id, token_envio) descarta los envíos repetidos (doble clic, reenvío,
+  reintentos) y también los tests que el outbox vuelve a encolar tras una caída.
+- Estadísticas de población: guardar_test y eliminar_tests (también eliminar_usuario,
+  antes de borrar la cuenta) suman y restan, en el mismo statement, los contadores
+  diarios por dimensión y por área/perfil que lee el tablero de orientadores
+  (ver routers/estadisticas_router.py).
+- usuario_resumen: resumen por usuario (total de tests, último test, área más frecuente,
+  últimas dimensiones) que el perfil lee con una sola búsqueda por clave primaria.
+  guardar_test lo actualiza de forma incremental en su mismo statement (total + 1,
+  conteo por área, último test); eliminar_tests resta en su CTE y solo vuelve a leer
+  de los tests el último test, el área y las dimensiones.
+- Guardado diferido (GUARDADO_DIFERIDO=true): procesar_test encola el test y responde
+  de inmediato; un worker en segundo plano agrupa los tests de muchos usuarios y los
+  guarda por lotes, con reintentos; si un lote sigue fallando vuelve a la cola con una
+  espera creciente en vez de descartarse. Cada test encolado se escribe antes en un outbox
+  local (NDJSON) y solo se confirma en él después del commit, así que si el proceso
+  se cae los tests pendientes se vuelven a encolar al arrancar (entrega al menos una vez).
+
+El outbox es un archivo por despliegue: usar con un solo proceso worker.
+En Vercel el sistema de archivos se pierde entre invocaciones, por eso el modo
+diferido viene desactivado por defecto.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import uuid
+from contextlib import suppress
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import consultas
+from db import SessionLocal
+from cache import invalidar_detalle_tests
+from tests_config import TESTS_CONFIG, PUNTUACION_VALORES
+
+# ================================
+# CONFIGURACIÓN
+# ================================
+
+GUARDADO_DIFERIDO = os.getenv("GUARDADO_DIFERIDO", "false").lower() in ("1", "true", "si", "yes")
+OUTBOX_PATH = os.getenv("OUTBOX_TESTS", "outbox_tests.ndjson")
+
+# "filas": una fila por respuesta en respuestas_test (formato original)
+# "compacto": todas las respuestas en tests_realizados.respuestas_compactas (smallint[])
+ALMACENAMIENTO_RESPUESTAS = os.getenv("ALMACENAMIENTO_RESPUESTAS", "filas")
+
+TAMANO_LOTE = 50           # Tests por transacción
+ESPERA_LOTE = 0.2          # Segundos que se espera para juntar más tests
+MAX_REINTENTOS = 5
+ESPERA_REINTENTO = 0.5     # Segundos (se duplica en cada reintento)
+ESPERA_MAXIMA_REENCOLADO = 300  # Tope en segundos antes de volver a encolar un lote que sigue fallando
+
+# Cada contador de estadísticas se reparte en varias filas (según test_id) para que
+# los guardados simultáneos no esperen todos por la misma fila. Se puede cambiar:
+# las consultas suman todas las particiones y los borrados restan con ON CONFLICT,
+# aunque la partición de un test viejo ya no tenga fila.
+PARTICIONES_ESTADISTICAS = 8
+
+# Tests por statement al borrar una cuenta (ver eliminar_usuario)
+TAMANO_LOTE_ELIMINACION = 20
+
+
+# ================================
+# RESPUESTAS COMPACTAS
+# ================================
+
+# Código de cada opción en el arreglo compacto (0 = sin respuesta)
+CODIGOS_RESPUESTA = {"A": 1, "B": 2, "C": 3, "D": 4, "E": 5}
+_LETRAS_RESPUESTA = {codigo: letra for letra, codigo in CODIGOS_RESPUESTA.items()}
+
+# Orden fijo de las preguntas de cada test. Los arreglos guardados dependen de este
+# orden: en TESTS_CONFIG solo se pueden agregar preguntas al final.
+_CLAVES_PREGUNTAS = {
+    tipo_test: tuple(f"pregunta_{p['id']}" for p in config["preguntas"])
+    for tipo_test, config in TESTS_CONFIG.items()
+}
+
+def empaquetar_respuestas(tipo_test: str, respuestas: dict) -> List[int]:
+    """
+    Convierte {"pregunta_1": "A", ...} en un arreglo en el orden de las preguntas del test.
+    Lanza ValueError si hay letras o preguntas que el arreglo no puede representar,
+    en vez de guardarlas como "sin respuesta".
+    """
+    claves = _CLAVES_PREGUNTAS[tipo_test]
+    
+    desconocidas = sorted(set(respuestas) - set(claves))
+    if desconocidas:
+        raise ValueError(f"Preguntas que no son del test {tipo_test}: {', '.join(desconocidas)}")
+    
+    invalidas = sorted(k for k, v in respuestas.items() if v not in CODIGOS_RESPUESTA)
+    if invalidas:
+        raise ValueError(f"Respuestas inválidas en: {', '.join(invalidas)}")
+    
+    return [CODIGOS_RESPUESTA.get(respuestas.get(clave), 0) for clave in claves]
+
+def desempaquetar_respuestas(tipo_test: str, valores: List[int]) -> dict:
+    """Convierte un arreglo compacto de vuelta a {"pregunta_1": "A", ...}"""
+    return {
+        clave: _LETRAS_RESPUESTA[valor]
+        for clave, valor in zip(_CLAVES_PREGUNTAS[tipo_test], valores)
+        if valor in _LETRAS_RESPUESTA
+    }
+
+
+# ================================
+# GUARDADO DIRECTO
+# ================================
+
+# Contadores de estadisticas_dimensiones / estadisticas_perfiles (crear_estadisticas.py)
+# y fila del usuario en usuario_resumen, actualizados en el mismo statement.
+# Solo suman si nuevo_test insertó una fila (no en envíos repetidos).
+_QUERY_GUARDAR_RESULTADO = """
+        sumar_dimensiones AS (
+            INSERT INTO estadisticas_dimensiones AS e
+            (dia, tipo_test, dimension, particion, n, suma, suma_cuadrados)
+            SELECT CURRENT_DATE, :tipo, d.key, nuevo_test.id % :particiones,
+                   1, CAST(d.value AS float8), CAST(d.value AS float8) ^ 2
+            FROM nuevo_test,
+                 jsonb_each_text(CAST(:datos_adicionales AS jsonb)->'puntajes_dimensiones') AS d
+            ON CONFLICT (dia, tipo_test, dimension, particion) DO UPDATE SET
+                n = e.n + 1,
+                suma = e.suma + EXCLUDED.suma,
+                suma_cuadrados = e.suma_cuadrados + EXCLUDED.suma_cuadrados
+        ),
+        sumar_perfil AS (
+            INSERT INTO estadisticas_perfiles AS e
+            (dia, tipo_test, area_principal, perfil_identificado, particion, n)
+            SELECT CURRENT_DATE, :tipo, COALESCE(:area, ''),
+                   COALESCE(CAST(:datos_adicionales AS jsonb)->>'perfil_identificado', ''),
+                   nuevo_test.id % :particiones, 1
+            FROM nuevo_test
+            ON CONFLICT (dia, tipo_test, area_principal, perfil_identificado, particion)
+            DO UPDATE SET n = e.n + 1
+        ),
+        sumar_resumen AS (
+            INSERT INTO usuario_resumen AS u
+            (usuario_id, total_tests, ultimo_tipo_test, ultima_fecha, area_mas_fuerte,
+             conteo_areas, dimensiones, fecha_dimensiones, actualizado)
+            SELECT :user_id, 1, :tipo, nuevo_test.fecha_realizacion, CAST(:area AS text),
+                   CASE WHEN CAST(:area AS text) IS NULL THEN CAST('{}' AS jsonb)
+                        ELSE jsonb_build_object(CAST(:area AS text), 1) END,
+                   CASE WHEN :tipo = 'general'
+                        THEN CAST(:datos_adicionales AS jsonb)->'puntajes_dimensiones' END,
+                   CASE WHEN :tipo = 'general' THEN nuevo_test.fecha_realizacion END,
+                   CURRENT_TIMESTAMP
+            FROM nuevo_test
+            ON CONFLICT (usuario_id) DO UPDATE SET
+                total_tests = u.total_tests + 1,
+                ultimo_tipo_test = CASE WHEN u.ultima_fecha > EXCLUDED.ultima_fecha
+                                        THEN u.ultimo_tipo_test ELSE EXCLUDED.ultimo_tipo_test END,
+                ultima_fecha = GREATEST(u.ultima_fecha, EXCLUDED.ultima_fecha),
+                -- El test nuevo es el más reciente: su área gana también los empates
+                area_mas_fuerte = CASE
+                    WHEN EXCLUDED.area_mas_fuerte IS NOT NULL
+                    AND COALESCE(CAST(u.conteo_areas->>EXCLUDED.area_mas_fuerte AS integer), 0) + 1
+                        >= COALESCE(CAST(u.conteo_areas->>u.area_mas_fuerte AS integer), 0)
+                    THEN EXCLUDED.area_mas_fuerte ELSE u.area_mas_fuerte END,
+                conteo_areas = CASE WHEN EXCLUDED.area_mas_fuerte IS NULL THEN u.conteo_areas
+                    ELSE u.conteo_areas || jsonb_build_object(EXCLUDED.area_mas_fuerte,
+                        COALESCE(CAST(u.conteo_areas->>EXCLUDED.area_mas_fuerte AS integer), 0) + 1) END,
+                dimensiones = CASE WHEN EXCLUDED.fecha_dimensiones >= u.fecha_dimensiones
+                                   OR u.fecha_dimensiones IS NULL
+                                   THEN COALESCE(EXCLUDED.dimensiones, u.dimensiones)
+                                   ELSE u.dimensiones END,
+                fecha_dimensiones = GREATEST(u.fecha_dimensiones, EXCLUDED.fecha_dimensiones),
+                actualizado = EXCLUDED.actualizado
+        ),
+        nuevo_resultado AS (
+            INSERT INTO resultados_test
+            (test_id, area_principal, porcentaje_afinidad,
+             carreras_recomendadas, fortalezas, areas_desarrollo,
+             descripcion_perfil, datos_adicionales, campo_laboral)
+            SELECT nuevo_test.id, :area, :porcentaje,
+                   CAST(:carreras AS jsonb),
+                   :fortalezas, :desarrollo, :descripcion,
+                   CAST(:datos_adicionales AS jsonb),
+                   :campo_laboral
+            FROM nuevo_test
+        )
+        SELECT id FROM nuevo_test
+"""
+
+_QUERY_GUARDAR_TEST = text("""
+        WITH nuevo_test AS (
+            INSERT INTO tests_realizados
+            (usuario_id, tipo_test, puntuacion_total, completado, fecha_realizacion, token_envio)
+            VALUES (:user_id, :tipo, :puntuacion, true, CURRENT_TIMESTAMP, CAST(:token_envio AS uuid))
+            ON CONFLICT (usuario_id, token_envio) WHERE token_envio IS NOT NULL DO NOTHING
+            RETURNING id, fecha_realizacion
+        ),
+        nuevas_respuestas AS (
+            INSERT INTO respuestas_test
+            (test_id, pregunta_id, respuesta, puntos)
+            SELECT nuevo_test.id, r.pregunta_id, r.respuesta, r.puntos
+            FROM nuevo_test,
+                 unnest(CAST(:preguntas AS integer[]),
+                        CAST(:respuestas AS text[]),
+                        CAST(:puntos AS integer[])) AS r(pregunta_id, respuesta, puntos)
+        ),""" + _QUERY_GUARDAR_RESULTADO)
+
+_QUERY_GUARDAR_TEST_COMPACTO = text("""
+        WITH nuevo_test AS (
+            INSERT INTO tests_realizados
+            (usuario_id, tipo_test, puntuacion_total, completado, fecha_realizacion,
+             respuestas_compactas, token_envio)
+            VALUES (:user_id, :tipo, :puntuacion, true, CURRENT_TIMESTAMP,
+                    CAST(:compactas AS smallint[]), CAST(:token_envio AS uuid))
+            ON CONFLICT (usuario_id, token_envio) WHERE token_envio IS NOT NULL DO NOTHING
+            RETURNING id, fecha_realizacion
+        ),""" + _QUERY_GUARDAR_RESULTADO)
+
+def parametros_guardar_test(user_id: int, tipo_test: str, respuestas: dict, resultados: dict,
+                            token_envio: Optional[str] = None, compacto: bool = False) -> dict:
+    """Parámetros de _QUERY_GUARDAR_TEST (o de _QUERY_GUARDAR_TEST_COMPACTO con compacto=True)"""
+    preguntas = []
+    valores = []
+    puntos = []
+    if not compacto:
+        for pregunta, respuesta in respuestas.items():
+            preguntas.append(int(pregunta.split("_")[1]))
+            valores.append(respuesta)
+            puntos.append(PUNTUACION_VALORES.get(respuesta, 3))
+    
+    datos_adicionales = {
+        "perfil_identificado": resultados.get("perfil_identificado", ""),
+        "score_ajuste": float(resultados.get("score_ajuste", 0)),
+        "porcentaje_global": float(resultados.get("porcentaje_global", 0)),
+        "puntajes_dimensiones": resultados.get("puntajes_dimensiones", {})
+    }
+    
+    return {
+        "user_id": user_id,
+        "tipo": tipo_test,
+        "puntuacion": resultados["puntuacion_total"],
+        "compactas": empaquetar_respuestas(tipo_test, respuestas) if compacto else None,
+        "preguntas": preguntas,
+        "respuestas": valores,
+        "puntos": puntos,
+        "area": resultados["area_principal"],
+        "porcentaje": float(resultados["score_ajuste"]),
+        "carreras": json.dumps(resultados["carreras_recomendadas"]),
+        "fortalezas": resultados["fortalezas"],
+        "desarrollo": resultados["areas_desarrollo"],
+        "descripcion": resultados["mensaje"],
+        "datos_adicionales": json.dumps(datos_adicionales),
+        "campo_laboral": resultados.get("campo_laboral", []),
+        "token_envio": token_envio,
+        "particiones": PARTICIONES_ESTADISTICAS
+    }
+
+def guardar_test(db: Session, user_id: int, tipo_test: str, respuestas: dict, resultados: dict,
+                 token_envio: Optional[str] = None) -> int:
+    """
+    Guarda el test, sus respuestas y sus resultados en un solo round trip
+    (INSERTs encadenados en un CTE). No hace commit; retorna el id del test.
+    Las respuestas se guardan según ALMACENAMIENTO_RESPUESTAS.
+    
+    Si ya existe un test del usuario con el mismo token_envio (envío repetido),
+    no inserta nada y retorna el id del test existente.
+    """
+    compacto = ALMACENAMIENTO_RESPUESTAS == "compacto"
+    query = _QUERY_GUARDAR_TEST_COMPACTO if compacto else _QUERY_GUARDAR_TEST
+    
+    result = db.execute(query, parametros_guardar_test(
+        user_id, tipo_test, respuestas, resultados, token_envio, compacto
+    ))
+    nuevo = result.fetchone()
+    
+    if nuevo is None:
+        # El índice único descartó el envío repetido (ON CONFLICT DO NOTHING)
+        return buscar_test_por_token(db, user_id, token_envio)
+    
+    return nuevo[0]
+
+_QUERY_BUSCAR_TEST_POR_TOKEN = text("""
+        SELECT id FROM tests_realizados
+        WHERE usuario_id = :user_id AND token_envio = CAST(:token_envio AS uuid)
+""")
+
+def buscar_test_por_token(db: Session, user_id: int, token_envio: str) -> Optional[int]:
+    """Id del test ya guardado con este token de envío (búsqueda por índice único)"""
+    return db.execute(_QUERY_BUSCAR_TEST_POR_TOKEN, {"user_id": user_id, "token_envio": token_envio}).scalar()
+
+
+# ================================
+# ELIMINACIÓN
+# ================================
+
+# Borra los tests de "propios" con sus respuestas y resultados, y resta las estadísticas
+# de población y los contadores de usuario_resumen a partir de las filas borradas.
+# Las estadísticas se restan sumando deltas negativos (no con UPDATE): si la partición
+# del test ya no tiene fila (cambió PARTICIONES_ESTADISTICAS) se crea con n negativo
+# y el total sumando particiones sigue siendo correcto
+_QUERY_BORRAR_TESTS = """
+        borrar_respuestas AS (
+            DELETE FROM respuestas_test
+            WHERE test_id IN (SELECT id FROM propios)
+        ),
+        borrar_resultados AS (
+            DELETE FROM resultados_test
+            WHERE test_id IN (SELECT id FROM propios)
+            RETURNING test_id, area_principal, datos_adicionales
+        ),
+        borrar_tests AS (
+            DELETE FROM tests_realizados
+            WHERE id IN (SELECT id FROM propios)
+            RETURNING id, tipo_test, completado, CAST(fecha_realizacion AS date) AS dia
+        ),
+        borrados AS (
+            SELECT t.id, t.tipo_test, t.dia, r.area_principal, r.datos_adicionales
+            FROM borrar_tests t
+            INNER JOIN borrar_resultados r ON r.test_id = t.id
+        ),
+        restar_dimensiones AS (
+            INSERT INTO estadisticas_dimensiones AS e
+            (dia, tipo_test, dimension, particion, n, suma, suma_cuadrados)
+            SELECT b.dia, b.tipo_test, d.key, b.id % :particiones,
+                   -COUNT(*),
+                   -SUM(CAST(d.value AS float8)),
+                   -SUM(CAST(d.value AS float8) ^ 2)
+            FROM borrados b,
+                 jsonb_each_text(b.datos_adicionales->'puntajes_dimensiones') AS d
+            GROUP BY 1, 2, 3, 4
+            ON CONFLICT (dia, tipo_test, dimension, particion) DO UPDATE SET
+                n = e.n + EXCLUDED.n,
+                suma = e.suma + EXCLUDED.suma,
+                suma_cuadrados = e.suma_cuadrados + EXCLUDED.suma_cuadrados
+        ),
+        restar_perfiles AS (
+            INSERT INTO estadisticas_perfiles AS e
+            (dia, tipo_test, area_principal, perfil_identificado, particion, n)
+            SELECT dia, tipo_test, COALESCE(area_principal, ''),
+                   COALESCE(datos_adicionales->>'perfil_identificado', ''),
+                   id % :particiones, -COUNT(*)
+            FROM borrados
+            GROUP BY 1, 2, 3, 4, 5
+            ON CONFLICT (dia, tipo_test, area_principal, perfil_identificado, particion)
+            DO UPDATE SET n = e.n + EXCLUDED.n
+        ),
+        restar_resumen AS (
+            UPDATE usuario_resumen u
+            SET total_tests = u.total_tests - (SELECT COUNT(*) FROM borrar_tests WHERE completado),
+                conteo_areas = COALESCE((
+                    SELECT jsonb_object_agg(c.key, CAST(c.value AS integer) - COALESCE(x.n, 0))
+                    FROM jsonb_each_text(u.conteo_areas) AS c
+                    LEFT JOIN (
+                        SELECT area_principal, COUNT(*) AS n
+                        FROM borrados
+                        GROUP BY 1
+                    ) x ON x.area_principal = c.key
+                    WHERE CAST(c.value AS integer) > COALESCE(x.n, 0)
+                ), CAST('{}' AS jsonb)),
+                actualizado = CURRENT_TIMESTAMP
+            WHERE u.usuario_id = :user_id
+            AND EXISTS (SELECT 1 FROM borrar_tests)
+        )
+        SELECT id FROM borrar_tests
+"""
+
+_QUERY_ELIMINAR_TESTS = text("""
+        WITH propios AS (
+            SELECT id FROM tests_realizados
+            WHERE id = ANY(:test_ids) AND usuario_id = :user_id
+        ),""" + _QUERY_BORRAR_TESTS)
+
+# Cuenta a borrar: FOR UPDATE espera a los guardados en curso del usuario (la clave
+# foránea de tests_realizados toma FOR KEY SHARE sobre usuarios) y bloquea los nuevos
+_QUERY_BLOQUEAR_USUARIO = text("""
+        SELECT id FROM usuarios WHERE id = :user_id FOR UPDATE
+""")
+
+_QUERY_IDS_TESTS_USUARIO = text("""
+        SELECT id FROM tests_realizados
+        WHERE usuario_id = :user_id
+        ORDER BY id
+""")
+
+def eliminar_tests(db: Session, user_id: int, test_ids: List[int]) -> List[int]:
+    """
+    Elimina tests del usuario con sus respuestas y resultados en un solo
+    statement (DELETEs encadenados en un CTE). Los ids que no pertenecen
+    al usuario se ignoran. No hace commit; retorna los ids eliminados.
+    
+    Las estadísticas de población y los contadores de usuario_resumen se restan a
+    partir de las filas que el statement borró de verdad (RETURNING), así un borrado
+    simultáneo no descuenta dos veces. El último test, el área más frecuente y las
+    últimas dimensiones se vuelven a leer después, en otro statement (el CTE todavía
+    ve los tests borrados).
+    """
+    result = db.execute(_QUERY_ELIMINAR_TESTS, {
+        "test_ids": list(test_ids),
+        "user_id": user_id,
+        "particiones": PARTICIONES_ESTADISTICAS
+    })
+    eliminados = [row[0] for row in result.fetchall()]
+    
+    if eliminados:
+        db.execute(_QUERY_RECALCULAR_RESUMEN, {"user_id": user_id})
+        invalidar_detalle_tests(user_id, eliminados)
+    
+    return eliminados
+
+def eliminar_usuario(db: Session, user_id: int) -> None:
+    """
+    Elimina la cuenta del usuario. Sus tests se borran antes con el CTE de eliminar_tests,
+    en lotes de TAMANO_LOTE_ELIMINACION, para restar las estadísticas de población (el
+    ON DELETE CASCADE de usuarios no las descontaría); el resto de sus datos se borra en
+    cascada. No hace commit: tests y cuenta se borran en la misma transacción.
+    """
+    db.execute(_QUERY_BLOQUEAR_USUARIO, {"user_id": user_id})
+    test_ids = db.execute(_QUERY_IDS_TESTS_USUARIO, {"user_id": user_id}).scalars().all()
+    
+    # Lotes chicos: con cientos de tests a la vez, Postgres resta las estadísticas
+    # recorriendo estadisticas_dimensiones entera en vez de usar su clave primaria
+    for inicio in range(0, len(test_ids), TAMANO_LOTE_ELIMINACION):
+        db.execute(_QUERY_ELIMINAR_TESTS, {
+            "test_ids": test_ids[inicio:inicio + TAMANO_LOTE_ELIMINACION],
+            "user_id": user_id,
+            "particiones": PARTICIONES_ESTADISTICAS
+        })
+    
+    db.execute(consultas.ELIMINAR_USUARIO, {"user_id": user_id})
+    invalidar_detalle_tests(user_id)
+
+# ================================
+# RESUMEN POR USUARIO
+# ================================
+
+# Último test, área más frecuente y últimas dimensiones del test general, leídos de
+# los tests del usuario (búsquedas por los índices de la versión 4 de migraciones.py)
+_LATERALES_RESUMEN = """
+        LEFT JOIN LATERAL (
+            SELECT tipo_test, fecha_realizacion
+            FROM tests_realizados
+            WHERE usuario_id = :user_id AND completado = true
+            ORDER BY fecha_realizacion DESC
+            LIMIT 1
+        ) ultimo ON true
+        LEFT JOIN LATERAL (
+            SELECT r.area_principal
+            FROM tests_realizados t
+            INNER JOIN resultados_test r ON t.id = r.test_id
+            WHERE t.usuario_id = :user_id
+            AND t.completado = true
+            AND r.area_principal IS NOT NULL
+            GROUP BY r.area_principal
+            ORDER BY COUNT(*) DESC, MAX(t.fecha_realizacion) DESC
+            LIMIT 1
+        ) area ON true
+        LEFT JOIN LATERAL (
+            SELECT r.datos_adicionales->'puntajes_dimensiones' AS dimensiones,
+                   t.fecha_realizacion
+            FROM tests_realizados t
+            INNER JOIN resultados_test r ON t.id = r.test_id
+            WHERE t.usuario_id = :user_id
+            AND t.tipo_test = 'general'
+            AND r.datos_adicionales IS NOT NULL
+            ORDER BY t.fecha_realizacion DESC
+            LIMIT 1
+        ) general ON true
+"""
+
+# Recalcula toda la fila desde los tests (carga inicial en crear_resumen_usuarios.py)
+_QUERY_ACTUALIZAR_RESUMEN = text("""
+        INSERT INTO usuario_resumen
+        (usuario_id, total_tests, ultimo_tipo_test, ultima_fecha,
+         area_mas_fuerte, conteo_areas, dimensiones, fecha_dimensiones, actualizado)
+        SELECT :user_id,
+               (SELECT COUNT(*) FROM tests_realizados
+                WHERE usuario_id = :user_id AND completado = true),
+               ultimo.tipo_test, ultimo.fecha_realizacion,
+               area.area_principal,
+               COALESCE(conteo.areas, CAST('{}' AS jsonb)),
+               general.dimensiones, general.fecha_realizacion,
+               CURRENT_TIMESTAMP
+        FROM (SELECT 1) base
+        LEFT JOIN LATERAL (
+            SELECT jsonb_object_agg(area_principal, n) AS areas
+            FROM (
+                SELECT r.area_principal, COUNT(*) AS n
+                FROM tests_realizados t
+                INNER JOIN resultados_test r ON t.id = r.test_id
+                WHERE t.usuario_id = :user_id
+                AND t.completado = true
+                AND r.area_principal IS NOT NULL
+                GROUP BY r.area_principal
+            ) x
+        ) conteo ON true""" + _LATERALES_RESUMEN + """
+        ON CONFLICT (usuario_id) DO UPDATE SET
+            total_tests = EXCLUDED.total_tests,
+            ultimo_tipo_test = EXCLUDED.ultimo_tipo_test,
+            ultima_fecha = EXCLUDED.ultima_fecha,
+            area_mas_fuerte = EXCLUDED.area_mas_fuerte,
+            conteo_areas = EXCLUDED.conteo_areas,
+            dimensiones = EXCLUDED.dimensiones,
+            fecha_dimensiones = EXCLUDED.fecha_dimensiones,
+            actualizado = EXCLUDED.actualizado
+        RETURNING total_tests, ultimo_tipo_test, ultima_fecha,
+                  area_mas_fuerte, dimensiones, fecha_dimensiones
+""")
+
+# Tras eliminar tests: total_tests y conteo_areas ya se restaron en el CTE del borrado;
+# solo se vuelven a leer los campos que pueden haber apuntado a un test borrado
+_QUERY_RECALCULAR_RESUMEN = text("""
+        UPDATE usuario_resumen u
+        SET ultimo_tipo_test = ultimo.tipo_test,
+            ultima_fecha = ultimo.fecha_realizacion,
+            area_mas_fuerte = area.area_principal,
+            dimensiones = general.dimensiones,
+            fecha_dimensiones = general.fecha_realizacion,
+            actualizado = CURRENT_TIMESTAMP
+        FROM (SELECT 1) base""" + _LATERALES_RESUMEN + """
+        WHERE u.usuario_id = :user_id
+""")
+
+# Crea o bloquea la fila del usuario antes de recalcular: así un guardado simultáneo
+# del mismo usuario espera, y el recálculo ve su test en vez de pisar su suma
+# (en READ COMMITTED cada statement toma un snapshot nuevo)
+_QUERY_BLOQUEAR_RESUMEN = text("""
+        INSERT INTO usuario_resumen (usuario_id)
+        VALUES (:user_id)
+        ON CONFLICT (usuario_id) DO UPDATE SET actualizado = CURRENT_TIMESTAMP
+""")
+
+_QUERY_RESUMEN = text("""
+        SELECT total_tests, ultimo_tipo_test, ultima_fecha,
+               area_mas_fuerte, dimensiones, fecha_dimensiones
+        FROM usuario_resumen
+        WHERE usuario_id = :user_id
+""")
+
+# Fila de un usuario sin tests (o que todavía no tiene resumen)
+_RESUMEN_VACIO = (0, None, None, None, None, None)
+
+def actualizar_resumen_usuario(db: Session, user_id: int):
+    """
+    Recalcula desde cero la fila de usuario_resumen a partir de los tests del usuario.
+    guardar_test y eliminar_tests mantienen la fila de forma incremental; esto es para
+    la carga inicial (crear_resumen_usuarios.py). No hace commit; retorna la fila.
+    """
+    db.execute(_QUERY_BLOQUEAR_RESUMEN, {"user_id": user_id})
+    return db.execute(_QUERY_ACTUALIZAR_RESUMEN, {"user_id": user_id}).fetchone()
+
+def obtener_resumen_usuario(db: Session, user_id: int):
+    """
+    Lee el resumen del usuario con una búsqueda por clave primaria. Solo lee:
+    si el usuario no tiene fila, retorna un resumen vacío (los tests anteriores
+    al resumen se cargan con crear_resumen_usuarios.py).
+    """
+    resumen = db.execute(_QUERY_RESUMEN, {"user_id": user_id}).fetchone()
+    
+    return resumen if resumen is not None else _RESUMEN_VACIO
+
+
+# ================================
+# REGISTRO
+# ================================
+
+# Sentencias de este módulo por nombre (como consultas.REGISTRO): verificar_planes.py
+# las ejecuta con EXPLAIN ANALYZE contra datos a escala
+REGISTRO = {
+    "GUARDAR_TEST": _QUERY_GUARDAR_TEST,
+    "GUARDAR_TEST_COMPACTO": _QUERY_GUARDAR_TEST_COMPACTO,
+    "BUSCAR_TEST_POR_TOKEN": _QUERY_BUSCAR_TEST_POR_TOKEN,
+    "ELIMINAR_TESTS": _QUERY_ELIMINAR_TESTS,
+    "IDS_TESTS_USUARIO": _QUERY_IDS_TESTS_USUARIO,
+    "ACTUALIZAR_RESUMEN": _QUERY_ACTUALIZAR_RESUMEN,
+    "RECALCULAR_RESUMEN": _QUERY_RECALCULAR_RESUMEN,
+    "BLOQUEAR_RESUMEN": _QUERY_BLOQUEAR_RESUMEN,
+    "RESUMEN": _QUERY_RESUMEN
+}
+
+
+# ================================
+# OUTBOX LOCAL
+# ================================
+
+_outbox_lock = threading.Lock()
+_pendientes = {}  # clave -> registro aún no confirmado
+
+def _escribir_outbox(registro: dict) -> None:
+    """Agrega el test al outbox (forzado a disco) y lo marca como pendiente"""
+    with _outbox_lock:
+        with open(OUTBOX_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        _pendientes[registro["clave"]] = registro
+
+def _confirmar_outbox(claves: list) -> None:
+    """Marca tests como guardados; si no queda nada pendiente, vacía el archivo"""
+    with _outbox_lock:
+        for clave in claves:
+            _pendientes.pop(clave, None)
+        
+        if not _pendientes:
+            open(OUTBOX_PATH, "w").close()
+            return
+        
+        with open(OUTBOX_PATH, "a", encoding="utf-8") as f:
+            for clave in claves:
+                f.write(json.dumps({"confirmado": clave}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+def _leer_outbox() -> list:
+    """Retorna los tests del outbox que no alcanzaron a confirmarse"""
+    if not os.path.exists(OUTBOX_PATH):
+        return []
+    
+    registros = {}
+    with open(OUTBOX_PATH, "r", encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                continue  # Línea a medio escribir durante una caída
+            
+            if "confirmado" in registro:
+                registros.pop(registro["confirmado"], None)
+            else:
+                registros[registro["clave"]] = registro
+    
+    return list(registros.values())
+
+
+# ================================
+# COLA Y WORKER
+# ================================
+
+_cola: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+_guardado_en_curso: Optional[asyncio.Future] = None  # Lote que un thread está guardando
+_reencolados = set()  # Timers de los lotes que esperan para volver a la cola
+
+async def encolar_test(user_id: int, tipo_test: str, respuestas: dict, resultados: dict,
+                       token_envio: Optional[str] = None) -> bool:
+    """
+    Encola un test para guardado diferido.
+    La escritura en el outbox (con fsync) corre en el threadpool para no bloquear el event loop.
+    Retorna False si el guardado diferido no está activo (guardar directamente).
+    """
+    if _cola is None:
+        return False
+    
+    registro = {
+        "clave": uuid.uuid4().hex,
+        "user_id": user_id,
+        "tipo_test": tipo_test,
+        "respuestas": respuestas,
+        "resultados": resultados,
+        "token_envio": token_envio
+    }
+    
+    await run_in_threadpool(_escribir_outbox, registro)
+    _cola.put_nowait(registro)
+    return True
+
+def _guardar_lote(lote: list) -> list:
+    """
+    Guarda un lote en una sola transacción; si falla, guarda test por test.
+    Retorna las claves guardadas.
+    """
+    db = SessionLocal()
+    try:
+        try:
+            for registro in lote:
+                guardar_test(db, registro["user_id"], registro["tipo_test"],
+                             registro["respuestas"], registro["resultados"],
+                             registro.get("token_envio"))
+            db.commit()
+            return [registro["clave"] for registro in lote]
+        except Exception as e:
+            db.rollback()
+            if len(lote) == 1:
+                raise
+            print(f"⚠️ Lote de {len(lote)} tests falló ({e}), guardando uno por uno")
+        
+        guardados = []
+        for registro in lote:
+            try:
+                guardar_test(db, registro["user_id"], registro["tipo_test"],
+                             registro["respuestas"], registro["resultados"],
+                             registro.get("token_envio"))
+                db.commit()
+                guardados.append(registro["clave"])
+            except Exception as e:
+                db.rollback()
+                print(f"❌ Error al guardar test diferido {registro['clave']}: {e}")
+        return guardados
+    finally:
+        db.close()
+
+def _guardar_y_confirmar(lote: list) -> list:
+    """_guardar_lote y la confirmación en el outbox de lo guardado, en el mismo thread"""
+    guardados = _guardar_lote(lote)
+    if guardados:
+        try:
+            _confirmar_outbox(guardados)
+        except OSError as e:
+            # Ya están en la base de datos; si se re-encolan tras un reinicio,
+            # token_envio descarta el duplicado
+            print(f"⚠️ No se pudo confirmar en el outbox {len(guardados)} tests guardados: {e}")
+    return guardados
+
+async def _guardar_en_thread(lote: list) -> list:
+    """
+    _guardar_y_confirmar en el threadpool. Si el worker se cancela (apagado) mientras el
+    thread guarda, el guardado sigue y queda en _guardado_en_curso para
+    detener_guardado_diferido.
+    """
+    global _guardado_en_curso
+    
+    guardado = asyncio.ensure_future(run_in_threadpool(_guardar_y_confirmar, lote))
+    _guardado_en_curso = guardado
+    try:
+        guardados = await asyncio.shield(guardado)
+    except Exception:
+        # CancelledError no entra aquí: al cancelar, el guardado queda en _guardado_en_curso
+        _guardado_en_curso = None
+        raise
+    _guardado_en_curso = None
+    return guardados
+
+async def _guardar_con_reintentos(lote: list) -> list:
+    """
+    Intenta guardar el lote hasta MAX_REINTENTOS veces, duplicando la espera.
+    Retorna los tests que siguen sin guardar.
+    """
+    espera = ESPERA_REINTENTO
+    for intento in range(1, MAX_REINTENTOS + 1):
+        try:
+            guardados = await _guardar_en_thread(lote)
+        except Exception as e:
+            guardados = []
+            print(f"❌ Error al guardar lote (intento {intento}): {e}")
+        
+        if guardados:
+            claves = set(guardados)
+            lote = [r for r in lote if r["clave"] not in claves]
+        
+        if not lote:
+            break
+        
+        await asyncio.sleep(espera)
+        espera *= 2
+    
+    return lote
+
+def _reencolar(lote: list) -> None:
+    """Devuelve a la cola los tests de un lote que falló"""
+    if _cola is None:
+        return  # Apagando: siguen en el outbox para el próximo arranque
+    for registro in lote:
+        _cola.put_nowait(registro)
+
+def _programar_reencolado(lote: list) -> None:
+    """
+    Vuelve a encolar el lote más tarde sin detener el worker.
+    Cada ronda fallida duplica la espera, hasta ESPERA_MAXIMA_REENCOLADO.
+    """
+    ronda = max(registro.get("ronda", 0) for registro in lote) + 1
+    for registro in lote:
+        registro["ronda"] = ronda
+    
+    espera = min(ESPERA_REINTENTO * 2 ** (MAX_REINTENTOS + ronda - 1), ESPERA_MAXIMA_REENCOLADO)
+    print(f"❌ {len(lote)} tests sin guardar tras {MAX_REINTENTOS} intentos, "
+          f"se re-encolan en {espera:.0f}s (ronda {ronda})")
+    loop = asyncio.get_running_loop()
+    _reencolados.difference_update([timer for timer in _reencolados if timer.when() <= loop.time()])
+    _reencolados.add(loop.call_later(espera, _reencolar, lote))
+
+async def _procesar_cola() -> None:
+    """
+    Worker: junta tests de la cola y los guarda por lotes con reintentos.
+    Un error inesperado no detiene el worker: se registra y el lote vuelve a la cola.
+    """
+    while True:
+        lote = [await _cola.get()]
+        
+        try:
+            # Esperar un poco para agrupar tests de otros usuarios
+            await asyncio.sleep(ESPERA_LOTE)
+            while len(lote) < TAMANO_LOTE and not _cola.empty():
+                lote.append(_cola.get_nowait())
+            
+            lote = await _guardar_con_reintentos(lote)
+        except Exception as e:
+            print(f"❌ Error inesperado en el worker de guardado diferido: {e}")
+            import traceback
+            traceback.print_exc()
+        
+        if lote:
+            _programar_reencolado(lote)
+
+async def iniciar_guardado_diferido() -> None:
+    """Arranca el worker y re-encola lo que quedó pendiente en el outbox"""
+    global _cola, _worker
+    
+    if not GUARDADO_DIFERIDO or _worker is not None:
+        return
+    
+    _cola = asyncio.Queue()
+    
+    pendientes = _leer_outbox()
+    with _outbox_lock:
+        _pendientes.update({registro["clave"]: registro for registro in pendientes})
+    for registro in pendientes:
+        _cola.put_nowait(registro)
+    
+    if pendientes:
+        print(f"🔄 Re-encolando {len(pendientes)} tests pendientes del outbox")
+    
+    _worker = asyncio.create_task(_procesar_cola())
+    print("✅ Guardado diferido de tests activo")
+
+async def detener_guardado_diferido() -> None:
+    """
+    Detiene el worker y guarda lo que quede antes de apagar: la cola, el lote que el
+    worker tenía en la mano y los lotes que esperaban para volver a la cola. Todos siguen
+    en _pendientes hasta que se confirman.
+    """
+    global _cola, _worker, _guardado_en_curso
+    
+    if _worker is None:
+        return
+    
+    _worker.cancel()
+    with suppress(asyncio.CancelledError):
+        await _worker
+    
+    for timer in _reencolados:
+        timer.cancel()
+    _reencolados.clear()
+    
+    # Un lote que quedó guardándose en un thread: se espera a que termine (y confirme)
+    # para no guardarlo otra vez (los tests sin token_envio se duplicarían)
+    if _guardado_en_curso is not None:
+        try:
+            await _guardado_en_curso
+        except Exception as e:
+            print(f"⚠️ Falló el lote que se estaba guardando al apagar, se reintenta: {e}")
+        _guardado_en_curso = None
+    
+    with _outbox_lock:
+        lote = list(_pendientes.values())
+    
+    if lote:
+        try:
+            guardados = await run_in_threadpool(_guardar_lote, lote)
+            await run_in_threadpool(_confirmar_outbox, guardados)
+        except Exception as e:
+            print(f"❌ Error al guardar tests al apagar (quedan en el outbox): {e}")
+    
+    _cola = None
+    _worker = None
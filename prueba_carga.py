@@ -0,0 +1,369 @@
+# prueba_carga.py - Prueba de carga con la mezcla de tráfico real
+
+"""
+Script para medir la capacidad de la app antes de temporada de exámenes: usuarios virtuales
+recorren escenarios con la mezcla de tráfico de producción durante un tiempo fijo.
+
+Uso:
+    python prueba_carga.py [--usuarios-virtuales 20] [--duracion 60] [--espera-ms 500]
+        [--mezcla paginas=45,catalogo=25,foro=20,login=5,test=5] [--semilla 1]
+        [--url http://localhost:8000 --token-metricas TOKEN] [--salida resultados.json]
+
+Escenarios:
+    paginas   páginas de contenido sin sesión (/, /blog, /becas, ...)
+    catalogo  /api/programas y el detalle de un programa
+    foro      listado de comentarios, likes y comentarios nuevos
+    login     login con JWT y /api/auth/me
+    test      test general completo: formulario, 40 respuestas y guardado
+
+El script:
+1. Sin --url levanta la app en este proceso (httpx contra la app ASGI, con su lifespan)
+   sobre la base de URL_DATABASE, que debe ser local o de staging: crea cuentas
+   carga.*@ejemplo.com y guarda tests y comentarios. Con --url prueba un servidor ya
+   levantado (uvicorn con varios workers mide mejor la capacidad real)
+2. Registra una cuenta por usuario virtual (fuera de la medición)
+3. Cada usuario virtual elige un escenario según --mezcla, lo ejecuta y espera en
+   promedio --espera-ms antes del siguiente, hasta completar --duracion segundos
+4. Imprime por ruta: requests, throughput, porcentaje de errores, p50/p95/p99 y la espera
+   de conexiones del pool (de metricas_sql; con --url, del endpoint de métricas de la
+   instancia que respondió, si se pasa --token-metricas)
+
+Termina con código 1 si el porcentaje de errores supera --max-errores.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import httpx
+
+from tests_config import TESTS_CONFIG
+
+MEZCLA_DEFECTO = "paginas=45,catalogo=25,foro=20,login=5,test=5"
+
+PAGINAS_ANONIMAS = [
+    "/", "/blog", "/carrerasdem", "/comoelegir", "/errorescom", "/fechasimp", "/guiav",
+    "/mitosyr", "/programas", "/recuryevent", "/articulos", "/webinars", "/becas",
+    "/calculadora", "/test-vocacional"
+]
+
+CONTRASENA_CARGA = "carga-secreta-123"
+
+_TOKEN_ENVIO = re.compile(r'name="token_envio" value="([^"]+)"')
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+# ================================
+# USUARIO VIRTUAL
+# ================================
+
+class UsuarioVirtual:
+    """Un navegador o cliente de la API: sus cookies, su cuenta y su token"""
+    
+    def __init__(self, cliente: httpx.AsyncClient, email: str, rng: random.Random, resultados: dict):
+        self.cliente = cliente
+        self.email = email
+        self.rng = rng
+        self.resultados = resultados
+        self.token = None
+    
+    async def pedir(self, metodo: str, ruta: str, url: str = None, **kwargs):
+        """
+        Hace un request y lo registra bajo "METODO ruta", con la plantilla de la ruta
+        (la misma clave que usa metricas_sql). Retorna None si falló la conexión.
+        """
+        clave = f"{metodo} {ruta}"
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.cliente.request(metodo, url or ruta, **kwargs)
+            codigo = respuesta.status_code
+        except httpx.HTTPError as e:
+            respuesta = None
+            codigo = type(e).__name__
+        
+        medicion = self.resultados[clave]
+        medicion["latencias"].append((time.perf_counter() - inicio) * 1000)
+        medicion["codigos"][codigo] += 1
+        return respuesta
+    
+    def _auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+
+# ================================
+# ESCENARIOS
+# ================================
+
+async def escenario_paginas(uv: UsuarioVirtual):
+    for ruta in uv.rng.sample(PAGINAS_ANONIMAS, 3):
+        await uv.pedir("GET", ruta)
+
+async def escenario_catalogo(uv: UsuarioVirtual):
+    respuesta = await uv.pedir("GET", "/api/programas")
+    if respuesta is None or respuesta.status_code != 200 or not respuesta.json():
+        return
+    
+    programa = uv.rng.choice(respuesta.json())
+    await uv.pedir("GET", "/api/programas/{programa_id}", f"/api/programas/{programa['id']}")
+
+async def escenario_foro(uv: UsuarioVirtual):
+    orden = uv.rng.choice(["newest", "newest", "newest", "popular"])
+    respuesta = await uv.pedir("GET", "/api/comentarios", params={"orden": orden, "limit": 10})
+    comentarios = respuesta.json()["comentarios"] if respuesta is not None and respuesta.status_code == 200 else []
+    
+    if comentarios and uv.rng.random() < 0.3:
+        comentario = uv.rng.choice(comentarios)
+        await uv.pedir(
+            "POST", "/api/comentarios/{comentario_id}/like",
+            f"/api/comentarios/{comentario['id']}/like"
+        )
+    
+    if uv.rng.random() < 0.1:
+        await uv.pedir("POST", "/api/comentarios", json={
+            "nombre": "Prueba de carga",
+            "tema": uv.rng.choice(["general", "carreras", "becas"]),
+            "contenido": f"Comentario de la prueba de carga {uuid.uuid4().hex[:8]}"
+        })
+
+async def escenario_login(uv: UsuarioVirtual):
+    respuesta = await uv.pedir("POST", "/api/auth/login", json={
+        "email": uv.email,
+        "password": CONTRASENA_CARGA
+    })
+    if respuesta is not None and respuesta.status_code == 200:
+        uv.token = respuesta.json()["access_token"]
+        await uv.pedir("GET", "/api/auth/me", headers=uv._auth())
+
+async def escenario_test(uv: UsuarioVirtual):
+    if not uv.token:
+        await escenario_login(uv)
+        if not uv.token:
+            return
+    
+    formulario = await uv.pedir("GET", "/test/{tipo_test}", "/test/general", headers=uv._auth())
+    if formulario is None or formulario.status_code != 200:
+        return
+    
+    token_envio = _TOKEN_ENVIO.search(formulario.text)
+    datos = {
+        f"pregunta_{pregunta['id']}": uv.rng.choice("ABCDE")
+        for pregunta in TESTS_CONFIG["general"]["preguntas"]
+    }
+    datos["token_envio"] = token_envio.group(1) if token_envio else ""
+    
+    await uv.pedir(
+        "POST", "/test/{tipo_test}/procesar", "/test/general/procesar",
+        data=datos, headers=uv._auth()
+    )
+
+ESCENARIOS = {
+    "paginas": escenario_paginas,
+    "catalogo": escenario_catalogo,
+    "foro": escenario_foro,
+    "login": escenario_login,
+    "test": escenario_test
+}
+
+
+# ================================
+# EJECUCIÓN
+# ================================
+
+def _leer_mezcla(texto: str) -> dict:
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, peso = parte.split("=")
+        if nombre not in ESCENARIOS:
+            raise ValueError(f"Escenario desconocido: {nombre} (hay: {', '.join(ESCENARIOS)})")
+        mezcla[nombre] = float(peso)
+    return mezcla
+
+async def _registrar_cuentas(cliente: httpx.AsyncClient, cantidad: int) -> list:
+    """Una cuenta nueva por usuario virtual (no cuenta en la medición)"""
+    prefijo = f"carga.{uuid.uuid4().hex[:8]}"
+    emails = [f"{prefijo}.{i}@ejemplo.com" for i in range(cantidad)]
+    
+    async def registrar(email: str):
+        respuesta = await cliente.post("/api/auth/register", json={
+            "nombre": "Prueba de carga",
+            "email": email,
+            "password": CONTRASENA_CARGA,
+            "rol": "estudiante"
+        })
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"No se pudo registrar {email}: {respuesta.status_code} {respuesta.text[:200]}")
+    
+    await asyncio.gather(*[registrar(email) for email in emails])
+    print(f"👥 Cuentas registradas: {cantidad} ({prefijo}.*@ejemplo.com)")
+    return emails
+
+async def _metricas_servidor(cliente: httpx.AsyncClient, args, reiniciar: bool = False):
+    """Reporte de metricas_sql: de este proceso, o del endpoint interno del servidor"""
+    if not args.url:
+        import metricas_sql
+        reporte = metricas_sql.reporte()
+        if reiniciar:
+            metricas_sql.reiniciar()
+        return reporte
+    
+    if not args.token_metricas:
+        return None
+    respuesta = await cliente.get(
+        "/api/interno/metricas-sql",
+        params={"reiniciar": "true"} if reiniciar else None,
+        headers={"X-Metricas-Token": args.token_metricas}
+    )
+    return respuesta.json() if respuesta.status_code == 200 else None
+
+async def _ejecutar(args, crear_cliente) -> tuple:
+    mezcla = _leer_mezcla(args.mezcla)
+    nombres = list(mezcla)
+    pesos = [mezcla[nombre] for nombre in nombres]
+    resultados = defaultdict(lambda: {"latencias": [], "codigos": Counter()})
+    
+    async with crear_cliente() as cliente:
+        emails = await _registrar_cuentas(cliente, args.usuarios_virtuales)
+        await _metricas_servidor(cliente, args, reiniciar=True)
+    
+    fin = time.monotonic() + args.duracion
+    
+    async def usuario_virtual(indice: int):
+        rng = random.Random(args.semilla * 1000 + indice)
+        async with crear_cliente() as cliente:
+            uv = UsuarioVirtual(cliente, emails[indice], rng, resultados)
+            while time.monotonic() < fin:
+                escenario = rng.choices(nombres, weights=pesos)[0]
+                try:
+                    await ESCENARIOS[escenario](uv)
+                except Exception as e:
+                    resultados[f"escenario {escenario}"]["codigos"][type(e).__name__] += 1
+                if args.espera_ms:
+                    await asyncio.sleep(rng.expovariate(1000 / args.espera_ms))
+    
+    print(f"🚀 {args.usuarios_virtuales} usuarios virtuales durante {args.duracion}s...")
+    inicio = time.perf_counter()
+    await asyncio.gather(*[usuario_virtual(i) for i in range(args.usuarios_virtuales)])
+    duracion = time.perf_counter() - inicio
+    
+    async with crear_cliente() as cliente:
+        metricas = await _metricas_servidor(cliente, args)
+    
+    return resultados, duracion, metricas
+
+def _reporte(resultados: dict, duracion: float, metricas) -> dict:
+    pool_por_ruta = {r["ruta"]: r for r in metricas["rutas"]} if metricas else {}
+    filas = []
+    
+    for clave, medicion in sorted(resultados.items()):
+        latencias = medicion["latencias"]
+        total = sum(medicion["codigos"].values())
+        errores = sum(
+            n for codigo, n in medicion["codigos"].items()
+            if not isinstance(codigo, int) or codigo >= 400
+        )
+        pool = pool_por_ruta.get(clave, {})
+        filas.append({
+            "ruta": clave,
+            "requests": total,
+            "requests_por_segundo": total / duracion,
+            "errores_pct": errores * 100 / total if total else 0.0,
+            "codigos": {str(codigo): n for codigo, n in medicion["codigos"].items()},
+            "p50_ms": _percentil(latencias, 50) if latencias else None,
+            "p95_ms": _percentil(latencias, 95) if latencias else None,
+            "p99_ms": _percentil(latencias, 99) if latencias else None,
+            "espera_pool_promedio_ms": pool.get("espera_pool_promedio_ms"),
+            "max_espera_pool_ms": pool.get("max_espera_pool_ms")
+        })
+    
+    total = sum(fila["requests"] for fila in filas)
+    errores = sum(fila["requests"] * fila["errores_pct"] / 100 for fila in filas)
+    return {
+        "duracion_s": duracion,
+        "requests": total,
+        "requests_por_segundo": total / duracion,
+        "errores_pct": errores * 100 / total if total else 0.0,
+        "rutas": filas
+    }
+
+def _imprimir(reporte: dict):
+    def numero(valor, formato="{:.1f}"):
+        return "-" if valor is None else formato.format(valor)
+    
+    print("\n" + "="*118)
+    print(f"{'Ruta':42}{'req':>7}{'req/s':>8}{'err %':>7}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'pool prom':>11}{'pool máx':>10}  códigos")
+    print("="*118)
+    for fila in reporte["rutas"]:
+        codigos = " ".join(f"{codigo}:{n}" for codigo, n in sorted(fila["codigos"].items()))
+        print(f"{fila['ruta'][:41]:42}{fila['requests']:>7}{fila['requests_por_segundo']:>8.1f}"
+              f"{fila['errores_pct']:>7.1f}{numero(fila['p50_ms']):>9}{numero(fila['p95_ms']):>9}"
+              f"{numero(fila['p99_ms']):>9}{numero(fila['espera_pool_promedio_ms'], '{:.2f}'):>11}"
+              f"{numero(fila['max_espera_pool_ms'], '{:.2f}'):>10}  {codigos}")
+    print("="*118)
+    print(f"📊 {reporte['requests']} requests en {reporte['duracion_s']:.1f}s: "
+          f"{reporte['requests_por_segundo']:.1f} req/s, {reporte['errores_pct']:.2f}% errores")
+
+async def main(args) -> dict:
+    if args.url:
+        def crear_cliente():
+            return httpx.AsyncClient(base_url=args.url, timeout=30)
+        
+        resultados, duracion, metricas = await _ejecutar(args, crear_cliente)
+    else:
+        import main as app_main
+        # Un error no manejado de la app cuenta como 500, igual que detrás de uvicorn
+        transporte = httpx.ASGITransport(app=app_main.app, raise_app_exceptions=False)
+        
+        def crear_cliente():
+            return httpx.AsyncClient(transport=transporte, base_url="http://carga", timeout=30)
+        
+        async with app_main.app.router.lifespan_context(app_main.app):
+            resultados, duracion, metricas = await _ejecutar(args, crear_cliente)
+    
+    if args.url and metricas is None:
+        print("ℹ️  Sin --token-metricas no se mide la espera del pool")
+    
+    reporte = _reporte(resultados, duracion, metricas)
+    _imprimir(reporte)
+    return reporte
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga con la mezcla de tráfico de producción")
+    parser.add_argument("--usuarios-virtuales", type=int, default=20)
+    parser.add_argument("--duracion", type=float, default=60, help="Segundos de medición")
+    parser.add_argument("--espera-ms", type=float, default=500, help="Pausa promedio entre escenarios")
+    parser.add_argument("--mezcla", default=MEZCLA_DEFECTO, help="Peso de cada escenario")
+    parser.add_argument("--semilla", type=int, default=1, help="Semilla de las decisiones de cada usuario")
+    parser.add_argument("--url", help="Servidor ya levantado (sin esto, la app en este proceso)")
+    parser.add_argument("--token-metricas", default=os.getenv("METRICAS_TOKEN"),
+                        help="X-Metricas-Token del servidor (con --url)")
+    parser.add_argument("--max-errores", type=float, default=1.0, help="Porcentaje de errores aceptado")
+    parser.add_argument("--salida", help="Guarda el reporte en un archivo JSON")
+    args = parser.parse_args()
+    
+    print("="*50)
+    print("🏋️  PRUEBA DE CARGA")
+    print("="*50 + "\n")
+    
+    reporte = asyncio.run(main(args))
+    
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, ensure_ascii=False, indent=2)
+        print(f"💾 Reporte guardado en {args.salida}")
+    
+    if reporte["errores_pct"] > args.max_errores:
+        print(f"❌ Errores por encima de {args.max_errores}%")
+        exit(1)
+    
+    print("\n✅ Prueba de carga completada")
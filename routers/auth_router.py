@@ -4,9 +4,10 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.responses import RedirectResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
+import consultas
 from db import get_db
 from auth import (
     authenticate_user,
@@ -36,13 +37,13 @@ IS_PRODUCTION = os.getenv("ENVIRONMENT") == "production" or os.getenv("VERCEL")
 @router.post("/api/auth/login", response_model=Token)
 async def api_login(
     user_credentials: UserLogin,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Login vía API con JWT
     Retorna token de acceso
     """
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+    user = await authenticate_user(db, user_credentials.email, user_credentials.password)
     
     if not user:
         raise HTTPException(
@@ -54,7 +55,7 @@ async def api_login(
     # Crear token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.id, "email": user.email, "rol": user.rol},
+        data={"sub": user.id, "email": user.email, "rol": user.rol, "nombre": user.nombre},
         expires_delta=access_token_expires
     )
     
@@ -72,15 +73,14 @@ async def api_login(
 @router.post("/api/auth/register", response_model=Token)
 async def api_register(
     user_data: UserRegister,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Registro vía API con JWT
     Crea usuario y retorna token
     """
     # Verificar si el email ya existe
-    check_query = text("SELECT id FROM usuarios WHERE gmail = :email")
-    existing = db.execute(check_query, {"email": user_data.email}).fetchone()
+    existing = (await db.execute(consultas.EMAIL_REGISTRADO, {"email": user_data.email})).fetchone()
     
     if existing:
         raise HTTPException(
@@ -90,12 +90,12 @@ async def api_register(
     
     # Crear usuario
     try:
-        new_user = create_user(db, user_data)
+        new_user = await create_user(db, user_data)
         
         # Crear token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": new_user.id, "email": new_user.email, "rol": new_user.rol},
+            data={"sub": new_user.id, "email": new_user.email, "rol": new_user.rol, "nombre": new_user.nombre},
             expires_delta=access_token_expires
         )
         
@@ -111,7 +111,7 @@ async def api_register(
         }
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al crear usuario: {str(e)}"
@@ -132,7 +132,7 @@ async def change_password(
     new_password: str = Form(...),
     confirm_password: str = Form(...),
     current_user: dict = Depends(get_current_user_jwt),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Cambia la contraseña del usuario autenticado
@@ -151,7 +151,7 @@ async def change_password(
     
     # Verificar contraseña actual
     from auth import get_user_by_email, verify_password
-    user = get_user_by_email(db, current_user["gmail"])
+    user = await get_user_by_email(db, current_user["gmail"])
     
     if not user:
         raise HTTPException(
@@ -161,7 +161,7 @@ async def change_password(
     
     # Verificar contraseña actual (compatibilidad con sistema antiguo)
     if user.hashed_password.startswith("$2b$"):
-        if not verify_password(current_password, user.hashed_password):
+        if not await run_in_threadpool(verify_password, current_password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Contraseña actual incorrecta"
@@ -174,7 +174,7 @@ async def change_password(
             )
     
     # Actualizar contraseña
-    update_user_password(db, current_user["id"], new_password)
+    await update_user_password(db, current_user["id"], new_password)
     
     return {"message": "Contraseña actualizada correctamente"}
 
@@ -193,15 +193,14 @@ async def login_form(
     request: Request,
     Gmail: str = Form(...),
     contraseña: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Login tradicional con sesiones (mantener para compatibilidad)
     """
     try:
         # Buscar usuario
-        query = text("SELECT id, nombre, gmail, rol FROM usuarios WHERE gmail = :gmail AND contraseña = :pwd")
-        result = db.execute(query, {"gmail": Gmail, "pwd": contraseña}).fetchone()
+        result = (await db.execute(consultas.LOGIN_SESION, {"gmail": Gmail, "pwd": contraseña})).fetchone()
 
         if result:
             # Guardar en sesión
@@ -242,15 +241,14 @@ async def register_form(
     email: str = Form(...),
     rol: str = Form(...),
     contraseña: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Registro tradicional (mantener para compatibilidad)
     """
     try:
         # Verificar email existente
-        check_query = text("SELECT * FROM usuarios WHERE gmail = :email")
-        existing_user = db.execute(check_query, {"email": email}).fetchone()
+        existing_user = (await db.execute(consultas.EMAIL_REGISTRADO, {"email": email})).fetchone()
         
         if existing_user:
             return templates.TemplateResponse(
@@ -259,26 +257,21 @@ async def register_form(
             )
         
         # Hashear contraseña
-        hashed_pwd = get_password_hash(contraseña)
+        hashed_pwd = await run_in_threadpool(get_password_hash, contraseña)
         
         # Insertar usuario
-        insert_query = text("""
-            INSERT INTO usuarios (nombre, gmail, rol, contraseña) 
-            VALUES (:nombre, :email, :rol, :contraseña)
-        """)
-        
-        db.execute(insert_query, {
+        await db.execute(consultas.REGISTRAR_USUARIO, {
             "nombre": nombre,
             "email": email,
             "rol": rol,
-            "contraseña": hashed_pwd
+            "password": hashed_pwd
         })
-        db.commit()
+        await db.commit()
         
         return RedirectResponse(url="/login", status_code=303)
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error al registrar: {e}")
         return templates.TemplateResponse(
             "register.html",
@@ -0,0 +1,97 @@
+# routers/estadisticas_router.py - Router de estadísticas de población
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import date
+import math
+
+import consultas
+from db import get_db
+from auth import ROLES_ORIENTADORES, get_current_user_hybrid
+
+router = APIRouter()
+
+
+# ================================
+# TABLERO DE ORIENTADORES
+# ================================
+
+@router.get("/api/estadisticas/poblacion")
+async def get_estadisticas_poblacion(
+    desde: Optional[date] = Query(None, description="Primer día (por defecto, inicio del mes actual)"),
+    hasta: Optional[date] = Query(None, description="Último día (por defecto, hoy)"),
+    tipo_test: Optional[str] = Query(None, description="Filtrar por tipo de test"),
+    db: AsyncSession = Depends(get_db),
+    user: dict = Depends(get_current_user_hybrid)
+):
+    """
+    Hacia dónde se inclinan los estudiantes en un rango de días: promedio y desviación
+    de cada dimensión, áreas y perfiles más frecuentes y tests por día.
+    Lee los contadores diarios que mantienen guardar_test y eliminar_tests,
+    no recorre resultados_test.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    if user.get("rol") not in ROLES_ORIENTADORES:
+        raise HTTPException(status_code=403, detail="Solo disponible para orientadores")
+    
+    hasta = hasta or date.today()
+    desde = desde or hasta.replace(day=1)
+    
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="El rango de fechas no es válido")
+    
+    params = {"desde": desde, "hasta": hasta, "tipo_test": tipo_test}
+    
+    try:
+        filas_dimensiones = (await db.execute(consultas.ESTADISTICAS_DIMENSIONES, params)).fetchall()
+        
+        dimensiones = []
+        for dimension, n, suma, suma_cuadrados in filas_dimensiones:
+            promedio = suma / n
+            varianza = max(suma_cuadrados / n - promedio ** 2, 0.0)
+            dimensiones.append({
+                "dimension": dimension,
+                "n": n,
+                "promedio": round(promedio, 2),
+                "desviacion": round(math.sqrt(varianza), 2)
+            })
+        dimensiones.sort(key=lambda d: d["promedio"], reverse=True)
+        
+        perfiles_filas = (await db.execute(consultas.ESTADISTICAS_PERFILES, params)).fetchall()
+        
+        por_dia = [
+            {"dia": fila[0].isoformat(), "tests": fila[1]}
+            for fila in (await db.execute(consultas.ESTADISTICAS_POR_DIA, params)).fetchall()
+        ]
+        
+        total_tests = sum(fila[2] for fila in perfiles_filas)
+        
+        areas = {}
+        perfiles = {}
+        for area, perfil, n in perfiles_filas:
+            areas[area] = areas.get(area, 0) + n
+            perfiles[perfil] = perfiles.get(perfil, 0) + n
+        
+        def ranking(conteos: dict, campo: str) -> list:
+            return [
+                {campo: nombre, "tests": n, "porcentaje": round(n * 100 / total_tests, 1)}
+                for nombre, n in sorted(conteos.items(), key=lambda item: item[1], reverse=True)
+            ]
+        
+        return {
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "tipo_test": tipo_test,
+            "total_tests": total_tests,
+            "dimensiones": dimensiones,
+            "areas": ranking(areas, "area_principal"),
+            "perfiles": ranking(perfiles, "perfil_identificado"),
+            "por_dia": por_dia
+        }
+    
+    except Exception as e:
+        print(f"❌ Error al obtener estadísticas de población: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener estadísticas")
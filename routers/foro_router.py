@@ -1,12 +1,12 @@
 # routers/foro_router.py - Router del Foro de Comentarios
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from pydantic import BaseModel
 
-from db import get_db
+import consultas
+from db import get_db, get_db_lectura
 
 router = APIRouter()
 
@@ -45,7 +45,7 @@ class TemaPopular(BaseModel):
 
 @router.get("/api/comentarios")
 async def obtener_comentarios(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db_lectura),
     orden: str = Query("newest", regex="^(newest|oldest|popular)$"),
     tema: Optional[str] = Query(None),
     limit: int = Query(10, ge=1, le=50),
@@ -53,30 +53,13 @@ async def obtener_comentarios(
 ):
     """Obtiene comentarios del foro con filtros y paginación"""
     try:
-        query = """
-            SELECT id, nombre, tema, contenido, fecha_creacion, fecha_actualizacion, likes
-            FROM comentarios_foro
-            WHERE activo = true
-        """
-        
-        params = {}
-        
-        if tema and tema != "all":
-            query += " AND tema = :tema"
+        con_tema = bool(tema and tema != "all")
+        params = {"limit": limit, "offset": offset}
+        if con_tema:
             params["tema"] = tema
         
-        if orden == "newest":
-            query += " ORDER BY fecha_creacion DESC"
-        elif orden == "oldest":
-            query += " ORDER BY fecha_creacion ASC"
-        elif orden == "popular":
-            query += " ORDER BY likes DESC, fecha_creacion DESC"
-        
-        query += " LIMIT :limit OFFSET :offset"
-        params["limit"] = limit
-        params["offset"] = offset
-        
-        result = db.execute(text(query), params).fetchall()
+        query = consultas.LISTAR_COMENTARIOS[(orden, con_tema)]
+        result = (await db.execute(query, params)).fetchall()
         
         comentarios = []
         for row in result:
@@ -90,11 +73,10 @@ async def obtener_comentarios(
                 "likes": row[6]
             })
         
-        count_query = "SELECT COUNT(*) FROM comentarios_foro WHERE activo = true"
-        if tema and tema != "all":
-            count_query += " AND tema = :tema"
-        
-        total = db.execute(text(count_query), {"tema": tema} if tema and tema != "all" else {}).scalar()
+        if con_tema:
+            total = (await db.execute(consultas.CONTAR_COMENTARIOS_TEMA, {"tema": tema})).scalar()
+        else:
+            total = (await db.execute(consultas.CONTAR_COMENTARIOS)).scalar()
         
         return {
             "comentarios": comentarios,
@@ -111,7 +93,7 @@ async def obtener_comentarios(
 @router.post("/api/comentarios", response_model=ComentarioResponse)
 async def crear_comentario(
     comentario: ComentarioCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Crea un nuevo comentario en el foro"""
     try:
@@ -127,19 +109,13 @@ async def crear_comentario(
         if len(contenido) > 500:
             raise HTTPException(status_code=400, detail="El comentario no puede superar 500 caracteres")
         
-        query = text("""
-            INSERT INTO comentarios_foro (nombre, tema, contenido, fecha_creacion, fecha_actualizacion, likes, activo)
-            VALUES (:nombre, :tema, :contenido, NOW(), NOW(), 0, true)
-            RETURNING id, nombre, tema, contenido, fecha_creacion, fecha_actualizacion, likes
-        """)
-        
-        result = db.execute(query, {
+        result = (await db.execute(consultas.CREAR_COMENTARIO, {
             "nombre": nombre,
             "tema": comentario.tema if comentario.tema and comentario.tema != "" else None,
             "contenido": contenido
-        }).fetchone()
+        })).fetchone()
         
-        db.commit()
+        await db.commit()
         
         return {
             "id": result[0],
@@ -152,10 +128,10 @@ async def crear_comentario(
         }
         
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error al crear comentario: {e}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -163,7 +139,7 @@ async def crear_comentario(
 async def actualizar_comentario(
     comentario_id: int,
     comentario: ComentarioUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Actualiza un comentario existente"""
     try:
@@ -173,28 +149,18 @@ async def actualizar_comentario(
         if len(comentario.contenido) > 500:
             raise HTTPException(status_code=400, detail="El comentario no puede superar 500 caracteres")
         
-        check_query = text("SELECT id FROM comentarios_foro WHERE id = :id AND activo = true")
-        exists = db.execute(check_query, {"id": comentario_id}).fetchone()
+        exists = (await db.execute(consultas.COMENTARIO_ACTIVO, {"id": comentario_id})).fetchone()
         
         if not exists:
             raise HTTPException(status_code=404, detail="Comentario no encontrado")
         
-        query = text("""
-            UPDATE comentarios_foro
-            SET contenido = :contenido, 
-                tema = :tema,
-                fecha_actualizacion = NOW()
-            WHERE id = :id
-            RETURNING id, nombre, tema, contenido, fecha_creacion, fecha_actualizacion, likes
-        """)
-        
-        result = db.execute(query, {
+        result = (await db.execute(consultas.ACTUALIZAR_COMENTARIO, {
             "id": comentario_id,
             "contenido": comentario.contenido.strip(),
             "tema": comentario.tema if comentario.tema and comentario.tema != "" else None
-        }).fetchone()
+        })).fetchone()
         
-        db.commit()
+        await db.commit()
         
         return {
             "id": result[0],
@@ -209,85 +175,67 @@ async def actualizar_comentario(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error al actualizar comentario: {e}")
         raise HTTPException(status_code=500, detail="Error al actualizar el comentario")
 
 @router.delete("/api/comentarios/{comentario_id}")
 async def eliminar_comentario(
     comentario_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Elimina un comentario del foro"""
     try:
-        check_query = text("SELECT id FROM comentarios_foro WHERE id = :id AND activo = true")
-        comentario = db.execute(check_query, {"id": comentario_id}).fetchone()
+        comentario = (await db.execute(consultas.COMENTARIO_ACTIVO, {"id": comentario_id})).fetchone()
         
         if not comentario:
             raise HTTPException(status_code=404, detail="Comentario no encontrado")
         
-        query = text("DELETE FROM comentarios_foro WHERE id = :id")
-        db.execute(query, {"id": comentario_id})
+        await db.execute(consultas.ELIMINAR_COMENTARIO, {"id": comentario_id})
         
-        db.commit()
+        await db.commit()
         
         return {"message": "Comentario eliminado correctamente", "id": comentario_id}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error al eliminar comentario: {e}")
         raise HTTPException(status_code=500, detail="Error al eliminar el comentario")
 
 @router.post("/api/comentarios/{comentario_id}/like")
 async def dar_like(
     comentario_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Da like a un comentario"""
     try:
-        check_query = text("SELECT id, likes FROM comentarios_foro WHERE id = :id AND activo = true")
-        result = db.execute(check_query, {"id": comentario_id}).fetchone()
+        result = (await db.execute(consultas.COMENTARIO_ACTIVO, {"id": comentario_id})).fetchone()
         
         if not result:
             raise HTTPException(status_code=404, detail="Comentario no encontrado")
         
-        query = text("""
-            UPDATE comentarios_foro
-            SET likes = likes + 1
-            WHERE id = :id
-            RETURNING likes
-        """)
-        
-        new_likes = db.execute(query, {"id": comentario_id}).scalar()
-        db.commit()
+        new_likes = (await db.execute(consultas.DAR_LIKE, {"id": comentario_id})).scalar()
+        await db.commit()
         
         return {"likes": new_likes}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error al dar like: {e}")
         raise HTTPException(status_code=500, detail="Error al dar like")
 
 @router.get("/api/temas-populares", response_model=List[TemaPopular])
 async def obtener_temas_populares(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db_lectura),
     limit: int = Query(10, ge=1, le=20)
 ):
     """Obtiene los temas más populares del foro"""
     try:
-        query = text("""
-            SELECT tema, nombre_display, contador
-            FROM temas_populares
-            WHERE contador > 0
-            ORDER BY contador DESC, ultima_actualizacion DESC
-            LIMIT :limit
-        """)
-        
-        result = db.execute(query, {"limit": limit}).fetchall()
+        result = (await db.execute(consultas.TEMAS_POPULARES, {"limit": limit})).fetchall()
         
         temas = []
         for row in result:
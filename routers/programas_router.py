@@ -1,12 +1,12 @@
 # routers/programas_router.py - Router de Programas Académicos
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from pydantic import BaseModel
 
-from db import get_db
+import consultas
+from db import get_db_lectura
 
 router = APIRouter()
 
@@ -91,39 +91,10 @@ class ProgramaDetailResponse(BaseModel):
 # ================================
 
 @router.get("/api/programas", response_model=List[ProgramaListResponse])
-async def get_programas(db: Session = Depends(get_db)):
+async def get_programas(db: AsyncSession = Depends(get_db_lectura)):
     """Obtiene lista de todos los programas académicos"""
     try:
-        query = text("""
-            SELECT DISTINCT
-                p.id,
-                p.nombre,
-                p.universidad_id,
-                u.nombre as universidad_nombre,
-                u.sigla as universidad_sigla,
-                u.website as universidad_website,
-                u.tipo_universidad,
-                u.ciudad,
-                u.departamento,
-                a.nombre as area_nombre,
-                a.color_hex as area_color,
-                a.icono as area_icono,
-                p.duracion_semestres,
-                p.creditos,
-                ARRAY_AGG(DISTINCT m.nombre) as modalidades
-            FROM programas_academicos p
-            INNER JOIN universidades u ON p.universidad_id = u.id
-            LEFT JOIN areas_conocimiento a ON p.area_id = a.id
-            LEFT JOIN programa_modalidades pm ON p.id = pm.programa_id
-            LEFT JOIN modalidades m ON pm.modalidad_id = m.id
-            WHERE p.activo = true AND u.activo = true
-            GROUP BY p.id, p.nombre, p.universidad_id, u.nombre, u.sigla, u.website,
-                     u.tipo_universidad, u.ciudad, u.departamento, a.nombre, 
-                     a.color_hex, a.icono, p.duracion_semestres, p.creditos
-            ORDER BY p.nombre
-        """)
-        
-        result = db.execute(query).fetchall()
+        result = (await db.execute(consultas.LISTAR_PROGRAMAS)).fetchall()
         
         programas = []
         for row in result:
@@ -152,46 +123,20 @@ async def get_programas(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Error al obtener programas")
 
 @router.get("/api/programas/{programa_id}", response_model=ProgramaDetailResponse)
-async def get_programa_detail(programa_id: int, db: Session = Depends(get_db)):
+async def get_programa_detail(programa_id: int, db: AsyncSession = Depends(get_db_lectura)):
     """Obtiene detalle completo de un programa académico"""
     try:
-        query = text("""
-            SELECT 
-                p.id, p.nombre, p.codigo_snies, p.universidad_id,
-                u.nombre, u.sigla, u.website, u.direccion, u.telefono, u.email,
-                u.tipo_universidad, u.ciudad, u.departamento,
-                a.nombre, a.color_hex, a.icono,
-                p.duracion_semestres, p.creditos, p.titulo_otorgado,
-                p.descripcion, p.perfil_profesional, p.campo_laboral, p.costo_semestre
-            FROM programas_academicos p
-            INNER JOIN universidades u ON p.universidad_id = u.id
-            LEFT JOIN areas_conocimiento a ON p.area_id = a.id
-            WHERE p.id = :programa_id AND p.activo = true
-        """)
-        
-        result = db.execute(query, {"programa_id": programa_id}).fetchone()
+        result = (await db.execute(consultas.DETALLE_PROGRAMA, {"programa_id": programa_id})).fetchone()
         
         if not result:
             raise HTTPException(status_code=404, detail="Programa no encontrado")
         
         # Obtener modalidades
-        modalidades_query = text("""
-            SELECT m.nombre
-            FROM programa_modalidades pm
-            INNER JOIN modalidades m ON pm.modalidad_id = m.id
-            WHERE pm.programa_id = :programa_id
-        """)
-        modalidades_result = db.execute(modalidades_query, {"programa_id": programa_id}).fetchall()
+        modalidades_result = (await db.execute(consultas.MODALIDADES_PROGRAMA, {"programa_id": programa_id})).fetchall()
         modalidades = [row[0] for row in modalidades_result]
         
         # Obtener campus
-        campus_query = text("""
-            SELECT DISTINCT c.id, c.nombre, c.direccion, c.ciudad, c.telefono, c.es_principal
-            FROM programa_campus pc
-            INNER JOIN campus c ON pc.campus_id = c.id
-            WHERE pc.programa_id = :programa_id AND c.activo = true
-        """)
-        campus_result = db.execute(campus_query, {"programa_id": programa_id}).fetchall()
+        campus_result = (await db.execute(consultas.CAMPUS_PROGRAMA, {"programa_id": programa_id})).fetchall()
         campus = [
             {
                 "id": row[0],
@@ -241,17 +186,10 @@ async def get_programa_detail(programa_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Error al obtener detalle del programa")
 
 @router.get("/api/universidades", response_model=List[UniversidadResponse])
-async def get_universidades(db: Session = Depends(get_db)):
+async def get_universidades(db: AsyncSession = Depends(get_db_lectura)):
     """Obtiene lista de universidades"""
     try:
-        query = text("""
-            SELECT id, nombre, sigla, tipo_universidad
-            FROM universidades
-            WHERE activo = true
-            ORDER BY nombre
-        """)
-        
-        result = db.execute(query).fetchall()
+        result = (await db.execute(consultas.LISTAR_UNIVERSIDADES)).fetchall()
         
         universidades = [
             {
@@ -270,17 +208,10 @@ async def get_universidades(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Error al obtener universidades")
 
 @router.get("/api/areas", response_model=List[AreaResponse])
-async def get_areas(db: Session = Depends(get_db)):
+async def get_areas(db: AsyncSession = Depends(get_db_lectura)):
     """Obtiene lista de áreas de conocimiento"""
     try:
-        query = text("""
-            SELECT id, nombre, descripcion, color_hex, icono
-            FROM areas_conocimiento
-            WHERE activo = true
-            ORDER BY nombre
-        """)
-        
-        result = db.execute(query).fetchall()
+        result = (await db.execute(consultas.LISTAR_AREAS)).fetchall()
         
         areas = [
             {
@@ -300,17 +231,10 @@ async def get_areas(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Error al obtener áreas")
 
 @router.get("/api/modalidades", response_model=List[ModalidadResponse])
-async def get_modalidades(db: Session = Depends(get_db)):
+async def get_modalidades(db: AsyncSession = Depends(get_db_lectura)):
     """Obtiene lista de modalidades de estudio"""
     try:
-        query = text("""
-            SELECT id, nombre, descripcion
-            FROM modalidades
-            WHERE activo = true
-            ORDER BY nombre
-        """)
-        
-        result = db.execute(query).fetchall()
+        result = (await db.execute(consultas.LISTAR_MODALIDADES)).fetchall()
         
         modalidades = [
             {
@@ -334,7 +258,7 @@ async def get_modalidades(db: Session = Depends(get_db)):
 
 @router.get("/api/filtrar-carreras")
 async def filtrar_carreras(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db_lectura),
     area: Optional[str] = None,
     modalidad: Optional[str] = None,
     duracion: Optional[str] = None,
@@ -342,32 +266,14 @@ async def filtrar_carreras(
 ):
     """Filtra carreras según criterios"""
     try:
-        base_query = "SELECT nombre FROM profesiones WHERE 1=1"
-        parametros = {}
-        filtros = []
-
-        if area:
-            filtros.append("area = :area_val")
-            parametros["area_val"] = area.strip()
-
-        if modalidad:
-            filtros.append("modalidad = :modalidad_val")
-            parametros["modalidad_val"] = modalidad.strip()
-
-        if duracion:
-            filtros.append("duracion LIKE :duracion_val")
-            parametros["duracion_val"] = f"%{duracion.strip()}%"
-
-        if especializacion:
-            filtros.append("especializacion = :esp_val")
-            parametros["esp_val"] = especializacion.strip()
-
-        if filtros:
-            query_completa = f"{base_query} AND " + " AND ".join(filtros)
-        else:
-            query_completa = base_query
+        parametros = {
+            "area_val": area.strip() if area else None,
+            "modalidad_val": modalidad.strip() if modalidad else None,
+            "duracion_val": f"%{duracion.strip()}%" if duracion else None,
+            "esp_val": especializacion.strip() if especializacion else None
+        }
 
-        result = db.execute(text(query_completa), parametros).fetchall()
+        result = (await db.execute(consultas.FILTRAR_CARRERAS, parametros)).fetchall()
         nombres = [row[0] for row in result]
 
         return {"nombres": nombres}
@@ -1,27 +1,60 @@
 # routers/tests_router.py - Router de Tests Vocacionales
 
-from fastapi import APIRouter, Request, Depends, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Request, Depends, Form, HTTPException, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, Response
+from starlette.requests import ClientDisconnect
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import text
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, List, Optional
+from pydantic import BaseModel, Field
+import base64
+import codecs
+import csv
+import hashlib
+import io
 import json
+import uuid
+from collections import deque
 from datetime import datetime
 
-from db import get_db
-from auth import get_current_user_session, get_current_user_hybrid
+import consultas
+from db import get_db, get_db_lectura, AsyncSessionLocal
+from auth import ROLES_ORIENTADORES, get_current_user_session, get_current_user_hybrid
+from persistencia import (
+    guardar_test, encolar_test, eliminar_tests, obtener_resumen_usuario, buscar_test_por_token,
+    desempaquetar_respuestas
+)
+from cache import detalle_tests
 
 # ✅ CAMBIO: Importar desde tests_config en lugar de main
 from tests_config import (
     TESTS_CONFIG,
     PUNTUACION_VALORES,
-    calcular_resultados_test
+    calcular_resultados_test,
+    calcular_resultados_lote
 )
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
+# Respuestas que se califican juntas en la carga masiva
+TAMANO_LOTE_CARGA = 100
+
+# Tests por página en el historial
+TESTS_POR_PAGINA = 24
+
+# Filas que se leen del cursor del servidor (y se envían) de una vez al exportar
+TAMANO_LOTE_EXPORTACION = 200
+
+
+# ================================
+# MODELOS PYDANTIC
+# ================================
+
+class EliminarTestsRequest(BaseModel):
+    test_ids: List[int] = Field(..., min_length=1, max_length=200)
+
 
 # ================================
 # RUTAS DE TESTS
@@ -63,15 +96,23 @@ async def mostrar_test(
             "descripcion": test_data["descripcion"],
             "instrucciones": test_data["instrucciones"],
             "preguntas": test_data["preguntas"],
-            "total_preguntas": len(test_data["preguntas"])
+            "total_preguntas": len(test_data["preguntas"]),
+            "token_envio": str(uuid.uuid4())
         }
     )
 
+def _token_envio(valor) -> Optional[str]:
+    """Normaliza el token del formulario; los tokens inválidos se ignoran"""
+    try:
+        return str(uuid.UUID(valor)) if valor else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
 @router.post("/test/{tipo_test}/procesar")
 async def procesar_test(
     tipo_test: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user_hybrid)
 ):
     """Procesa las respuestas del test y las guarda"""
@@ -79,10 +120,17 @@ async def procesar_test(
         # 1. Obtener respuestas
         form_data = await request.form()
         respuestas = {k: v for k, v in form_data.items() if k.startswith("pregunta_")}
+        token_envio = _token_envio(form_data.get("token_envio"))
+        
+        # Envío repetido (doble clic, reenvío, reintento): mostrar el test ya guardado
+        if user and token_envio:
+            test_id_previo = await db.run_sync(buscar_test_por_token, user["id"], token_envio)
+            if test_id_previo:
+                return RedirectResponse(url=f"/test/{test_id_previo}/detalle", status_code=303)
         
         # 2. Validar completitud
         total_preguntas = len(TESTS_CONFIG[tipo_test]["preguntas"])
-        if len(respuestas) != total_preguntas:
+        if _validar_hoja(tipo_test, respuestas) is not None:
             return templates.TemplateResponse(
                 "test.html",
                 {
@@ -94,6 +142,7 @@ async def procesar_test(
                     "instrucciones": TESTS_CONFIG[tipo_test]["instrucciones"],
                     "preguntas": TESTS_CONFIG[tipo_test]["preguntas"],
                     "total_preguntas": total_preguntas,
+                    "token_envio": token_envio or str(uuid.uuid4()),
                     "error": "⚠️ Por favor responde todas las preguntas antes de continuar"
                 }
             )
@@ -107,76 +156,16 @@ async def procesar_test(
         
         if user:
             try:
-                # 4.1 Insertar test principal
-                query_test = text("""
-                    INSERT INTO tests_realizados 
-                    (usuario_id, tipo_test, puntuacion_total, completado, fecha_realizacion)
-                    VALUES (:user_id, :tipo, :puntuacion, true, CURRENT_TIMESTAMP)
-                    RETURNING id
-                """)
-                
-                result = db.execute(query_test, {
-                    "user_id": user["id"],
-                    "tipo": tipo_test,
-                    "puntuacion": resultados["puntuacion_total"]
-                })
-                
-                test_id = result.fetchone()[0]
-                
-                # 4.2 Guardar respuestas individuales
-                for pregunta, respuesta in respuestas.items():
-                    pregunta_num = int(pregunta.split("_")[1])
-                    
-                    query_respuesta = text("""
-                        INSERT INTO respuestas_test 
-                        (test_id, pregunta_id, respuesta, puntos)
-                        VALUES (:test_id, :pregunta_id, :respuesta, :puntos)
-                    """)
-                    
-                    db.execute(query_respuesta, {
-                        "test_id": test_id,
-                        "pregunta_id": pregunta_num,
-                        "respuesta": respuesta,
-                        "puntos": PUNTUACION_VALORES.get(respuesta, 3)
-                    })
-                
-                # 4.3 Guardar resultados detallados
-                datos_adicionales = {
-                    "perfil_identificado": resultados.get("perfil_identificado", ""),
-                    "score_ajuste": float(resultados.get("score_ajuste", 0)),
-                    "porcentaje_global": float(resultados.get("porcentaje_global", 0)),
-                    "puntajes_dimensiones": resultados.get("puntajes_dimensiones", {})
-                }
-                
-                query_resultado = text("""
-                    INSERT INTO resultados_test 
-                    (test_id, area_principal, porcentaje_afinidad, 
-                     carreras_recomendadas, fortalezas, areas_desarrollo, 
-                     descripcion_perfil, datos_adicionales, campo_laboral)
-                    VALUES (:test_id, :area, :porcentaje, 
-                            CAST(:carreras AS jsonb), 
-                            :fortalezas, :desarrollo, :descripcion, 
-                            CAST(:datos_adicionales AS jsonb), 
-                            :campo_laboral)
-                """)
-                
-                db.execute(query_resultado, {
-                    "test_id": test_id,
-                    "area": resultados["area_principal"],
-                    "porcentaje": float(resultados["score_ajuste"]),
-                    "carreras": json.dumps(resultados["carreras_recomendadas"]),
-                    "fortalezas": resultados["fortalezas"],
-                    "desarrollo": resultados["areas_desarrollo"],
-                    "descripcion": resultados["mensaje"],
-                    "datos_adicionales": json.dumps(datos_adicionales),
-                    "campo_laboral": resultados.get("campo_laboral", [])
-                })
-                
-                db.commit()
-                test_guardado = True
+                # Guardado diferido: se encola y se responde sin esperar a la base de datos
+                if await encolar_test(user["id"], tipo_test, respuestas, resultados, token_envio):
+                    test_guardado = True
+                else:
+                    test_id = await db.run_sync(guardar_test, user["id"], tipo_test, respuestas, resultados, token_envio)
+                    await db.commit()
+                    test_guardado = True
                 
             except Exception as e:
-                db.rollback()
+                await db.rollback()
                 print(f"❌ ERROR al guardar test: {str(e)}")
                 import traceback
                 traceback.print_exc()
@@ -211,54 +200,289 @@ async def procesar_test(
         )
 
 
+# ================================
+# CARGA MASIVA DE HOJAS DE RESPUESTAS
+# ================================
+
+class StreamingDuranteCarga(StreamingResponse):
+    """
+    StreamingResponse que responde mientras todavía se lee el cuerpo de la petición.
+    La respuesta normal escucha desconexiones en paralelo y se consumiría el cuerpo;
+    aquí la desconexión la detecta request.stream() (ClientDisconnect).
+    """
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        
+        if self.background is not None:
+            await self.background()
+
+async def _leer_lineas(request: Request) -> AsyncIterator[str]:
+    """Lee el cuerpo de la petición línea por línea a medida que llega (con el salto de línea)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pendiente = ""
+    
+    async for chunk in request.stream():
+        pendiente += decoder.decode(chunk)
+        *lineas, pendiente = pendiente.split("\n")
+        for linea in lineas:
+            yield linea + "\n"
+    
+    pendiente += decoder.decode(b"", final=True)
+    if pendiente:
+        yield pendiente
+
+class _LineasDisponibles:
+    """Iterador de las líneas ya recibidas, para alimentar un único csv.reader"""
+    
+    def __init__(self):
+        self.lineas = deque()
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> str:
+        if not self.lineas:
+            raise StopIteration
+        return self.lineas.popleft()
+
+async def _filas_csv(lineas: AsyncIterator[str]) -> AsyncIterator[list]:
+    """
+    Filas del CSV a medida que llegan. Los campos entre comillas pueden tener saltos
+    de línea: con un número impar de comillas el registro sigue en la línea siguiente,
+    y el lector solo avanza cuando tiene el registro completo.
+    """
+    disponibles = _LineasDisponibles()
+    lector = csv.reader(disponibles)
+    registro_abierto = False
+    
+    async for linea in lineas:
+        disponibles.lineas.append(linea)
+        if linea.count('"') % 2:
+            registro_abierto = not registro_abierto
+        if not registro_abierto:
+            for celdas in lector:
+                yield celdas
+    
+    # Comillas sin cerrar al final del cuerpo: el lector entrega lo que haya
+    for celdas in lector:
+        yield celdas
+
+async def _hojas_csv(lineas: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """
+    CSV con encabezado: columna opcional 'id' y una columna 'pregunta_N' por pregunta.
+    Retorna tuplas (id, respuestas)
+    """
+    encabezado = None
+    fila_num = 0
+    
+    async for celdas in _filas_csv(lineas):
+        if not celdas:
+            continue
+        
+        if encabezado is None:
+            encabezado = [c.strip() for c in celdas]
+            continue
+        
+        fila_num += 1
+        fila = dict(zip(encabezado, celdas))
+        identificador = fila.get("id") or fila_num
+        respuestas = {k: v.strip().upper() for k, v in fila.items() if k.startswith("pregunta_") and v.strip()}
+        yield identificador, respuestas
+
+async def _hojas_ndjson(lineas: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """
+    NDJSON: un objeto por línea, {"id": ..., "respuestas": {"pregunta_1": "A", ...}}
+    o con las claves pregunta_N en el mismo objeto.
+    Retorna tuplas (id, respuestas); las líneas inválidas retornan respuestas None
+    """
+    fila_num = 0
+    
+    async for linea in lineas:
+        if not linea.strip():
+            continue
+        
+        fila_num += 1
+        try:
+            registro = json.loads(linea)
+        except ValueError:
+            yield fila_num, None
+            continue
+        
+        if not isinstance(registro, dict):
+            yield fila_num, None
+            continue
+        
+        identificador = registro.get("id", fila_num)
+        origen = registro.get("respuestas", registro)
+        if not isinstance(origen, dict):
+            yield identificador, None
+            continue
+        
+        respuestas = {
+            k: str(v).strip().upper()
+            for k, v in origen.items()
+            if k.startswith("pregunta_") and v is not None and str(v).strip()
+        }
+        yield identificador, respuestas
+
+def _validar_hoja(tipo_test: str, respuestas: Optional[dict]) -> Optional[str]:
+    """Retorna el mensaje de error de una hoja, o None si es válida"""
+    if respuestas is None:
+        return "Línea con formato inválido"
+    
+    ids_validos = {f"pregunta_{p['id']}" for p in TESTS_CONFIG[tipo_test]["preguntas"]}
+    
+    if set(respuestas) != ids_validos:
+        return f"Se esperaban {len(ids_validos)} respuestas y se recibieron {len(respuestas)}"
+    
+    invalidas = [k for k, v in respuestas.items() if v not in PUNTUACION_VALORES]
+    if invalidas:
+        return f"Respuestas inválidas en: {', '.join(sorted(invalidas))}"
+    
+    return None
+
+def _resumen_resultado(identificador, resultados: dict) -> str:
+    """Línea NDJSON con el resumen de un estudiante"""
+    return json.dumps({
+        "id": identificador,
+        "perfil": resultados["perfil_identificado"],
+        "area_principal": resultados["area_principal"],
+        "score_ajuste": resultados["score_ajuste"],
+        "nivel": resultados["nivel"],
+        "carreras": resultados["carreras_recomendadas"][:3]
+    }, ensure_ascii=False) + "\n"
+
+@router.post("/test/{tipo_test}/procesar-lote")
+async def procesar_test_lote(
+    tipo_test: str,
+    request: Request,
+    user: dict = Depends(get_current_user_hybrid)
+):
+    """
+    Califica hojas de respuestas de muchos estudiantes (CSV o NDJSON en el cuerpo)
+    y retorna un resultado por estudiante en NDJSON, a medida que se procesa la carga.
+    No guarda nada en la base de datos. Solo para orientadores (profesor o institución).
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    if user.get("rol") not in ROLES_ORIENTADORES:
+        raise HTTPException(status_code=403, detail="Solo disponible para orientadores")
+    
+    if tipo_test not in TESTS_CONFIG:
+        raise HTTPException(status_code=404, detail="Test no encontrado")
+    
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        hojas = _hojas_csv(_leer_lineas(request))
+    elif "json" in content_type:
+        hojas = _hojas_ndjson(_leer_lineas(request))
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail="Formato no soportado. Usa Content-Type text/csv o application/x-ndjson"
+        )
+    
+    def calificar(pendientes: list) -> str:
+        """Califica las hojas válidas del lote; las líneas salen en el orden de entrada"""
+        validas = [respuestas for _, respuestas, error in pendientes if error is None]
+        resultados = iter(calcular_resultados_lote(tipo_test, validas))
+        return "".join(
+            json.dumps({"id": identificador, "error": error}, ensure_ascii=False) + "\n"
+            if error else _resumen_resultado(identificador, next(resultados))
+            for identificador, _, error in pendientes
+        )
+    
+    async def generar_resultados():
+        pendientes = []
+        
+        async for identificador, respuestas in hojas:
+            pendientes.append((identificador, respuestas, _validar_hoja(tipo_test, respuestas)))
+            if len(pendientes) >= TAMANO_LOTE_CARGA:
+                # Calificar usa CPU: fuera del event loop
+                yield await run_in_threadpool(calificar, pendientes)
+                pendientes = []
+        
+        if pendientes:
+            yield await run_in_threadpool(calificar, pendientes)
+    
+    return StreamingDuranteCarga(generar_resultados(), media_type="application/x-ndjson")
+
+
 # ================================
 # RUTAS DE HISTORIAL
 # ================================
 
+def _codificar_cursor(fecha: datetime, test_id: int) -> str:
+    """Cursor opaco con la posición (fecha_realizacion, id) del último test de la página"""
+    return base64.urlsafe_b64encode(f"{fecha.isoformat()}|{test_id}".encode()).decode()
+
+def _decodificar_cursor(cursor: str) -> tuple:
+    """Retorna (fecha, id) del cursor; lanza 400 si es inválido"""
+    try:
+        fecha, test_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(fecha), int(test_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+async def obtener_pagina_tests(db: AsyncSession, user_id: int, limit: int, cursor: Optional[str] = None) -> tuple:
+    """
+    Obtiene una página del historial, del más reciente al más antiguo,
+    paginando por (fecha_realizacion, id). Retorna (tests, siguiente_cursor).
+    """
+    params = {"user_id": user_id, "limit": limit + 1}
+    query = consultas.PAGINA_TESTS
+    
+    if cursor:
+        params["cursor_fecha"], params["cursor_id"] = _decodificar_cursor(cursor)
+        query = consultas.PAGINA_TESTS_DESDE_CURSOR
+    
+    tests = (await db.execute(query, params)).fetchall()
+    
+    tests_data = []
+    for test in tests[:limit]:
+        tests_data.append({
+            "id": test[0],
+            "tipo": test[1],
+            "fecha": test[2],
+            "puntuacion": test[3],
+            "afinidad": test[4],
+            "area": test[5]
+        })
+    
+    siguiente_cursor = None
+    if len(tests) > limit:
+        ultimo = tests_data[-1]
+        siguiente_cursor = _codificar_cursor(ultimo["fecha"], ultimo["id"])
+    
+    return tests_data, siguiente_cursor
+
 @router.get("/mis-tests", response_class=HTMLResponse, name="resultados")
 async def mis_tests(
     request: Request,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db_lectura),
     user: dict = Depends(get_current_user_hybrid)
 ):
-    """Muestra el historial de tests del usuario"""
+    """Muestra el historial de tests del usuario (paginado)"""
     if not user:
         return RedirectResponse(url="/login", status_code=303)
     
     try:
-        query = text("""
-            SELECT 
-                t.id,
-                t.tipo_test,
-                t.fecha_realizacion,
-                t.puntuacion_total,
-                r.porcentaje_afinidad,
-                r.area_principal
-            FROM tests_realizados t
-            LEFT JOIN resultados_test r ON t.id = r.test_id
-            WHERE t.usuario_id = :user_id
-            ORDER BY t.fecha_realizacion DESC
-        """)
-        
-        tests = db.execute(query, {"user_id": user["id"]}).fetchall()
-        
-        tests_data = []
-        for test in tests:
-            tests_data.append({
-                "id": test[0],
-                "tipo": test[1],
-                "fecha": test[2],
-                "puntuacion": test[3],
-                "afinidad": test[4],
-                "area": test[5]
-            })
+        tests_data, siguiente_cursor = await obtener_pagina_tests(db, user["id"], TESTS_POR_PAGINA, cursor)
         
         return templates.TemplateResponse(
             "mis_test.html",
             {
                 "request": request,
                 "user": user,
-                "tests": tests_data
+                "tests": tests_data,
+                "siguiente_cursor": siguiente_cursor,
+                "es_primera_pagina": cursor is None
             }
         )
         
@@ -274,40 +498,52 @@ async def mis_tests(
             }
         )
 
+def _respuesta_detalle(request: Request, html: bytes, etag: str) -> Response:
+    """Responde 304 si el navegador ya tiene esta versión del detalle"""
+    # private: la página es de un usuario; no-cache: revalidar siempre (puede eliminarse)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    etags_cliente = [valor.strip().removeprefix("W/") for valor in if_none_match.split(",")]
+    if etag in etags_cliente or "*" in etags_cliente:
+        return Response(status_code=304, headers=headers)
+    
+    return HTMLResponse(html, headers=headers)
+
 @router.get("/test/{test_id}/detalle", response_class=HTMLResponse)
 async def detalle_test(
     test_id: int,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db_lectura),
     user: dict = Depends(get_current_user_hybrid)
 ):
-    """Muestra el detalle de un test específico"""
+    """
+    Muestra el detalle de un test específico. Los resultados guardados no cambian,
+    así que el HTML se cachea por (usuario, test) y se responde con ETag/304.
+    """
     if not user:
         return RedirectResponse(url="/login", status_code=303)
     
     try:
-        query = text("""
-            SELECT 
-                t.tipo_test,
-                t.fecha_realizacion,
-                t.puntuacion_total,
-                r.area_principal,
-                r.porcentaje_afinidad,
-                r.carreras_recomendadas,
-                r.fortalezas,
-                r.areas_desarrollo,
-                r.descripcion_perfil,
-                r.datos_adicionales,
-                r.campo_laboral
-            FROM tests_realizados t
-            LEFT JOIN resultados_test r ON t.id = r.test_id
-            WHERE t.id = :test_id AND t.usuario_id = :user_id
-        """)
-        
-        result = db.execute(query, {
+        clave = (user["id"], test_id)
+        cacheado = detalle_tests.obtener(clave)
+        
+        # El HTML incluye los datos del usuario (navbar): si cambiaron, se vuelve a renderizar.
+        # Se confirma que el test sigue existiendo, porque pudo eliminarse en otra instancia.
+        if cacheado and cacheado["user"] == user:
+            existe = (await db.execute(consultas.TEST_DEL_USUARIO, {
+                "test_id": test_id,
+                "user_id": user["id"]
+            })).fetchone()
+            
+            if existe:
+                return _respuesta_detalle(request, cacheado["html"], cacheado["etag"])
+            detalle_tests.invalidar(clave)
+        
+        result = (await db.execute(consultas.DETALLE_TEST, {
             "test_id": test_id,
             "user_id": user["id"]
-        }).fetchone()
+        })).fetchone()
         
         if not result:
             raise HTTPException(status_code=404, detail="Test no encontrado")
@@ -344,7 +580,7 @@ async def detalle_test(
             "puntajes_dimensiones": datos_adicionales.get("puntajes_dimensiones", {})
         }
         
-        return templates.TemplateResponse(
+        html = templates.TemplateResponse(
             "resultado_test_detallado.html",
             {
                 "request": request,
@@ -357,7 +593,12 @@ async def detalle_test(
                 "es_historico": True,
                 "test_id": test_id
             }
-        )
+        ).body
+        etag = f'"{hashlib.sha1(html).hexdigest()}"'
+        
+        detalle_tests.guardar(clave, {"user": dict(user), "html": html, "etag": etag})
+        
+        return _respuesta_detalle(request, html, etag)
         
     except HTTPException:
         raise
@@ -371,7 +612,7 @@ async def detalle_test(
 async def eliminar_test(
     test_id: int,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user_hybrid)
 ):
     """Elimina un test y todos sus datos relacionados"""
@@ -379,40 +620,16 @@ async def eliminar_test(
         raise HTTPException(status_code=401, detail="No autenticado")
     
     try:
-        # Verificar que el test pertenece al usuario
-        verify_query = text("""
-            SELECT id FROM tests_realizados 
-            WHERE id = :test_id AND usuario_id = :user_id
-        """)
+        # Verifica el dueño y elimina respuestas, resultados y test en un solo statement
+        eliminados = await db.run_sync(eliminar_tests, user["id"], [test_id])
         
-        test_exists = db.execute(verify_query, {
-            "test_id": test_id,
-            "user_id": user["id"]
-        }).fetchone()
-        
-        if not test_exists:
+        if not eliminados:
             raise HTTPException(
                 status_code=404, 
                 detail="Test no encontrado o no tienes permiso para eliminarlo"
             )
         
-        # Eliminar en orden (por las foreign keys)
-        delete_respuestas = text("DELETE FROM respuestas_test WHERE test_id = :test_id")
-        db.execute(delete_respuestas, {"test_id": test_id})
-        
-        delete_resultados = text("DELETE FROM resultados_test WHERE test_id = :test_id")
-        db.execute(delete_resultados, {"test_id": test_id})
-        
-        delete_test = text("""
-            DELETE FROM tests_realizados 
-            WHERE id = :test_id AND usuario_id = :user_id
-        """)
-        db.execute(delete_test, {
-            "test_id": test_id,
-            "user_id": user["id"]
-        })
-        
-        db.commit()
+        await db.commit()
         
         print(f"✅ Test {test_id} eliminado correctamente")
         
@@ -423,24 +640,86 @@ async def eliminar_test(
         }
         
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error al eliminar test: {e}")
         raise HTTPException(
             status_code=500, 
             detail=f"Error al eliminar el test: {str(e)}"
         )
 
+@router.post("/test/eliminar-lote")
+async def eliminar_tests_lote(
+    datos: EliminarTestsRequest,
+    db: AsyncSession = Depends(get_db),
+    user: dict = Depends(get_current_user_hybrid)
+):
+    """Elimina varios tests del usuario y todos sus datos relacionados"""
+    if not user:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    try:
+        eliminados = await db.run_sync(eliminar_tests, user["id"], datos.test_ids)
+        await db.commit()
+        
+        no_encontrados = sorted(set(datos.test_ids) - set(eliminados))
+        print(f"✅ {len(eliminados)} tests eliminados correctamente")
+        
+        return {
+            "success": True,
+            "message": f"{len(eliminados)} test(s) eliminado(s) correctamente",
+            "eliminados": sorted(eliminados),
+            "no_encontrados": no_encontrados
+        }
+        
+    except Exception as e:
+        await db.rollback()
+        print(f"❌ Error al eliminar tests: {e}")
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Error al eliminar los tests: {str(e)}"
+        )
 
 # ================================
 # API DE ANÁLISIS
 # ================================
 
+@router.get("/api/usuario/tests")
+async def get_tests_usuario(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db_lectura),
+    user: dict = Depends(get_current_user_hybrid)
+):
+    """API paginada del historial de tests (usar next_cursor para la siguiente página)"""
+    if not user:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    try:
+        tests_data, siguiente_cursor = await obtener_pagina_tests(db, user["id"], limit, cursor)
+        
+        for test in tests_data:
+            test["fecha"] = test["fecha"].isoformat() if test["fecha"] else None
+            test["afinidad"] = float(test["afinidad"]) if test["afinidad"] is not None else None
+        
+        return {
+            "tests": tests_data,
+            "limit": limit,
+            "next_cursor": siguiente_cursor,
+            "has_more": siguiente_cursor is not None
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error al obtener tests: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener el historial")
+
 @router.get("/api/usuario/dimensiones")
 async def get_dimensiones_usuario(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user_hybrid)
 ):
     """API para obtener las dimensiones vocacionales del usuario"""
@@ -448,35 +727,146 @@ async def get_dimensiones_usuario(
         raise HTTPException(status_code=401, detail="No autenticado")
     
     try:
-        query = text("""
-            SELECT 
-                r.datos_adicionales->'puntajes_dimensiones' as dimensiones,
-                t.fecha_realizacion
-            FROM tests_realizados t
-            LEFT JOIN resultados_test r ON t.id = r.test_id
-            WHERE t.usuario_id = :user_id 
-            AND t.tipo_test = 'general'
-            AND r.datos_adicionales IS NOT NULL
-            ORDER BY t.fecha_realizacion DESC
-            LIMIT 1
-        """)
-        
-        result = db.execute(query, {"user_id": user["id"]}).fetchone()
-        
-        if not result or not result[0]:
+        # Últimas dimensiones del test general, guardadas en el resumen del usuario
+        resumen = await db.run_sync(obtener_resumen_usuario, user["id"])
+        
+        if not resumen[4]:
             return {
                 "success": False,
                 "message": "No se encontraron tests realizados"
             }
         
-        dimensiones = result[0] if isinstance(result[0], dict) else json.loads(result[0])
+        dimensiones = resumen[4] if isinstance(resumen[4], dict) else json.loads(resumen[4])
         
         return {
             "success": True,
             "dimensiones": dimensiones,
-            "fecha_ultimo_test": result[1].isoformat() if result[1] else None
+            "fecha_ultimo_test": resumen[5].isoformat() if resumen[5] else None
         }
         
     except Exception as e:
         print(f"❌ Error al obtener dimensiones: {e}")
-        raise HTTPException(status_code=500, detail="Error al obtener dimensiones")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Error al obtener dimensiones")
+
+
+# ================================
+# EXPORTACIÓN DEL HISTORIAL
+# ================================
+
+# Columnas de respuestas en el CSV: la unión de las preguntas de todos los tests
+_PREGUNTAS_EXPORTACION = sorted({p["id"] for config in TESTS_CONFIG.values() for p in config["preguntas"]})
+
+_COLUMNAS_CSV = [
+    "test_id", "tipo_test", "fecha_realizacion", "puntuacion_total",
+    "area_principal", "porcentaje_afinidad", "perfil_identificado", "score_ajuste",
+    "porcentaje_global", "descripcion_perfil", "carreras_recomendadas", "fortalezas",
+    "areas_desarrollo", "campo_laboral", "puntajes_dimensiones"
+] + [f"pregunta_{p}" for p in _PREGUNTAS_EXPORTACION]
+
+def _fila_exportacion(fila) -> dict:
+    """Arma el registro exportado de un test (resultados y respuestas)"""
+    tipo_test = fila[1]
+    datos_adicionales = fila[10] or {}
+    
+    # Respuestas en formato compacto o por filas (agregadas en la misma consulta)
+    if fila[11] is not None:
+        respuestas = desempaquetar_respuestas(tipo_test, fila[11]) if tipo_test in TESTS_CONFIG else {}
+    else:
+        respuestas = {f"pregunta_{p}": r for p, r in zip(fila[12] or [], fila[13] or [])}
+    
+    return {
+        "test_id": fila[0],
+        "tipo_test": tipo_test,
+        "fecha_realizacion": fila[2].isoformat() if fila[2] else None,
+        "puntuacion_total": fila[3],
+        "area_principal": fila[4],
+        "porcentaje_afinidad": float(fila[5]) if fila[5] is not None else None,
+        "perfil_identificado": datos_adicionales.get("perfil_identificado"),
+        "score_ajuste": datos_adicionales.get("score_ajuste"),
+        "porcentaje_global": datos_adicionales.get("porcentaje_global"),
+        "descripcion_perfil": fila[9],
+        "carreras_recomendadas": fila[6] or [],
+        "fortalezas": fila[7] or [],
+        "areas_desarrollo": fila[8] or [],
+        "campo_laboral": fila[14] or [],
+        "puntajes_dimensiones": datos_adicionales.get("puntajes_dimensiones", {}),
+        "respuestas": respuestas
+    }
+
+async def _lineas_csv(registros: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """Convierte los registros en bloques de texto CSV (encabezado incluido)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(_COLUMNAS_CSV)
+    
+    i = 0
+    async for registro in registros:
+        i += 1
+        respuestas = registro.pop("respuestas")
+        writer.writerow(
+            [
+                json.dumps(valor, ensure_ascii=False) if isinstance(valor, (list, dict)) else valor
+                for valor in registro.values()
+            ] + [respuestas.get(f"pregunta_{p}", "") for p in _PREGUNTAS_EXPORTACION]
+        )
+        
+        if i % TAMANO_LOTE_EXPORTACION == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
+async def _lineas_ndjson(registros: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """Convierte los registros en bloques de líneas NDJSON"""
+    bloque = []
+    async for registro in registros:
+        bloque.append(json.dumps(registro, ensure_ascii=False) + "\n")
+        if len(bloque) >= TAMANO_LOTE_EXPORTACION:
+            yield "".join(bloque)
+            bloque.clear()
+    
+    if bloque:
+        yield "".join(bloque)
+
+async def iterar_tests_exportacion(user_id: int) -> AsyncIterator[dict]:
+    """
+    Recorre todos los tests del usuario con un cursor del servidor: la memoria usada
+    no depende del tamaño del historial. Abre su propia sesión porque se consume
+    mientras se envía la respuesta, después de que terminan las dependencias.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            filas = await db.stream(
+                consultas.EXPORTACION_TESTS,
+                {"user_id": user_id},
+                execution_options={"yield_per": TAMANO_LOTE_EXPORTACION}
+            )
+            async for fila in filas:
+                yield _fila_exportacion(fila)
+        except Exception as e:
+            # La respuesta ya empezó a enviarse: solo queda cortarla
+            print(f"❌ Error al exportar tests del usuario {user_id}: {e}")
+            raise
+
+@router.get("/api/usuario/tests/export")
+async def exportar_tests_usuario(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    user: dict = Depends(get_current_user_hybrid)
+):
+    """Descarga el historial completo (tests, respuestas y resultados) en CSV o NDJSON"""
+    if not user:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    registros = iterar_tests_exportacion(user["id"])
+    
+    if format == "csv":
+        contenido, media_type = _lineas_csv(registros), "text/csv; charset=utf-8"
+    else:
+        contenido, media_type = _lineas_ndjson(registros), "application/x-ndjson"
+    
+    return StreamingResponse(
+        contenido,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="mis_tests.{format}"'}
+    )
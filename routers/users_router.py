@@ -3,13 +3,17 @@
 from fastapi import APIRouter, Request, Depends, Form, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
+import consultas
 from db import get_db
+from persistencia import obtener_resumen_usuario, eliminar_usuario
+from cache import invalidar_usuario
 from auth import (
     get_current_user_session,
     get_current_user_hybrid,
+    get_current_user_lectura,
     get_password_hash,
     verify_password,
     get_user_by_email
@@ -29,7 +33,7 @@ IS_PRODUCTION = os.getenv("ENVIRONMENT") == "production" or os.getenv("VERCEL")
 @router.get("/perfil", response_class=HTMLResponse, name="perfil")
 async def perfil(
     request: Request,
-    user: dict = Depends(get_current_user_hybrid)
+    user: dict = Depends(get_current_user_lectura)
 ):
     """Página de perfil del usuario"""
     if not user:
@@ -55,7 +59,7 @@ async def actualizar_info_post(
     contraseña_actual: str = Form(None),
     contraseña_nueva: str = Form(None),
     contraseña_confirmar: str = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user_hybrid)
 ):
     """Actualiza la información del usuario"""
@@ -64,8 +68,7 @@ async def actualizar_info_post(
     
     try:
         # Verificar si el email ya está en uso
-        check_email_query = text("SELECT id FROM usuarios WHERE gmail = :email AND id != :user_id")
-        existing_user = db.execute(check_email_query, {"email": email, "user_id": user["id"]}).fetchone()
+        existing_user = (await db.execute(consultas.EMAIL_DE_OTRO_USUARIO, {"email": email, "user_id": user["id"]})).fetchone()
         
         if existing_user:
             return templates.TemplateResponse(
@@ -82,7 +85,7 @@ async def actualizar_info_post(
                 )
             
             # Verificar contraseña actual
-            user_db = get_user_by_email(db, user["gmail"])
+            user_db = await get_user_by_email(db, user["gmail"])
             
             if not user_db:
                 return templates.TemplateResponse(
@@ -92,7 +95,7 @@ async def actualizar_info_post(
             
             # Verificar contraseña actual (compatibilidad con sistema antiguo)
             if user_db.hashed_password.startswith("$2b$"):
-                if not verify_password(contraseña_actual, user_db.hashed_password):
+                if not await run_in_threadpool(verify_password, contraseña_actual, user_db.hashed_password):
                     return templates.TemplateResponse(
                         "actualizar-info.html",
                         {"request": request, "user": user, "error": "La contraseña actual es incorrecta"}
@@ -118,13 +121,8 @@ async def actualizar_info_post(
                 )
             
             # Actualizar con nueva contraseña
-            hashed_pwd = get_password_hash(contraseña_nueva)
-            update_query = text("""
-                UPDATE usuarios 
-                SET nombre = :nombre, gmail = :email, rol = :rol, contraseña = :nueva_pwd
-                WHERE id = :user_id
-            """)
-            db.execute(update_query, {
+            hashed_pwd = await run_in_threadpool(get_password_hash, contraseña_nueva)
+            await db.execute(consultas.ACTUALIZAR_USUARIO_Y_CONTRASENA, {
                 "nombre": nombre,
                 "email": email,
                 "rol": rol,
@@ -133,19 +131,16 @@ async def actualizar_info_post(
             })
         else:
             # Actualizar sin cambiar contraseña
-            update_query = text("""
-                UPDATE usuarios 
-                SET nombre = :nombre, gmail = :email, rol = :rol
-                WHERE id = :user_id
-            """)
-            db.execute(update_query, {
+            await db.execute(consultas.ACTUALIZAR_USUARIO, {
                 "nombre": nombre,
                 "email": email,
                 "rol": rol,
                 "user_id": user["id"]
             })
         
-        db.commit()
+        await db.commit()
+        
+        invalidar_usuario(user["id"])
         
         # Actualizar sesión
         request.session["user_nombre"] = nombre
@@ -164,7 +159,7 @@ async def actualizar_info_post(
         )
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error al actualizar: {e}")
         import traceback
         traceback.print_exc()
@@ -177,7 +172,7 @@ async def actualizar_info_post(
 async def eliminar_cuenta(
     request: Request,
     contraseña: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user_hybrid)
 ):
     """Elimina la cuenta del usuario"""
@@ -186,7 +181,7 @@ async def eliminar_cuenta(
     
     try:
         # Verificar contraseña
-        user_db = get_user_by_email(db, user["gmail"])
+        user_db = await get_user_by_email(db, user["gmail"])
         
         if not user_db:
             return templates.TemplateResponse(
@@ -197,7 +192,7 @@ async def eliminar_cuenta(
         # Verificar contraseña (compatibilidad)
         password_valid = False
         if user_db.hashed_password.startswith("$2b$"):
-            password_valid = verify_password(contraseña, user_db.hashed_password)
+            password_valid = await run_in_threadpool(verify_password, contraseña, user_db.hashed_password)
         else:
             password_valid = (user_db.hashed_password == contraseña)
         
@@ -207,10 +202,11 @@ async def eliminar_cuenta(
                 {"request": request, "user": user, "error": "Contraseña incorrecta"}
             )
         
-        # Eliminar usuario y todos sus datos (cascade)
-        delete_query = text("DELETE FROM usuarios WHERE id = :user_id")
-        db.execute(delete_query, {"user_id": user["id"]})
-        db.commit()
+        # Eliminar sus tests (restando las estadísticas) y el usuario, en una transacción
+        await db.run_sync(eliminar_usuario, user["id"])
+        await db.commit()
+        
+        invalidar_usuario(user["id"])
         
         # Limpiar sesión
         request.session.clear()
@@ -218,7 +214,7 @@ async def eliminar_cuenta(
         return RedirectResponse(url="/", status_code=303)
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error al eliminar cuenta: {e}")
         return templates.TemplateResponse(
             "perfil.html",
@@ -232,7 +228,7 @@ async def eliminar_cuenta(
 
 @router.get("/api/usuario/info")
 async def get_user_info(
-    user: dict = Depends(get_current_user_hybrid)
+    user: dict = Depends(get_current_user_lectura)
 ):
     """Obtiene información del usuario actual"""
     if not user:
@@ -247,7 +243,7 @@ async def get_user_info(
 
 @router.get("/api/usuario/estadisticas")
 async def get_user_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user_hybrid)
 ):
     """Obtiene estadísticas del usuario"""
@@ -255,42 +251,16 @@ async def get_user_stats(
         raise HTTPException(status_code=401, detail="No autenticado")
     
     try:
-        # Contar tests realizados
-        query_tests = text("""
-            SELECT COUNT(*) FROM tests_realizados 
-            WHERE usuario_id = :user_id AND completado = true
-        """)
-        total_tests = db.execute(query_tests, {"user_id": user["id"]}).scalar()
-        
-        # Obtener test más reciente
-        query_recent = text("""
-            SELECT tipo_test, fecha_realizacion
-            FROM tests_realizados
-            WHERE usuario_id = :user_id AND completado = true
-            ORDER BY fecha_realizacion DESC
-            LIMIT 1
-        """)
-        recent_test = db.execute(query_recent, {"user_id": user["id"]}).fetchone()
-        
-        # Obtener área más fuerte
-        query_area = text("""
-            SELECT r.area_principal, COUNT(*) as veces
-            FROM tests_realizados t
-            INNER JOIN resultados_test r ON t.id = r.test_id
-            WHERE t.usuario_id = :user_id
-            GROUP BY r.area_principal
-            ORDER BY veces DESC
-            LIMIT 1
-        """)
-        top_area = db.execute(query_area, {"user_id": user["id"]}).fetchone()
+        # Resumen mantenido al guardar/eliminar tests: una búsqueda por clave primaria
+        resumen = await db.run_sync(obtener_resumen_usuario, user["id"])
         
         return {
-            "total_tests": total_tests or 0,
+            "total_tests": resumen[0] or 0,
             "ultimo_test": {
-                "tipo": recent_test[0] if recent_test else None,
-                "fecha": recent_test[1].isoformat() if recent_test else None
-            } if recent_test else None,
-            "area_mas_fuerte": top_area[0] if top_area else None
+                "tipo": resumen[1],
+                "fecha": resumen[2].isoformat() if resumen[2] else None
+            } if resumen[2] else None,
+            "area_mas_fuerte": resumen[3]
         }
         
     except Exception as e:
@@ -272,22 +272,27 @@ async function eliminarTestsSeleccionados() {
     let eliminados = 0;
     let errores = 0;
     
-    // Eliminar cada test
-    for (const id of ids) {
-        try {
-            const response = await fetch(`/test/${id}/eliminar`, {
-                method: 'DELETE'
-            });
-            
-            if (response.ok) {
-                eliminados++;
-            } else {
-                errores++;
-            }
-        } catch (error) {
-            console.error(`Error al eliminar test ${id}:`, error);
-            errores++;
+    // Eliminar todos los tests en una sola petición
+    try {
+        const response = await fetch('/test/eliminar-lote', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ test_ids: ids })
+        });
+        
+        const data = await response.json();
+        
+        if (response.ok && data.success) {
+            eliminados = data.eliminados.length;
+            errores = data.no_encontrados.length;
+        } else {
+            throw new Error(data.detail || 'Error al eliminar los tests');
         }
+    } catch (error) {
+        console.error('Error al eliminar tests:', error);
+        errores = ids.length;
     }
     
     // Mostrar resultado
@@ -1,6 +1,9 @@
 # tests_config.py - Configuración de Tests Vocacionales
 
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from itertools import repeat
+from operator import add
+from typing import Dict, Iterable, List, Tuple
 import random
 import json
 
@@ -1524,6 +1527,91 @@ PERFILES_DETALLADOS = {
     }
 }
 
+# ================================
+# MATRIZ DE PESOS COMPILADA
+# ================================
+
+# Columnas de la matriz: dimensiones en orden de primera aparición en el mapeo
+DIMENSIONES_GENERAL: Tuple[str, ...] = tuple(dict.fromkeys(
+    dimension
+    for pesos in MAPEO_PREGUNTAS_GENERAL.values()
+    for dimension in pesos
+))
+
+_INDICE_DIMENSION = {dimension: i for i, dimension in enumerate(DIMENSIONES_GENERAL)}
+
+# Filas de la matriz pregunta×dimensión (solo las celdas con peso)
+MATRIZ_PESOS_GENERAL: Dict[int, Tuple[Tuple[int, float], ...]] = {
+    num_pregunta: tuple((_INDICE_DIMENSION[dimension], peso) for dimension, peso in pesos.items())
+    for num_pregunta, pesos in MAPEO_PREGUNTAS_GENERAL.items()
+}
+
+def _compilar_celdas(fila: Tuple[Tuple[int, float], ...], puntos: int) -> Tuple[Tuple[int, float, float], ...]:
+    """Precalcula (indice, puntos * peso, peso) para una fila y un valor de respuesta"""
+    return tuple((indice, puntos * peso, peso) for indice, peso in fila)
+
+# Celdas precalculadas por pregunta y respuesta
+_CELDAS_GENERAL: Dict[int, Dict[str, Tuple[Tuple[int, float, float], ...]]] = {
+    num_pregunta: {
+        respuesta: _compilar_celdas(fila, puntos)
+        for respuesta, puntos in PUNTUACION_VALORES.items()
+    }
+    for num_pregunta, fila in MATRIZ_PESOS_GENERAL.items()
+}
+
+
+@lru_cache(maxsize=512)
+def _numero_pregunta(pregunta: str) -> int:
+    """Convierte 'pregunta_12' en 12 (cacheado: las claves se repiten en cada envío)"""
+    return int(pregunta.split("_")[1])
+
+
+# ================================
+# PERFILES COMPILADOS
+# ================================
+
+# Pares de dimensiones que deberían ser consistentes: (dim1, dim2, umbral)
+PARES_RELACIONADOS: Tuple[Tuple[str, str, int], ...] = (
+    ("programacion", "tecnologia", 25),
+    ("programacion", "desarrollo", 20),
+    ("ciencias", "investigacion", 25),
+    ("biologia", "ciencias", 20),
+    ("quimica", "ciencias", 20),
+    ("fisica", "ciencias", 20),
+    ("ingenieria", "matematicas", 30),
+    ("finanzas", "negocios", 25),
+    ("marketing", "comunicacion", 25),
+    ("liderazgo", "gestion", 20),
+    ("datos", "analitico", 25),
+    ("ia", "programacion", 30),
+    ("ux", "diseno", 20),
+    ("ambiental", "sostenibilidad", 15),
+)
+
+def _compilar_perfiles() -> Tuple[tuple, ...]:
+    """
+    Convierte PERFILES_DETALLADOS en tuplas planas con los umbrales precalculados:
+    (perfil_id, claves, secundarios, total_posible), donde
+    claves = ((dimension, min, max, min * 0.7), ...) y
+    secundarios = ((dimension, min, max, min * 0.8), ...)
+    """
+    perfiles = []
+    for perfil_id, perfil in PERFILES_DETALLADOS.items():
+        claves = tuple(
+            (indicador, min_val, max_val, min_val * 0.7)
+            for indicador, (min_val, max_val) in perfil.get("indicadores_clave", {}).items()
+        )
+        secundarios = tuple(
+            (indicador, min_val, max_val, min_val * 0.8)
+            for indicador, (min_val, max_val) in perfil.get("indicadores_secundarios", {}).items()
+        )
+        total_posible = len(claves) * 100 + len(secundarios) * 55
+        perfiles.append((perfil_id, claves, secundarios, total_posible))
+    return tuple(perfiles)
+
+PERFILES_COMPILADOS = _compilar_perfiles()
+
+
 # ================================
 # FUNCIONES DE CÁLCULO
 # ================================
@@ -1531,63 +1619,118 @@ PERFILES_DETALLADOS = {
 def calcular_puntajes_dimensiones(respuestas: dict) -> Dict[str, float]:
     """
     Calcula puntajes normalizados para cada dimensión vocacional
-    basándose en el mapeo de preguntas
+    basándose en la matriz de pesos compilada.
+    Las sumas se acumulan en el orden de las respuestas para que los
+    resultados sean idénticos a los del cálculo por diccionarios.
     """
-    dimensiones = {}
-    conteos = {}
+    sumas = [None] * len(DIMENSIONES_GENERAL)
+    conteos = [0] * len(DIMENSIONES_GENERAL)
+    orden = []
     
     for pregunta, respuesta in respuestas.items():
-        num_pregunta = int(pregunta.split("_")[1])
-        puntos = PUNTUACION_VALORES.get(respuesta, 3)  # 1-5
+        num_pregunta = _numero_pregunta(pregunta)
+        celdas_pregunta = _CELDAS_GENERAL.get(num_pregunta)
         
-        if num_pregunta in MAPEO_PREGUNTAS_GENERAL:
-            pesos = MAPEO_PREGUNTAS_GENERAL[num_pregunta]
+        if celdas_pregunta is None:
+            continue
+        
+        celdas = celdas_pregunta.get(respuesta)
+        if celdas is None:
+            celdas = _compilar_celdas(MATRIZ_PESOS_GENERAL[num_pregunta], 3)  # Respuesta desconocida = neutral
+        
+        for indice, aporte, peso in celdas:
+            if sumas[indice] is None:
+                sumas[indice] = 0
+                orden.append(indice)
             
-            for dimension, peso in pesos.items():
-                if dimension not in dimensiones:
-                    dimensiones[dimension] = 0
-                    conteos[dimension] = 0
-                
-                dimensiones[dimension] += puntos * peso
-                conteos[dimension] += peso
+            sumas[indice] += aporte
+            conteos[indice] += peso
     
     # Normalizar a escala 0-100
     puntajes_normalizados = {}
-    for dimension, suma in dimensiones.items():
-        if conteos[dimension] > 0:
-            promedio = suma / conteos[dimension]  # 1-5
-            puntajes_normalizados[dimension] = round((promedio / 5) * 100, 2)
+    for indice in orden:
+        if conteos[indice] > 0:
+            promedio = sumas[indice] / conteos[indice]  # 1-5
+            puntajes_normalizados[DIMENSIONES_GENERAL[indice]] = round((promedio / 5) * 100, 2)
     
     return puntajes_normalizados
 
+def _puntajes_grupo(claves: Tuple[str, ...], hojas: List[dict]) -> List[Dict[str, float]]:
+    """
+    Puntajes de hojas con las mismas preguntas en el mismo orden, columna por columna de
+    la matriz: las celdas de cada pregunta, los pesos acumulados y el orden de las
+    dimensiones son iguales para todas las hojas. Cada columna de sumas se acumula con
+    map sobre todas las hojas a la vez, en el mismo orden que calcular_puntajes_dimensiones.
+    """
+    total = len(hojas)
+    sumas = {}
+    conteos = {}
+    
+    for pregunta in claves:
+        num_pregunta = _numero_pregunta(pregunta)
+        celdas_pregunta = _CELDAS_GENERAL.get(num_pregunta)
+        
+        if celdas_pregunta is None:
+            continue
+        
+        respuestas = [hoja[pregunta] for hoja in hojas]
+        fila = MATRIZ_PESOS_GENERAL[num_pregunta]
+        neutras = _compilar_celdas(fila, 3)  # Respuesta desconocida = neutral
+        
+        for j, (indice, peso) in enumerate(fila):
+            aporte_por_respuesta = {respuesta: celdas[j][1] for respuesta, celdas in celdas_pregunta.items()}
+            aportes = map(aporte_por_respuesta.get, respuestas, repeat(neutras[j][1], total))
+            
+            if indice in conteos:
+                conteos[indice] += peso
+                sumas[indice] = list(map(add, sumas[indice], aportes))
+            else:
+                conteos[indice] = peso
+                sumas[indice] = list(aportes)
+    
+    # Normalizar a escala 0-100. Las respuestas son discretas: cada columna tiene pocas
+    # sumas distintas, así que cada una se normaliza una sola vez
+    dimensiones = []
+    columnas = []
+    for indice, conteo in conteos.items():
+        if conteo > 0:
+            normalizados = {suma: round((suma / conteo / 5) * 100, 2) for suma in set(sumas[indice])}
+            dimensiones.append(DIMENSIONES_GENERAL[indice])
+            columnas.append(map(normalizados.__getitem__, sumas[indice]))
+    
+    if not columnas:
+        return [{} for _ in hojas]
+    return [dict(zip(dimensiones, valores)) for valores in zip(*columnas)]
+
+def calcular_puntajes_dimensiones_lote(hojas: Iterable[dict]) -> List[Dict[str, float]]:
+    """
+    Calcula los puntajes de dimensiones de muchas hojas de respuestas en una sola llamada.
+    Las hojas se agrupan por sus preguntas (en un lote casi siempre son las mismas) y
+    cada grupo se evalúa junto con _puntajes_grupo. El resultado de cada hoja es idéntico
+    al de calcular_puntajes_dimensiones.
+    """
+    hojas = list(hojas)
+    grupos = {}
+    for posicion, respuestas in enumerate(hojas):
+        grupos.setdefault(tuple(respuestas), []).append(posicion)
+    
+    puntajes = [None] * len(hojas)
+    for claves, posiciones in grupos.items():
+        for posicion, puntajes_hoja in zip(posiciones, _puntajes_grupo(claves, [hojas[p] for p in posiciones])):
+            puntajes[posicion] = puntajes_hoja
+    return puntajes
+
 def detectar_contradicciones_dimensiones(puntajes: Dict[str, float]) -> int:
     """
     Detecta contradicciones graves en las dimensiones del usuario
     Retorna el número de contradicciones encontradas
     """
     contradicciones = 0
+    obtener = puntajes.get
     
-    # Definir pares de dimensiones que deberían ser consistentes
-    pares_relacionados = [
-        ("programacion", "tecnologia", 25),
-        ("programacion", "desarrollo", 20),
-        ("ciencias", "investigacion", 25),
-        ("biologia", "ciencias", 20),
-        ("quimica", "ciencias", 20),
-        ("fisica", "ciencias", 20),
-        ("ingenieria", "matematicas", 30),
-        ("finanzas", "negocios", 25),
-        ("marketing", "comunicacion", 25),
-        ("liderazgo", "gestion", 20),
-        ("datos", "analitico", 25),
-        ("ia", "programacion", 30),
-        ("ux", "diseno", 20),
-        ("ambiental", "sostenibilidad", 15),
-    ]
-    
-    for dim1, dim2, umbral in pares_relacionados:
-        val1 = puntajes.get(dim1, 0)
-        val2 = puntajes.get(dim2, 0)
+    for dim1, dim2, umbral in PARES_RELACIONADOS:
+        val1 = obtener(dim1, 0)
+        val2 = obtener(dim2, 0)
         
         if val1 > 30 or val2 > 30:
             diferencia = abs(val1 - val2)
@@ -1598,19 +1741,20 @@ def detectar_contradicciones_dimensiones(puntajes: Dict[str, float]) -> int:
     
     return contradicciones
 
-def identificar_perfil_optimo(puntajes: Dict[str, float]) -> Tuple[str, float]:
+def calcular_scores_perfiles(puntajes: Dict[str, float], contradicciones: int = None) -> Dict[str, float]:
     """
-    Identifica el perfil con VALIDACIÓN ESTRICTA + DETECTOR DE CONTRADICCIONES
+    Evalúa todos los perfiles compilados en una sola pasada.
+    Sirve también para análisis what-if sobre puntajes modificados.
     """
-    # Detectar contradicciones graves
-    contradicciones = detectar_contradicciones_dimensiones(puntajes)
-    if contradicciones > 3:
-        return "perfil_exploratorio", 0
+    if contradicciones is None:
+        contradicciones = detectar_contradicciones_dimensiones(puntajes)
     
+    obtener = puntajes.get
+    dimensiones_fuertes = sum(1 for v in puntajes.values() if v >= 68)
     scores_perfiles = {}
     
-    for perfil_id, perfil in PERFILES_DETALLADOS.items():
-        if not perfil.get("indicadores_clave") or len(perfil["indicadores_clave"]) == 0:
+    for perfil_id, claves, secundarios, total_posible in PERFILES_COMPILADOS:
+        if not claves:
             scores_perfiles[perfil_id] = 0
             continue
         
@@ -1618,10 +1762,10 @@ def identificar_perfil_optimo(puntajes: Dict[str, float]) -> Tuple[str, float]:
         score_indicadores_clave = 0
         indicadores_cumplidos = 0
         
-        for indicador, (min_val, max_val) in perfil["indicadores_clave"].items():
-            puntaje_usuario = puntajes.get(indicador, 0)
+        for indicador, min_val, max_val, min_requerido in claves:
+            puntaje_usuario = obtener(indicador, 0)
             
-            if puntaje_usuario < min_val * 0.7:
+            if puntaje_usuario < min_requerido:
                 cumple_requisitos_minimos = False
                 break
             
@@ -1639,42 +1783,46 @@ def identificar_perfil_optimo(puntajes: Dict[str, float]) -> Tuple[str, float]:
             scores_perfiles[perfil_id] = 0
             continue
         
-        porcentaje_cumplimiento = (indicadores_cumplidos / len(perfil["indicadores_clave"])) * 100
+        porcentaje_cumplimiento = (indicadores_cumplidos / len(claves)) * 100
         if porcentaje_cumplimiento < 70:
             scores_perfiles[perfil_id] = 0
             continue
         
         # Evaluar indicadores secundarios
         score_secundarios = 0
-        for indicador, (min_val, max_val) in perfil.get("indicadores_secundarios", {}).items():
-            puntaje_usuario = puntajes.get(indicador, 0)
+        for indicador, min_val, max_val, min_parcial in secundarios:
+            puntaje_usuario = obtener(indicador, 0)
             
             if min_val <= puntaje_usuario <= max_val:
                 score_secundarios += 55
-            elif puntaje_usuario >= min_val * 0.8:
+            elif puntaje_usuario >= min_parcial:
                 score_secundarios += 35
         
         # Calcular score normalizado
-        total_posible = (
-            len(perfil["indicadores_clave"]) * 100 +
-            len(perfil.get("indicadores_secundarios", {})) * 55
-        )
+        score_final = ((score_indicadores_clave + score_secundarios) / total_posible) * 100
         
-        if total_posible > 0:
-            score_final = ((score_indicadores_clave + score_secundarios) / total_posible) * 100
-            
-            dimensiones_fuertes = sum(1 for v in puntajes.values() if v >= 68)
-            if dimensiones_fuertes < 3:
-                score_final *= 0.82
-            elif dimensiones_fuertes >= 6:
-                score_final *= 1.05
-            
-            if contradicciones > 0:
-                score_final *= (1 - (contradicciones * 0.08))
-            
-            scores_perfiles[perfil_id] = round(min(score_final, 100), 2)
-        else:
-            scores_perfiles[perfil_id] = 0
+        if dimensiones_fuertes < 3:
+            score_final *= 0.82
+        elif dimensiones_fuertes >= 6:
+            score_final *= 1.05
+        
+        if contradicciones > 0:
+            score_final *= (1 - (contradicciones * 0.08))
+        
+        scores_perfiles[perfil_id] = round(min(score_final, 100), 2)
+    
+    return scores_perfiles
+
+def identificar_perfil_optimo(puntajes: Dict[str, float]) -> Tuple[str, float]:
+    """
+    Identifica el perfil con VALIDACIÓN ESTRICTA + DETECTOR DE CONTRADICCIONES
+    """
+    # Detectar contradicciones graves
+    contradicciones = detectar_contradicciones_dimensiones(puntajes)
+    if contradicciones > 3:
+        return "perfil_exploratorio", 0
+    
+    scores_perfiles = calcular_scores_perfiles(puntajes, contradicciones)
     
     if not scores_perfiles or max(scores_perfiles.values()) < 50:
         return "perfil_exploratorio", max(scores_perfiles.values(), default=0)
@@ -1735,13 +1883,15 @@ def calcular_resultados_test(tipo_test: str, respuestas: dict) -> dict:
     """
     Función principal mejorada de cálculo de resultados
     """
+    return _resultados(respuestas, calcular_puntajes_dimensiones(respuestas))
+
+def _resultados(respuestas: dict, puntajes_dimensiones: Dict[str, float]) -> dict:
+    """Resultados de una hoja a partir de sus puntajes de dimensiones ya calculados"""
     puntuacion_total = sum(PUNTUACION_VALORES.get(v, 0) for v in respuestas.values())
     total_preguntas = len(respuestas)
     puntuacion_maxima = total_preguntas * 5
     porcentaje_global = round((puntuacion_total / puntuacion_maxima) * 100, 2)
     
-    puntajes_dimensiones = calcular_puntajes_dimensiones(respuestas)
-    
     perfil_id, score_ajuste = identificar_perfil_optimo(puntajes_dimensiones)
     
     if perfil_id == "perfil_exploratorio":
@@ -1815,4 +1965,18 @@ def calcular_resultados_test(tipo_test: str, respuestas: dict) -> dict:
         "puntajes_dimensiones": puntajes_dimensiones,
         "perfil_identificado": perfil_id,
         "score_ajuste": score_ajuste
-    }
\ No newline at end of file
+    }
+
+def calcular_resultados_lote(tipo_test: str, hojas: Iterable[dict]) -> List[dict]:
+    """
+    Calcula los resultados completos de muchas hojas de respuestas
+    (campañas institucionales, recálculo de historial).
+    Los puntajes de dimensiones se calculan para todo el lote a la vez; el perfil y las
+    carreras, hoja por hoja. Cada elemento coincide con lo que retorna
+    calcular_resultados_test.
+    """
+    hojas = list(hojas)
+    return [
+        _resultados(respuestas, puntajes)
+        for respuestas, puntajes in zip(hojas, calcular_puntajes_dimensiones_lote(hojas))
+    ]
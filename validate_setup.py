@@ -32,6 +32,7 @@ def validate_file_structure():
         "main.py": "Archivo principal de la aplicación",
         "auth.py": "Sistema de autenticación JWT",
         "db.py": "Configuración de base de datos",
+        "migraciones.py": "Migraciones del esquema",
         "requirements.txt": "Dependencias del proyecto",
         ".env": "Variables de entorno",
     }
@@ -243,10 +244,11 @@ def print_summary(results):
     if all(results.values()):
         print("\n🎉 ¡INSTALACIÓN COMPLETADA EXITOSAMENTE!")
         print("\n📝 Próximos pasos:")
-        print("   1. Ejecutar: python main.py")
-        print("   2. Abrir: http://localhost:8000")
-        print("   3. Ver API docs: http://localhost:8000/docs")
-        print("   4. (Opcional) Migrar contraseñas: python migrate_passwords.py")
+        print("   1. Aplicar migraciones: python migraciones.py")
+        print("   2. Ejecutar: python main.py")
+        print("   3. Abrir: http://localhost:8000")
+        print("   4. Ver API docs: http://localhost:8000/docs")
+        print("   5. (Opcional) Migrar contraseñas: python migrate_passwords.py")
         return 0
     else:
         print("\n⚠️  INSTALACIÓN INCOMPLETA")
@@ -0,0 +1,72 @@
+# verificar_consultas.py - Verifica las sentencias SQL registradas
+
+"""
+Script para comprobar que todas las sentencias de consultas.REGISTRO se pueden
+preparar y planificar contra la base de datos de URL_DATABASE.
+
+Uso:
+    python verificar_consultas.py [--planes]
+
+El script:
+1. Compila cada sentencia con el dialecto asyncpg, igual que en los routers
+   (parámetros con su tipo: $1::INTEGER, ...)
+2. Ejecuta EXPLAIN con valores de ejemplo según el tipo de cada parámetro.
+   EXPLAIN no ejecuta la sentencia: los INSERT/UPDATE/DELETE no modifican nada,
+   y además todo corre en una transacción que se descarta.
+3. Con --planes imprime el plan de cada sentencia
+
+Ejecutarlo contra una base local (o de staging) con el esquema al día antes de desplegar
+un cambio en consultas.py. Termina con código 1 si alguna sentencia falla.
+"""
+
+import argparse
+import asyncio
+
+from consultas import REGISTRO, parametros_ejemplo
+from db import async_engine
+
+async def verificar(mostrar_planes: bool) -> bool:
+    """Planifica cada sentencia; retorna True si todas se pudieron planificar"""
+    fallidas = []
+    
+    async with async_engine.connect() as conn:
+        for nombre, sentencia in REGISTRO.items():
+            # Un error aborta la transacción: una por sentencia para seguir con las demás
+            transaccion = await conn.begin()
+            try:
+                compilada = sentencia.compile(dialect=async_engine.dialect)
+                parametros = compilada.construct_params(parametros_ejemplo(compilada))
+                posicionales = tuple(parametros[p] for p in compilada.positiontup)
+                
+                resultado = await conn.exec_driver_sql(f"EXPLAIN {compilada.string}", posicionales)
+                plan = [fila[0] for fila in resultado.fetchall()]
+                
+                print(f"✅ {nombre}")
+                if mostrar_planes:
+                    for linea in plan:
+                        print(f"     {linea}")
+            
+            except Exception as e:
+                fallidas.append(nombre)
+                print(f"❌ {nombre}: {e}")
+            finally:
+                await transaccion.rollback()
+    
+    await async_engine.dispose()
+    
+    print(f"\n📊 Sentencias verificadas: {len(REGISTRO) - len(fallidas)}/{len(REGISTRO)}")
+    return not fallidas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepara y planifica las sentencias de consultas.py")
+    parser.add_argument("--planes", action="store_true", help="Imprime el plan de cada sentencia")
+    args = parser.parse_args()
+    
+    print("="*50)
+    print("🔍 VERIFICACIÓN DE CONSULTAS")
+    print("="*50 + "\n")
+    
+    if not asyncio.run(verificar(args.planes)):
+        exit(1)
+    
+    print("\n✅ Todas las consultas son válidas")
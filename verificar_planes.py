@@ -0,0 +1,328 @@
+# verificar_planes.py - Regresiones en los planes de las consultas
+
+"""
+Script para detectar, antes de desplegar, consultas que recorren tablas grandes enteras
+o que se volvieron lentas: ejecuta EXPLAIN (ANALYZE, BUFFERS) de cada sentencia de
+consultas.REGISTRO (todas las consultas de los routers y de auth.py) y de
+persistencia.REGISTRO (guardado y borrado de tests, resumen por usuario) contra una
+base local con datos a escala de producción.
+
+Uso:
+    python verificar_planes.py [--cargar-datos] [--tests 100000] [--repeticiones 3] [--planes]
+
+El script:
+1. Solo corre contra una base local (salvo --permitir-remoto): EXPLAIN ANALYZE ejecuta
+   las sentencias, también las escrituras (cada una en una transacción que se descarta)
+2. Aplica las migraciones pendientes (migraciones.py), así los índices son los de producción
+3. Con --cargar-datos agrega el dataset sintético de generar_datos.py con --tests tests
+   (y actualiza las estadísticas del planificador)
+4. Comprueba que tests_realizados tenga al menos --escala-minima filas: con tablas
+   chicas Postgres prefiere recorrerlas enteras y el resultado no dice nada
+5. Ejecuta cada sentencia con valores reales (el usuario con más tests, el tema con más
+   comentarios, ...) y falla si:
+   - el plan hace Seq Scan sobre una de TABLAS_GRANDES
+   - supera su presupuesto de tiempo (ms) o de buffers (páginas de 8 kB leídas o en caché)
+6. Imprime una tabla y termina con código 1 si alguna sentencia falla
+
+La base local necesita el esquema de producción (por ejemplo, restaurado de
+pg_dump --schema-only). Al agregar una consulta a consultas.py (o a persistencia.REGISTRO)
+queda cubierta sola; si su costo es mayor por diseño, agregarle un presupuesto en PRESUPUESTOS.
+"""
+
+import argparse
+import asyncio
+import json
+import uuid
+from datetime import date, timedelta
+
+from sqlalchemy.engine import make_url
+
+import persistencia
+from consultas import REGISTRO, parametros_ejemplo
+from db import URL_DATABASE, async_engine, engine, text
+from generar_datos import generar
+from migraciones import migrar
+from tests_config import TESTS_CONFIG, calcular_resultados_test
+
+# Tablas que crecen con el uso: recorrerlas enteras es una regresión
+TABLAS_GRANDES = {
+    "usuarios", "tests_realizados", "resultados_test", "respuestas_test", "comentarios_foro",
+    # Una fila por día, test, dimensión y partición
+    "estadisticas_dimensiones"
+}
+
+# Sentencias que recorren una tabla grande a propósito: {sentencia: (tablas, motivo)}
+SEQ_SCAN_PERMITIDO = {
+    "CONTAR_COMENTARIOS": (
+        {"comentarios_foro"},
+        "cuenta los comentarios activos, que son casi todos: recorrer la tabla es el plan más barato"
+    ),
+    "CONTAR_COMENTARIOS_TEMA": (
+        {"comentarios_foro"},
+        "los temas más usados tienen una fracción grande de los comentarios"
+    )
+}
+
+PRESUPUESTO_DEFECTO = {"ms": 20, "buffers": 300}
+
+# Presupuestos propios de las sentencias que leen muchas filas por diseño
+PRESUPUESTOS = {
+    # Todos los tests del usuario con más tests, con resultados y respuestas
+    "EXPORTACION_TESTS": {"ms": 100, "buffers": 10000},
+    # Cuenta todos los comentarios activos (o los de un tema) en cada página del foro
+    "CONTAR_COMENTARIOS": {"ms": 100, "buffers": 2000},
+    "CONTAR_COMENTARIOS_TEMA": {"ms": 50, "buffers": 1000},
+    # Catálogo completo de programas con sus modalidades
+    "LISTAR_PROGRAMAS": {"ms": 100, "buffers": 2000},
+    # Un mes de contadores del tablero de orientadores
+    "ESTADISTICAS_DIMENSIONES": {"ms": 100, "buffers": 2000},
+    "ESTADISTICAS_PERFILES": {"ms": 100, "buffers": 2000},
+    "ESTADISTICAS_POR_DIA": {"ms": 100, "buffers": 2000},
+    # Borra el usuario: las claves foráneas revisan sus tests
+    "ELIMINAR_USUARIO": {"ms": 50, "buffers": 500},
+    # Guardado de un test: inserta en 3-4 tablas con sus índices, suma a las estadísticas
+    # y al resumen del usuario
+    "persistencia.GUARDAR_TEST": {"ms": 30, "buffers": 1000},
+    "persistencia.GUARDAR_TEST_COMPACTO": {"ms": 30, "buffers": 800},
+    # Borra una página de 20 tests con respuestas y resultados y resta las estadísticas
+    "persistencia.ELIMINAR_TESTS": {"ms": 50, "buffers": 2000},
+    # Recalcula el resumen desde los tests del usuario con más tests (carga inicial
+    # y después de un borrado)
+    "persistencia.ACTUALIZAR_RESUMEN": {"ms": 50, "buffers": 3000},
+    "persistencia.RECALCULAR_RESUMEN": {"ms": 50, "buffers": 2000}
+}
+
+ESCALA_MINIMA = 100000
+
+
+# ================================
+# VALORES DE LOS PARÁMETROS
+# ================================
+
+async def _valores_reales(conn) -> dict:
+    """Valores tomados de los datos, para que cada consulta recorra un caso pesado"""
+    async def fila(sql: str):
+        return (await conn.execute(text(sql))).first()
+    
+    usuario = await fila("""
+        SELECT usuario_id FROM tests_realizados
+        GROUP BY usuario_id ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    user_id = usuario[0] if usuario else 1
+    
+    # El test número 20 del historial: el cursor de la segunda página
+    tests = (await conn.execute(text("""
+        SELECT id, fecha_realizacion FROM tests_realizados
+        WHERE usuario_id = :user_id
+        ORDER BY fecha_realizacion DESC, id DESC
+        LIMIT 20
+    """), {"user_id": user_id})).fetchall()
+    
+    gmail = await fila(f"SELECT gmail FROM usuarios WHERE id = {int(user_id)}")
+    sin_tests = await fila("""
+        SELECT u.id FROM usuarios u
+        WHERE NOT EXISTS (SELECT 1 FROM tests_realizados t WHERE t.usuario_id = u.id)
+        LIMIT 1
+    """)
+    tema = await fila("""
+        SELECT tema FROM comentarios_foro WHERE activo = true
+        GROUP BY tema ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    comentario = await fila("SELECT MAX(id) FROM comentarios_foro WHERE activo = true")
+    programa = await fila("SELECT MIN(programa_id) FROM programa_modalidades")
+    
+    return {
+        "user_id": user_id,
+        "test_id": tests[0][0] if tests else 1,
+        "cursor_id": tests[-1][0] if tests else 1,
+        "cursor_fecha": tests[-1][1] if tests else None,
+        # Email nuevo: los INSERT/UPDATE no chocan con el índice único
+        "email": "verificar.planes@ejemplo.com",
+        "gmail": gmail[0] if gmail else "ejemplo@correo.com",
+        "tema": tema[0] if tema else "general",
+        "id": comentario[0] if comentario and comentario[0] else 1,
+        "programa_id": programa[0] if programa and programa[0] else 1,
+        "limit": 20,
+        "offset": 0,
+        "desde": date.today() - timedelta(days=30),
+        "hasta": date.today(),
+        # Sin filtro: el caso más amplio del tablero y del buscador de carreras
+        "tipo_test": None,
+        "area_val": None,
+        "modalidad_val": None,
+        "duracion_val": None,
+        "esp_val": None,
+        # Borrado de la primera página del historial
+        "test_ids": [test[0] for test in tests] or [1],
+        "_usuario_sin_tests": sin_tests[0] if sin_tests else user_id
+    }
+
+def _valores_guardado(user_id: int, compacto: bool) -> dict:
+    """Parámetros de guardar_test para un test general nuevo (token sin usar: inserta)"""
+    respuestas = {f"pregunta_{p['id']}": "B" for p in TESTS_CONFIG["general"]["preguntas"]}
+    resultados = calcular_resultados_test("general", respuestas)
+    return persistencia.parametros_guardar_test(
+        user_id, "general", respuestas, resultados, str(uuid.uuid4()), compacto
+    )
+
+def _parametros(nombre: str, compilada, valores: dict) -> dict:
+    parametros = parametros_ejemplo(compilada)
+    if nombre.startswith("persistencia."):
+        # Sus sentencias no declaran tipos: todos los valores salen de los datos
+        compacto = nombre == "persistencia.GUARDAR_TEST_COMPACTO"
+        valores = {**valores, **_valores_guardado(valores["user_id"], compacto)}
+    for clave in parametros:
+        if clave in valores:
+            parametros[clave] = valores[clave]
+    if nombre == "ELIMINAR_USUARIO":
+        # Con tests, el borrado fallaría si respuestas_test no borra en cascada
+        parametros["user_id"] = valores["_usuario_sin_tests"]
+    return parametros
+
+def _sentencias() -> dict:
+    """consultas.REGISTRO y persistencia.REGISTRO, con el prefijo del módulo en las segundas"""
+    return {
+        **REGISTRO,
+        **{f"persistencia.{nombre}": sentencia for nombre, sentencia in persistencia.REGISTRO.items()}
+    }
+
+
+# ================================
+# EXPLAIN (ANALYZE, BUFFERS)
+# ================================
+
+def _recorrer_plan(nodo: dict):
+    yield nodo
+    for hijo in nodo.get("Plans", []):
+        yield from _recorrer_plan(hijo)
+
+def _tablas_recorridas(plan: dict) -> set:
+    return {
+        nodo["Relation Name"]
+        for nodo in _recorrer_plan(plan)
+        if nodo["Node Type"] == "Seq Scan"
+    }
+
+async def _medir(conn, compilada, posicionales: tuple) -> dict:
+    """Una ejecución con EXPLAIN ANALYZE en una transacción que se descarta"""
+    transaccion = await conn.begin()
+    try:
+        resultado = await conn.exec_driver_sql(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {compilada.string}", posicionales
+        )
+        explain = resultado.scalar()
+    finally:
+        await transaccion.rollback()
+    
+    if isinstance(explain, str):
+        explain = json.loads(explain)
+    plan = explain[0]["Plan"]
+    return {
+        "ms": explain[0]["Execution Time"],
+        "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "seq_scans": _tablas_recorridas(plan) & TABLAS_GRANDES,
+        "plan": plan
+    }
+
+def _imprimir_plan(nodo: dict, nivel: int = 0):
+    detalle = nodo.get("Index Name") or nodo.get("Relation Name") or ""
+    print(f"     {'  ' * nivel}-> {nodo['Node Type']} {detalle} "
+          f"(filas={nodo.get('Actual Rows')}, ms={nodo.get('Actual Total Time')})")
+    for hijo in nodo.get("Plans", []):
+        _imprimir_plan(hijo, nivel + 1)
+
+async def verificar_planes(repeticiones: int, mostrar_planes: bool) -> bool:
+    sentencias = _sentencias()
+    fallidas = []
+    filas = []
+    
+    async with async_engine.connect() as conn:
+        valores = await _valores_reales(conn)
+        await conn.rollback()
+        
+        for nombre, sentencia in sentencias.items():
+            presupuesto = PRESUPUESTOS.get(nombre, PRESUPUESTO_DEFECTO)
+            try:
+                compilada = sentencia.compile(dialect=async_engine.dialect)
+                parametros = compilada.construct_params(_parametros(nombre, compilada, valores))
+                posicionales = tuple(parametros[p] for p in compilada.positiontup)
+                
+                # La primera ejecución calienta la caché: se toma la más rápida
+                mediciones = [await _medir(conn, compilada, posicionales) for _ in range(repeticiones)]
+                medicion = min(mediciones, key=lambda m: m["ms"])
+            except Exception as e:
+                fallidas.append(nombre)
+                print(f"❌ {nombre}: {e}")
+                continue
+            
+            problemas = []
+            permitidas, _ = SEQ_SCAN_PERMITIDO.get(nombre, (set(), None))
+            seq_scans = medicion["seq_scans"] - permitidas
+            if seq_scans:
+                problemas.append(f"Seq Scan en {', '.join(sorted(seq_scans))}")
+            if medicion["ms"] > presupuesto["ms"]:
+                problemas.append(f"{medicion['ms']:.1f} ms > {presupuesto['ms']} ms")
+            if medicion["buffers"] > presupuesto["buffers"]:
+                problemas.append(f"{medicion['buffers']} buffers > {presupuesto['buffers']}")
+            
+            if problemas:
+                fallidas.append(nombre)
+            filas.append((nombre, medicion, presupuesto, problemas))
+            
+            if mostrar_planes or problemas:
+                simbolo = "❌" if problemas else "✅"
+                print(f"{simbolo} {nombre}: {'; '.join(problemas) or 'ok'}")
+                _imprimir_plan(medicion["plan"])
+    
+    await async_engine.dispose()
+    
+    print("\n" + "="*90)
+    print(f"{'Sentencia':40}{'ms':>10}{'máx ms':>10}{'buffers':>10}{'máx buf':>10}   ")
+    print("="*90)
+    for nombre, medicion, presupuesto, problemas in filas:
+        print(f"{nombre:40}{medicion['ms']:>10.2f}{presupuesto['ms']:>10}"
+              f"{medicion['buffers']:>10}{presupuesto['buffers']:>10}   {'❌' if problemas else '✅'}")
+    
+    print(f"\n📊 Sentencias dentro del presupuesto: {len(sentencias) - len(fallidas)}/{len(sentencias)}")
+    return not fallidas
+
+def _tamano_tests() -> int:
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT COUNT(*) FROM tests_realizados")).scalar()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE de las consultas de consultas.py y persistencia.py con datos a escala")
+    parser.add_argument("--cargar-datos", action="store_true", help="Carga el dataset sintético si falta")
+    parser.add_argument("--tests", type=int, default=ESCALA_MINIMA, help="Tests del dataset sintético")
+    parser.add_argument("--escala-minima", type=int, default=ESCALA_MINIMA,
+                        help="Filas mínimas en tests_realizados para confiar en los planes")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Ejecuciones por sentencia")
+    parser.add_argument("--planes", action="store_true", help="Imprime el plan de cada sentencia")
+    parser.add_argument("--permitir-remoto", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    print("="*50)
+    print("🔬 VERIFICACIÓN DE PLANES")
+    print("="*50 + "\n")
+    
+    host = make_url(URL_DATABASE).host
+    if host not in ("localhost", "127.0.0.1", "::1", None) and not args.permitir_remoto:
+        print(f"❌ {host} no es una base local: EXPLAIN ANALYZE ejecuta las sentencias")
+        exit(1)
+    
+    if not migrar():
+        exit(1)
+    
+    if args.cargar_datos and not generar(args.tests):
+        exit(1)
+    
+    total_tests = _tamano_tests()
+    if total_tests < args.escala_minima:
+        print(f"❌ tests_realizados tiene {total_tests} filas (mínimo {args.escala_minima}); "
+              f"cargar datos con --cargar-datos")
+        exit(1)
+    
+    if not asyncio.run(verificar_planes(args.repeticiones, args.planes)):
+        exit(1)
+    
+    print("\n✅ Todos los planes dentro del presupuesto")